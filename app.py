@@ -1,30 +1,54 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Blueprint, request, jsonify, send_file, Response, stream_with_context, json
 from flask_cors import CORS
 import cv2
-import numpy as np
-import base64
-from core.reconocimiento.facial import ReconocimientoFacial
-from core.pertenencias.gestion import GestionPertenencias
-from core.objetos.deteccion import DeteccionObjetos
+import time
+from core.servicios import (
+    obtener_reconocedor,
+    obtener_gestionador,
+    obtener_detector,
+    obtener_registro_estudiantes,
+    precargar
+)
+from core.inferencia.pool import PoolSaturado
+from core.api.reportes import reportes_bp
+from core.almacenamiento.escritor import preparar_imagen
+from core.almacenamiento.derivados import obtener_cache_derivados
 from utils.auth import login_required, autenticar_admin, crear_admin_inicial, generar_token
+from utils.imagenes import ErrorImagen, datos_peticion, leer_imagen, leer_imagenes, decodificar_imagen, decodificar_base64
 import os
-from datetime import datetime
-from utils.config import ROOT_DIR, DATASET_FACIAL
-import io
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
+from werkzeug.utils import safe_join
+from itertools import chain
+from datetime import datetime, timedelta
+from utils.config import (
+    ROOT_DIR,
+    DATASET_FACIAL,
+    MAX_IMAGENES_LOTE,
+    MAX_ITEMS_LOTE,
+    PAGINA_DEFECTO,
+    PAGINA_MAXIMA,
+    MAX_CUERPO_BYTES,
+    TAMANOS_DERIVADOS,
+    IMAGENES_MAX_AGE,
+    PRECARGA_MODELOS,
+    crear_directorios
+)
 from dotenv import load_dotenv
 load_dotenv()
-app = Flask(__name__)
-CORS(app, supports_credentials=True, resources={r"/*": {"origins": "*"}}, methods=["GET", "POST", "OPTIONS"], allow_headers=["Content-Type", "Authorization"])
 
-# Inicializar servicios
-reconocedor = ReconocimientoFacial()
-gestionador = GestionPertenencias()
-detector = DeteccionObjetos()
+# Rutas de la API; los servicios (modelos, base de datos) se crean en su
+# primer uso dentro de cada proceso (core/servicios.py)
+ia_bp = Blueprint('ia', __name__)
 
+def inferencia_saturada(e):
+    respuesta = jsonify({'error': str(e)})
+    respuesta.status_code = 503
+    respuesta.headers['Retry-After'] = str(e.reintentar)
+    return respuesta
 
-@app.route('/ia/reconocimiento/capturar', methods=['POST'])
+def imagen_invalida(e):
+    return jsonify({'error': str(e)}), e.codigo
+
+@ia_bp.route('/ia/reconocimiento/capturar', methods=['POST'])
 def capturar_rostro():
     try:
         data = request.json
@@ -32,106 +56,232 @@ def capturar_rostro():
         if not codigo_estudiante:
             return jsonify({'error': 'Código de estudiante requerido'}), 400
             
-        reconocedor.capturar_rostro(codigo_estudiante)
+        rutas = obtener_reconocedor().capturar_rostro(codigo_estudiante)
+        if rutas:
+            obtener_registro_estudiantes().registrar(codigo_estudiante, rutas)
         return jsonify({'mensaje': 'Rostro capturado exitosamente'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/ia/reconocimiento/verificar', methods=['POST'])
+@ia_bp.route('/ia/reconocimiento/verificar', methods=['POST'])
 def verificar_rostro():
     try:
-        # Obtener imagen en base64
-        data = request.json
-        imagen_base64 = data.get('imagen')
-        if not imagen_base64:
+        # Imagen binaria (octet-stream o multipart) o en base64 dentro del JSON
+        data = datos_peticion()
+        imagen_bytes = leer_imagen()
+        if not imagen_bytes:
             return jsonify({'error': 'Imagen requerida'}), 400
-        # Convertir base64 a imagen (ya viene puro, sin prefijo)
-        imagen_bytes = base64.b64decode(imagen_base64)
-        nparr = np.frombuffer(imagen_bytes, np.uint8)
-        imagen = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        # Realizar reconocimiento
-        codigo, confianza = reconocedor.reconocimiento_facial(imagen)
-        return jsonify({
-            'codigo_estudiante': codigo,
-            'confianza': confianza
-        })
+        imagen = decodificar_imagen(imagen_bytes)
+        # Reconocer todos los rostros del cuadro en una sola pasada
+        rostros = obtener_reconocedor().reconocer_rostros(imagen)
+        primero = rostros[0] if rostros else {'codigo_estudiante': None, 'confianza': 0}
+        respuesta = {
+            'codigo_estudiante': primero['codigo_estudiante'],
+            'confianza': primero['confianza'],
+            'rostros': rostros
+        }
+        # Opcional: los k estudiantes más parecidos con sus distancias
+        top_k = data.get('top_k')
+        if top_k:
+            respuesta['candidatos'] = obtener_reconocedor().reconocer_top_k(imagen, int(top_k))
+        return jsonify(respuesta)
+    except (PoolSaturado, ErrorImagen):
+        raise
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@ia_bp.route('/ia/reconocimiento/verificar-lote', methods=['POST'])
+def verificar_rostros_lote():
+    try:
+        # Imágenes como partes binarias multipart o como lista base64 en JSON
+        imagenes = leer_imagenes()
+        if not imagenes:
+            return jsonify({'error': 'Imágenes requeridas'}), 400
+        if len(imagenes) > MAX_IMAGENES_LOTE:
+            return jsonify({'error': f'Máximo {MAX_IMAGENES_LOTE} imágenes por lote'}), 400
+        # Resultados por imagen, en el mismo orden
+        resultados = obtener_reconocedor().reconocimiento_facial_lote(imagenes)
+        return jsonify({'resultados': resultados})
+    except (PoolSaturado, ErrorImagen):
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/ia/pertenencias/registrar', methods=['POST'])
+@ia_bp.route('/ia/pertenencias/registrar', methods=['POST'])
 @login_required
 def registrar_pertenencia():
     try:
-        data = request.json
+        data = datos_peticion()
         codigo_estudiante = data.get('codigo_estudiante')
         tipo_objeto = data.get('tipo_objeto')
         descripcion = data.get('descripcion')
-        imagen_base64 = data.get('imagen')
+        imagen_bytes = leer_imagen()
 
-        if not all([codigo_estudiante, tipo_objeto, imagen_base64]):
+        if not all([codigo_estudiante, tipo_objeto, imagen_bytes]):
             return jsonify({'error': 'Faltan datos requeridos'}), 400
 
-        # Convertir base64 a imagen
-        imagen_bytes = base64.b64decode(imagen_base64.split(',')[1])
-        nparr = np.frombuffer(imagen_bytes, np.uint8)
-        imagen = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        # Un JPEG se guarda con sus bytes originales, sin decodificar ni recodificar
+        try:
+            imagen = preparar_imagen(imagen_bytes)
+        except ValueError:
+            raise ErrorImagen('Imagen inválida')
 
-        # Guardar imagen
-        ruta_imagen = detector.guardar_imagen(imagen, codigo_estudiante, tipo_objeto)
+        # Guardar imagen (en segundo plano; la ruta es la definitiva)
+        ruta_imagen = obtener_detector().guardar_imagen(imagen, codigo_estudiante, tipo_objeto)
         if not ruta_imagen:
             return jsonify({'error': 'Error al guardar la imagen'}), 500
 
         # Registrar en la base de datos
-        resultado = gestionador.registrar_pertenencia(
+        resultado = obtener_gestionador().registrar_pertenencia(
             codigo_estudiante=codigo_estudiante,
             tipo_objeto=tipo_objeto,
             descripcion=descripcion,
             ruta_imagen=ruta_imagen
         )
         return jsonify(resultado)
+    except ErrorImagen:
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/ia/pertenencias/consultar', methods=['GET'])
+def _items_lote():
+    """
+    Lista `items` del JSON de un lote
+
+    Returns:
+        tuple: (items, None) o (None, respuesta de error 400)
+    """
+    items = datos_peticion().get('items')
+    if not items or not isinstance(items, list):
+        return None, (jsonify({'error': 'Ítems requeridos (lista de objetos)'}), 400)
+    if len(items) > MAX_ITEMS_LOTE:
+        return None, (jsonify({'error': f'Máximo {MAX_ITEMS_LOTE} ítems por lote'}), 400)
+    return items, None
+
+@ia_bp.route('/ia/pertenencias/registrar-lote', methods=['POST'])
+@login_required
+def registrar_pertenencias_lote():
+    try:
+        items, error = _items_lote()
+        if error:
+            return error
+
+        # Imagen en base64, con o sin prefijo data:image/...;base64; una imagen
+        # inválida es el error de su ítem, no de todo el lote
+        for i, item in enumerate(items):
+            if not isinstance(item, dict):
+                continue
+            imagen_base64 = item.get('imagen')
+            try:
+                items[i] = {**item, 'imagen': decodificar_base64(imagen_base64) if imagen_base64 else None}
+            except ErrorImagen as e:
+                items[i] = {**item, 'imagen': None, 'error': str(e)}
+
+        return jsonify(obtener_gestionador().registrar_pertenencias_lote(items))
+    except ErrorImagen:
+        raise
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@ia_bp.route('/ia/pertenencias/registrar-salida-lote', methods=['POST'])
+@login_required
+def registrar_salidas_lote():
+    try:
+        items, error = _items_lote()
+        if error:
+            return error
+        return jsonify(obtener_gestionador().registrar_salidas_lote(items))
+    except ErrorImagen:
+        raise
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _fecha_parametro(valor, fin=False):
+    """Fecha ISO de un parámetro; con fin=True una fecha sin hora incluye todo ese día"""
+    if not valor:
+        return None
+    fecha = datetime.fromisoformat(valor)
+    if fin and len(valor) == 10:
+        fecha += timedelta(days=1)
+    return fecha
+
+def _iniciar_flujo(filas):
+    """Lee la primera fila antes de responder para que un error de BD sea un 500 y no un flujo cortado"""
+    filas = iter(filas)
+    primera = next(filas, None)
+    return chain([primera], filas) if primera is not None else iter(())
+
+@ia_bp.route('/ia/pertenencias/consultar', methods=['GET'])
 @login_required
 def consultar_pertenencias():
+    """
+    Lista pertenencias
+    
+    Parámetros: codigo_estudiante, estado, desde, hasta (fechas ISO) y
+      - limit / cursor: paginación por clave; responde {pertenencias, siguiente}
+      - formato=jsonl: todas las filas como JSON lines, en flujo
+      - sin ninguno de los anteriores: arreglo JSON con todas las filas (en flujo)
+    """
     try:
-        codigo_estudiante = request.args.get('codigo_estudiante')
-        # Usar la función obtener_pertenencias, que permite filtrar o traer todo
-        resultado = gestionador.obtener_pertenencias(codigo_estudiante)
-        return jsonify(resultado)
+        args = request.args
+        filtros = {
+            'codigo_estudiante': args.get('codigo_estudiante'),
+            'estado': args.get('estado'),
+            'desde': _fecha_parametro(args.get('desde')),
+            'hasta': _fecha_parametro(args.get('hasta'), fin=True)
+        }
+        
+        if 'limit' in args or 'cursor' in args:
+            limite = min(max(int(args.get('limit', PAGINA_DEFECTO)), 1), PAGINA_MAXIMA)
+            return jsonify(obtener_gestionador().pagina_pertenencias(limite=limite, cursor=args.get('cursor'), **filtros))
+        
+        filas = _iniciar_flujo(obtener_gestionador().iterar_pertenencias(**filtros))
+        if args.get('formato') == 'jsonl':
+            lineas = (json.dumps(fila) + '\n' for fila in filas)
+            return Response(stream_with_context(lineas), mimetype='application/x-ndjson')
+        
+        def arreglo():
+            yield '['
+            for i, fila in enumerate(filas):
+                yield (',' if i else '') + json.dumps(fila)
+            yield ']'
+        return Response(stream_with_context(arreglo()), mimetype='application/json')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/ia/objetos/detectar', methods=['POST'])
+@ia_bp.route('/ia/objetos/detectar', methods=['POST'])
 @login_required
 def detectar_objetos():
     try:
-        # Obtener imagen en base64
-        data = request.json
-        imagen_base64 = data.get('imagen')
-        if not imagen_base64:
+        # Imagen binaria (octet-stream o multipart) o en base64 dentro del JSON
+        imagen_bytes = leer_imagen()
+        if not imagen_bytes:
             return jsonify({'error': 'Imagen requerida'}), 400
-            
-        # Convertir base64 a imagen
-        imagen_bytes = base64.b64decode(imagen_base64.split(',')[1])
-        nparr = np.frombuffer(imagen_bytes, np.uint8)
-        imagen = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        imagen = decodificar_imagen(imagen_bytes)
         
         # Detectar objetos
-        objetos = detector.detectar_objetos(imagen)
+        objetos = obtener_detector().detectar_objetos(imagen)
         return jsonify(objetos)
+    except (PoolSaturado, ErrorImagen):
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/ia/estudiantes/registrar', methods=['POST'])
+@ia_bp.route('/ia/objetos/metricas', methods=['GET'])
+@login_required
+def metricas_objetos():
+    return jsonify(obtener_detector().metricas())
+
+@ia_bp.route('/ia/estudiantes/registrar', methods=['POST'])
 def registrar_estudiante():
     try:
-        data = request.json
-        codigo_estudiante = data.get('codigo_estudiante')
-        imagenes_base64 = data.get('imagenes', [])
+        # Imágenes como partes multipart 'imagenes' o lista base64 en el JSON
+        codigo_estudiante = datos_peticion().get('codigo_estudiante')
+        imagenes = leer_imagenes()
         
-        if not codigo_estudiante or not imagenes_base64:
+        if not codigo_estudiante or not imagenes:
             return jsonify({'error': 'Faltan datos requeridos'}), 400
 
         # Asegurar que el directorio DATASET_FACIAL existe
@@ -139,59 +289,46 @@ def registrar_estudiante():
 
         # Guardar cada imagen
         rutas_imagenes = []
-        for i, imagen_base64 in enumerate(imagenes_base64):
-            # Convertir base64 a imagen
-            imagen_bytes = base64.b64decode(imagen_base64)
-            nparr = np.frombuffer(imagen_bytes, np.uint8)
-            imagen = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-
-            # Convertir a escala de grises para el reconocimiento facial
-            gris = cv2.cvtColor(imagen, cv2.COLOR_BGR2GRAY)
-            
-            # Detectar rostros
-            rostros = reconocedor.detector.detectMultiScale(
-                gris,
-                scaleFactor=1.1,
-                minNeighbors=5,
-                minSize=(30, 30)
-            )
+        rostros_nuevos = []
+        for i, imagen_bytes in enumerate(imagenes):
+            try:
+                imagen = decodificar_imagen(imagen_bytes)
+            except ErrorImagen:
+                print(f"Imagen {i} inválida")
+                continue
+
+            # Tomar el rostro más grande (el estudiante que se registra)
+            rostro = obtener_reconocedor().extraer_rostro_principal(imagen)
             
-            if len(rostros) > 0:
-                # Tomar el primer rostro detectado
-                x, y, w, h = rostros[0]
-                rostro = gris[y:y+h, x:x+w]
-                
+            if rostro is not None:
                 # Guardar rostro en DATASET_FACIAL
                 ruta_imagen = os.path.join(DATASET_FACIAL, f"{codigo_estudiante}_{i}.jpg")
                 cv2.imwrite(ruta_imagen, rostro)
                 rutas_imagenes.append(ruta_imagen)
+                rostros_nuevos.append(rostro)
             else:
                 print(f"No se detectó rostro en la imagen {i}")
 
         if not rutas_imagenes:
             return jsonify({'error': 'No se detectaron rostros en ninguna imagen'}), 400
 
-        # Entrenar el modelo con las nuevas imágenes
-        reconocedor.entrenar_modelo()
+        # Agregar solo los rostros nuevos al modelo (el reentrenamiento completo es offline)
+        obtener_reconocedor().actualizar_modelo(codigo_estudiante, rostros_nuevos)
 
-        # Registrar estudiante en la base de datos si no existe
-        db = gestionador.db
-        cursor = db.ejecutar('SELECT codigo_estudiante FROM estudiantes WHERE codigo_estudiante = %s', (codigo_estudiante,))
-        if not cursor or not cursor.fetchone():
-            db.ejecutar(
-                'INSERT INTO estudiantes (codigo_estudiante) VALUES (%s)',
-                (codigo_estudiante,)
-            )
+        # Registrar estudiante y sus fotos (tabla estudiantes e índice en memoria)
+        obtener_registro_estudiantes().registrar(codigo_estudiante, rutas_imagenes)
 
         return jsonify({
             'mensaje': 'Estudiante registrado exitosamente',
             'rutas_imagenes': rutas_imagenes
         })
 
+    except (PoolSaturado, ErrorImagen):
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/ia/login/administrador', methods=['POST'])
+@ia_bp.route('/ia/login/administrador', methods=['POST'])
 def login_administrador():
     try:
         data = request.json
@@ -212,7 +349,7 @@ def login_administrador():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/ia/admin/inicial', methods=['POST'])
+@ia_bp.route('/ia/admin/inicial', methods=['POST'])
 def crear_admin():
     try:
         data = request.json
@@ -231,37 +368,64 @@ def crear_admin():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/ia/estudiantes/listar', methods=['GET'])
+@ia_bp.route('/ia/estudiantes/listar', methods=['GET'])
 def listar_estudiantes():
+    """
+    Estudiantes inscritos (codigo, fotos, total_fotos, fecha_registro) ordenados por código
+
+    Con limit / cursor responde una página {estudiantes, total, siguiente};
+    sin ellos, el arreglo completo
+    """
     try:
-        estudiantes = {}
-        for archivo in os.listdir(DATASET_FACIAL):
-            if archivo.endswith('.jpg'):
-                codigo = archivo.split('_')[0]
-                if codigo not in estudiantes:
-                    estudiantes[codigo] = []
-                estudiantes[codigo].append(f"/ia/estudiantes/foto/{archivo}")
-        resultado = []
-        for codigo, fotos in estudiantes.items():
-            resultado.append({
-                "codigo": codigo,
-                "fotos": fotos
-            })
-        return jsonify(resultado)
+        args = request.args
+        if 'limit' in args or 'cursor' in args:
+            limite = min(max(int(args.get('limit', PAGINA_DEFECTO)), 1), PAGINA_MAXIMA)
+            return jsonify(obtener_registro_estudiantes().pagina(limite, args.get('cursor')))
+        return jsonify(obtener_registro_estudiantes().listar())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/ia/estudiantes/foto/<nombre_foto>', methods=['GET'])
+def _servir_imagen(ruta):
+    """
+    Envía una imagen en el tamaño del parámetro size (nombre de TAMANOS_DERIVADOS
+    u 'original'), con ETag, Last-Modified y Cache-Control; responde 304 si el
+    cliente ya la tiene
+    """
+    if not ruta or not os.path.isfile(ruta):
+        return "No encontrada", 404
+    tamano = request.args.get('size', 'original')
+    if tamano != 'original':
+        if tamano not in TAMANOS_DERIVADOS:
+            opciones = ', '.join(['original', *TAMANOS_DERIVADOS])
+            return jsonify({'error': f'size inválido (opciones: {opciones})'}), 400
+        # ETag y Last-Modified del original: la fecha del derivado cambia con
+        # cada uso (orden LRU de la caché) y no sirve como validador
+        estado = os.stat(ruta)
+        return send_file(
+            obtener_cache_derivados().obtener(ruta, tamano), mimetype='image/jpeg', conditional=True,
+            etag=f'{estado.st_mtime_ns:x}-{estado.st_size:x}-{tamano}', last_modified=estado.st_mtime,
+            max_age=IMAGENES_MAX_AGE
+        )
+    return send_file(ruta, mimetype='image/jpeg', conditional=True, etag=True, max_age=IMAGENES_MAX_AGE)
+
+@ia_bp.route('/ia/estudiantes/foto/<nombre_foto>', methods=['GET'])
 def servir_foto_estudiante(nombre_foto):
     try:
-        ruta = os.path.join(DATASET_FACIAL, nombre_foto)
-        if not os.path.exists(ruta):
-            return "No encontrada", 404
-        return send_file(ruta, mimetype='image/jpeg')
+        return _servir_imagen(safe_join(DATASET_FACIAL, nombre_foto))
     except Exception as e:
         return str(e), 500
 
-@app.route('/ia/login/estudiante', methods=['POST', 'OPTIONS'])
+@ia_bp.route('/ia/pertenencias/<int:id_pertenencia>/imagen', methods=['GET'])
+@login_required
+def servir_imagen_pertenencia(id_pertenencia):
+    try:
+        return _servir_imagen(obtener_gestionador().obtener_ruta_imagen(id_pertenencia))
+    except Exception as e:
+        return str(e), 500
+
+@ia_bp.route('/ia/login/estudiante', methods=['POST', 'OPTIONS'])
 def login_estudiante():
     if request.method == 'OPTIONS':
         return '', 200
@@ -272,14 +436,8 @@ def login_estudiante():
         if not codigo_estudiante:
             return jsonify({'error': 'Código de estudiante requerido'}), 400
             
-        # Verificar que el estudiante existe en el dataset facial
-        estudiante_existe = False
-        for archivo in os.listdir(DATASET_FACIAL):
-            if archivo.startswith(f"{codigo_estudiante}_"):
-                estudiante_existe = True
-                break
-                
-        if not estudiante_existe:
+        # Verificar que el estudiante está inscrito (índice en memoria)
+        if not obtener_registro_estudiantes().existe(str(codigo_estudiante)):
             return jsonify({'error': 'Estudiante no encontrado'}), 404
             
         # Generar token JWT
@@ -292,33 +450,7 @@ def login_estudiante():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/ia/pertenencias/reporte/pdf', methods=['GET'])
-@login_required
-def reporte_pertenencias_pdf():
-    try:
-        registros = gestionador.obtener_pertenencias()
-        buffer = io.BytesIO()
-        p = canvas.Canvas(buffer, pagesize=letter)
-        width, height = letter
-        y = height - 40
-        p.setFont("Helvetica-Bold", 14)
-        p.drawString(40, y, "Reporte de Pertenencias")
-        y -= 30
-        p.setFont("Helvetica", 10)
-        for reg in registros:
-            texto = f"{reg['codigo_estudiante']} | {reg['tipo_objeto']} | {reg['descripcion']} | {reg['fecha_entrada']} | {reg['estado']}"
-            p.drawString(40, y, texto)
-            y -= 15
-            if y < 40:
-                p.showPage()
-                y = height - 40
-        p.save()
-        buffer.seek(0)
-        return send_file(buffer, as_attachment=True, download_name="reporte_pertenencias.pdf", mimetype='application/pdf')
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-@app.route('/ia/pertenencias/registrar-salida', methods=['POST'])
+@ia_bp.route('/ia/pertenencias/registrar-salida', methods=['POST'])
 @login_required
 def registrar_salida_pertenencia():
     try:
@@ -327,10 +459,51 @@ def registrar_salida_pertenencia():
         tipo_objeto = data.get('tipo_objeto')
         if not codigo_estudiante or not tipo_objeto:
             return jsonify({'error': 'Faltan datos requeridos'}), 400
-        resultado = gestionador.registrar_salida(codigo_estudiante, tipo_objeto)
+        resultado = obtener_gestionador().registrar_salida(codigo_estudiante, tipo_objeto)
         return jsonify(resultado)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def crear_app():
+    """
+    Crea la aplicación Flask
+
+    No carga modelos ni abre conexiones: cada servicio se crea en su primer
+    uso. Con PRECARGA_MODELOS los modelos de solo lectura se cargan aquí; con
+    gunicorn --preload (gunicorn.conf.py) eso ocurre en el master antes del
+    fork y los workers comparten esa memoria.
+    """
+    inicio = time.perf_counter()
+    crear_directorios()
+    app = Flask(__name__)
+    # Tamaño máximo del cuerpo de una petición (Flask responde 413 si se supera)
+    app.config['MAX_CONTENT_LENGTH'] = MAX_CUERPO_BYTES
+    app.register_blueprint(ia_bp)
+    app.register_blueprint(reportes_bp)
+    app.register_error_handler(PoolSaturado, inferencia_saturada)
+    app.register_error_handler(ErrorImagen, imagen_invalida)
+    CORS(app, supports_credentials=True, resources={r"/*": {"origins": "*"}}, methods=["GET", "POST", "OPTIONS"], allow_headers=["Content-Type", "Authorization"])
+    tiempos = precargar() if PRECARGA_MODELOS else {}
+    detalle = ''.join(f", {nombre} {ms:.1f} ms" for nombre, ms in tiempos.items())
+    print(f"Aplicación creada en {(time.perf_counter() - inicio) * 1000:.1f} ms{detalle}")
+    return app
+
+_app = None
+
+def __getattr__(nombre):
+    """
+    `app` (gunicorn app:app, tests) se crea en el primer acceso, no al importar
+
+    Los workers spawn del pool de inferencia vuelven a importar __main__
+    (este archivo con `python app.py`) y no deben repetir crear_app() ni la
+    precarga de modelos.
+    """
+    global _app
+    if nombre == 'app':
+        if _app is None:
+            _app = crear_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True) 
\ No newline at end of file
+    crear_app().run(host='0.0.0.0', port=5000, debug=True) 
\ No newline at end of file
@@ -0,0 +1,180 @@
+import os
+import time
+import hashlib
+import threading
+
+import cv2
+import numpy as np
+
+from utils.config import PERTENENCIAS_DIR, ALMACEN_GRACIA, CALIDAD_JPEG
+from core.almacenamiento.escritor import obtener_escritor, preparar_imagen
+
+# Subcarpeta de las imágenes direccionadas por contenido dentro de PERTENENCIAS_DIR
+CARPETA_CONTENIDO = 'objetos'
+# Niveles de subcarpetas (2 caracteres hex cada uno): 2 niveles = 65536 carpetas
+NIVELES = 2
+# Sufijo de una imagen apartada por liberar() mientras confirma que puede borrarla
+SUFIJO_BORRANDO = '.borrando'
+
+class AlmacenContenido:
+    """
+    Imágenes de pertenencias guardadas por su contenido
+
+    Cada imagen se guarda en <directorio>/objetos/ab/cd/<sha256>.jpg, con el
+    hash de sus bytes: el nombre no depende de la hora ni del estudiante, así
+    dos registros en el mismo segundo no se pisan, la ruta guardada en
+    ruta_imagen nunca cambia y una subida idéntica reutiliza el archivo. Las
+    dos capas de subcarpetas mantienen cada directorio pequeño sin importar
+    cuántas imágenes haya. ruta_imagen guarda la ruta relativa a `directorio`
+    (objetos/ab/cd/<sha256>.jpg), que no depende de dónde esté instalado.
+
+    Las referencias son las filas de pertenencias con esa ruta relativa
+    (índice idx_pertenencias_ruta_imagen); una imagen sin referencias se
+    borra con liberar() o recolectar() pasado el periodo de `gracia`, que
+    cubre el tiempo entre guardar() y el INSERT de su fila.
+    """
+
+    def __init__(self, directorio, escritor=None, gracia=3600, calidad=95):
+        self.base = directorio
+        self.directorio = os.path.join(directorio, CARPETA_CONTENIDO)
+        self.escritor = escritor
+        self.gracia = gracia
+        self.calidad = calidad
+
+    def relativa(self, clave):
+        """Ruta relativa (la de ruta_imagen) del archivo con hash `clave`"""
+        carpetas = [clave[2 * i:2 * i + 2] for i in range(NIVELES)]
+        return '/'.join([CARPETA_CONTENIDO, *carpetas, f'{clave}.jpg'])
+
+    def absoluta(self, ruta):
+        """Ruta en disco de un ruta_imagen (las filas antiguas ya guardan rutas absolutas)"""
+        return os.path.join(self.base, ruta)
+
+    def guardar(self, imagen):
+        """
+        Guarda una imagen, o reutiliza la existente con el mismo contenido
+
+        Args:
+            imagen: Bytes de la subida (un JPEG se guarda tal cual) o numpy array
+
+        Returns:
+            str: Ruta relativa para ruta_imagen; la escritura sigue en segundo plano
+
+        Raises:
+            ValueError: Si no es una imagen válida
+        """
+        imagen = preparar_imagen(imagen)
+        if isinstance(imagen, np.ndarray):
+            # El nombre depende de los bytes finales: lo no JPEG se codifica aquí
+            ok, codificada = cv2.imencode('.jpg', imagen, [cv2.IMWRITE_JPEG_QUALITY, self.calidad])
+            if not ok:
+                raise ValueError("No se pudo codificar la imagen")
+            imagen = codificada.tobytes()
+        relativa = self.relativa(hashlib.sha256(imagen).hexdigest())
+        ruta = self.absoluta(relativa)
+        try:
+            # Ya existe: se renueva la fecha para que recolectar() no la tome por huérfana
+            os.utime(ruta)
+            return relativa
+        except FileNotFoundError:
+            pass
+        (self.escritor or obtener_escritor()).guardar(imagen, ruta)
+        return relativa
+
+    def existe(self, ruta):
+        return os.path.exists(self.absoluta(ruta))
+
+    def referencias(self, db, ruta):
+        """
+        Filas de pertenencias que usan la imagen
+
+        Se cuentan por la ruta relativa y también por la absoluta, la que
+        guardaban las filas registradas antes de usar rutas relativas.
+        """
+        absoluta = self.absoluta(ruta)
+        relativa = os.path.relpath(absoluta, self.base).replace(os.sep, '/')
+        fila = db.obtener_uno('SELECT COUNT(*) FROM pertenencias WHERE ruta_imagen IN (%s, %s)',
+                              (relativa, absoluta))
+        if fila is None:
+            raise RuntimeError('Error al contar referencias de la imagen')
+        return fila[0]
+
+    def _reciente(self, ruta):
+        return time.time() - os.path.getmtime(ruta) < self.gracia
+
+    def liberar(self, db, ruta):
+        """
+        Borra la imagen si ninguna pertenencia la usa y no se guardó (ni
+        reutilizó) durante el periodo de gracia
+
+        Antes de borrar, la imagen se aparta con un rename y se vuelven a
+        comprobar la fecha y las referencias: un guardar() del mismo
+        contenido entre el conteo y el borrado, o bien renovó la fecha (y la
+        imagen se restaura), o bien ya no la encontró y la escribe de nuevo.
+
+        Returns:
+            bool: True si se borró
+        """
+        ruta = self.absoluta(ruta)
+        try:
+            if self._reciente(ruta) or self.referencias(db, ruta):
+                return False
+            apartada = f'{ruta}.{os.getpid()}.{threading.get_ident()}{SUFIJO_BORRANDO}'
+            os.rename(ruta, apartada)
+        except FileNotFoundError:
+            return False
+        try:
+            if self._reciente(apartada) or self.referencias(db, ruta):
+                os.replace(apartada, ruta)
+                return False
+            os.remove(apartada)
+            return True
+        except FileNotFoundError:
+            # recolectar() de otro proceso la restauró mientras tanto
+            return False
+        except Exception:
+            os.replace(apartada, ruta)
+            raise
+
+    def recolectar(self, db):
+        """
+        Borra las imágenes sin referencias (INSERT fallidos, pertenencias
+        eliminadas)
+
+        Returns:
+            int: Imágenes borradas
+        """
+        borradas = 0
+        for raiz, _, archivos in os.walk(self.directorio):
+            for nombre in archivos:
+                ruta = os.path.join(raiz, nombre)
+                if nombre.endswith(SUFIJO_BORRANDO):
+                    # Apartada por un liberar() que no terminó: se restaura y se vuelve a evaluar
+                    original = ruta[:ruta.index('.jpg') + len('.jpg')]
+                    try:
+                        if not os.path.exists(original):
+                            os.replace(ruta, original)
+                        else:
+                            os.remove(ruta)
+                    except FileNotFoundError:
+                        continue
+                    ruta = original
+                elif not nombre.endswith('.jpg'):
+                    continue
+                if self.liberar(db, ruta):
+                    borradas += 1
+        if borradas:
+            print(f"Imágenes sin referencias borradas: {borradas}")
+        return borradas
+
+_almacen = None
+_almacen_lock = threading.Lock()
+
+def obtener_almacen():
+    """Almacén de imágenes de pertenencias, creado al primer uso"""
+    global _almacen
+    if _almacen is None:
+        with _almacen_lock:
+            if _almacen is None:
+                _almacen = AlmacenContenido(PERTENENCIAS_DIR, gracia=ALMACEN_GRACIA, calidad=CALIDAD_JPEG)
+    return _almacen
@@ -0,0 +1,142 @@
+import os
+import hashlib
+import threading
+
+import cv2
+
+from utils.config import DERIVADOS_DIR, TAMANOS_DERIVADOS, DERIVADOS_MAXIMO, CALIDAD_JPEG
+
+# Al superar el máximo se borra hasta quedar en esta fracción, para no desalojar en cada escritura
+FRACCION_DESALOJO = 0.9
+
+class CacheDerivados:
+    """
+    Miniaturas y vistas previas de imágenes, generadas al primer pedido
+
+    Cada derivado se guarda en disco con un nombre que combina la ruta del
+    original, su fecha de modificación y el tamaño: si el original cambia
+    (p. ej. se vuelve a capturar la foto) el nombre cambia y la copia vieja
+    queda sin uso hasta que se desaloja. La fecha de modificación de cada
+    derivado se renueva al servirlo; si la carpeta supera `maximo` bytes se
+    borran los menos usados recientemente.
+    """
+
+    def __init__(self, directorio, tamanos, maximo=200 * 1024 * 1024, calidad=90):
+        """
+        Args:
+            directorio: Carpeta de los derivados
+            tamanos: dict nombre -> lado máximo en píxeles
+            maximo: Bytes máximos de derivados en disco
+            calidad: Calidad JPEG de los derivados
+        """
+        self.directorio = directorio
+        self.tamanos = tamanos
+        self.maximo = maximo
+        self.calidad = calidad
+        self.total = None
+        self.lock = threading.Lock()
+
+    def _ruta(self, original, lado):
+        estado = os.stat(original)
+        clave = hashlib.sha256(f'{os.path.abspath(original)}|{estado.st_mtime_ns}|{estado.st_size}|{lado}'.encode('utf-8')).hexdigest()
+        return os.path.join(self.directorio, clave[:2], f'{clave[2:34]}.jpg')
+
+    def obtener(self, original, tamano):
+        """
+        Ruta del derivado de `original` en el tamaño pedido, generándolo si hace falta
+
+        Args:
+            original: Ruta de la imagen original (debe existir)
+            tamano: Nombre de un tamaño configurado
+
+        Returns:
+            str: Ruta del derivado, o la del original si ya es de ese tamaño o menor
+
+        Raises:
+            KeyError: Si el tamaño no está configurado
+            ValueError: Si el original no es una imagen válida
+        """
+        lado = self.tamanos[tamano]
+        ruta = self._ruta(original, lado)
+        try:
+            os.utime(ruta)
+            return ruta
+        except FileNotFoundError:
+            pass
+
+        imagen = cv2.imread(original, cv2.IMREAD_UNCHANGED)
+        if imagen is None:
+            raise ValueError(f"Imagen inválida: {original}")
+        alto, ancho = imagen.shape[:2]
+        escala = lado / max(alto, ancho)
+        if escala >= 1:
+            return original
+        reducida = cv2.resize(imagen, (max(1, round(ancho * escala)), max(1, round(alto * escala))),
+                              interpolation=cv2.INTER_AREA)
+        ok, datos = cv2.imencode('.jpg', reducida, [cv2.IMWRITE_JPEG_QUALITY, self.calidad])
+        if not ok:
+            raise ValueError(f"No se pudo codificar el derivado de {original}")
+
+        # Escritura atómica: dos peticiones simultáneas generan el mismo contenido
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        temporal = f'{ruta}.{os.getpid()}.{threading.get_ident()}.parcial'
+        with open(temporal, 'wb') as archivo:
+            archivo.write(datos)
+        os.replace(temporal, ruta)
+        self._sumar(len(datos))
+        return ruta
+
+    def _archivos(self):
+        """(ruta, bytes, última modificación) de los derivados en disco"""
+        archivos = []
+        if not os.path.isdir(self.directorio):
+            return archivos
+        for raiz, _, nombres in os.walk(self.directorio):
+            for nombre in nombres:
+                if not nombre.endswith('.jpg'):
+                    continue
+                ruta = os.path.join(raiz, nombre)
+                try:
+                    estado = os.stat(ruta)
+                except FileNotFoundError:
+                    continue
+                archivos.append((ruta, estado.st_size, estado.st_mtime))
+        return archivos
+
+    def _sumar(self, bytes_nuevos):
+        with self.lock:
+            if self.total is None:
+                self.total = sum(tamano for _, tamano, _ in self._archivos())
+            else:
+                self.total += bytes_nuevos
+            if self.total > self.maximo:
+                self.total = self._desalojar()
+
+    def _desalojar(self):
+        """Borra los derivados usados hace más tiempo hasta bajar del máximo; devuelve el total restante"""
+        archivos = self._archivos()
+        total = sum(tamano for _, tamano, _ in archivos)
+        objetivo = self.maximo * FRACCION_DESALOJO
+        for ruta, tamano, _ in sorted(archivos, key=lambda a: a[2]):
+            if total <= objetivo:
+                break
+            try:
+                os.remove(ruta)
+            except FileNotFoundError:
+                pass
+            total -= tamano
+        return total
+
+_cache = None
+_cache_pid = None
+_cache_lock = threading.Lock()
+
+def obtener_cache_derivados():
+    """Caché de derivados del proceso, creada al primer uso (y de nuevo tras un fork)"""
+    global _cache, _cache_pid
+    if _cache is None or _cache_pid != os.getpid():
+        with _cache_lock:
+            if _cache is None or _cache_pid != os.getpid():
+                _cache = CacheDerivados(DERIVADOS_DIR, TAMANOS_DERIVADOS, DERIVADOS_MAXIMO, CALIDAD_JPEG)
+                _cache_pid = os.getpid()
+    return _cache
@@ -0,0 +1,288 @@
+import os
+import time
+import queue
+import atexit
+import threading
+
+import cv2
+import numpy as np
+
+from utils.config import (
+    ESCRITOR_HILOS,
+    ESCRITOR_COLA_MAXIMA,
+    ESCRITOR_FSYNC,
+    ESCRITOR_FSYNC_LOTE,
+    CALIDAD_JPEG
+)
+
+# Sufijo de los archivos a medio escribir; si quedan tras una caída se limpian en recuperar()
+SUFIJO_PARCIAL = '.parcial'
+POLITICAS_FSYNC = ('siempre', 'lote', 'nunca')
+
+def es_jpeg(datos):
+    """
+    Si los bytes son un JPEG completo (marcadores SOI al inicio y EOI al final)
+
+    Basta para guardar la subida tal cual sin decodificarla; una subida
+    cortada no termina en EOI y se rechaza.
+    """
+    if datos is None or len(datos) < 4 or bytes(datos[:3]) != b'\xff\xd8\xff':
+        return False
+    # Algunas cámaras agregan relleno después de EOI
+    return b'\xff\xd9' in bytes(datos[-64:])
+
+def preparar_imagen(datos):
+    """
+    Valida una imagen subida y la deja lista para el escritor
+
+    Returns:
+        bytes-like | numpy array: Los bytes originales si ya son JPEG, o la
+        imagen decodificada (PNG, BMP...) para codificarla a JPEG en segundo plano
+
+    Raises:
+        ValueError: Si no es una imagen válida
+    """
+    if isinstance(datos, np.ndarray):
+        return datos
+    if es_jpeg(datos):
+        return datos
+    imagen = cv2.imdecode(np.frombuffer(datos, np.uint8), cv2.IMREAD_COLOR) if datos else None
+    if imagen is None:
+        raise ValueError("Imagen inválida")
+    return imagen
+
+def _fsync_directorio(directorio):
+    try:
+        fd = os.open(directorio, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+class EscritorImagenes:
+    """
+    Escribe las imágenes de pertenencias en segundo plano
+
+    guardar() encola la escritura y devuelve enseguida; unos pocos hilos
+    escriben cada imagen en un archivo temporal y lo renombran a la ruta
+    final, así la ruta nunca apunta a un archivo a medias. La cola es
+    acotada: si está llena, la petición escribe ella misma (contrapresión en
+    lugar de memoria sin límite).
+
+    Política de fsync:
+        siempre: fsync de cada archivo y su directorio antes de darlo por escrito
+        lote:    fsync de los archivos pendientes cada `fsync_lote` escrituras
+                 o cuando la cola se vacía
+        nunca:   se deja al sistema operativo
+    """
+
+    def __init__(self, hilos=2, cola_maxima=256, fsync='lote', fsync_lote=32, calidad=95):
+        if fsync not in POLITICAS_FSYNC:
+            raise ValueError(f"Política de fsync inválida: {fsync} (opciones: {', '.join(POLITICAS_FSYNC)})")
+        self.cantidad_hilos = max(1, hilos)
+        self.cola = queue.Queue(maxsize=max(1, cola_maxima))
+        self.fsync = fsync
+        self.fsync_lote = max(1, fsync_lote)
+        self.calidad = calidad
+        self.hilos = []
+        self.lock = threading.Lock()
+        self.sin_sincronizar = []
+        # Métricas
+        self.escritas = 0
+        self.en_linea = 0
+        self.errores = 0
+
+    def _iniciar(self):
+        """Arranca los hilos en el primer uso (no al importar ni antes de un fork)"""
+        if len(self.hilos) == self.cantidad_hilos:
+            return
+        with self.lock:
+            if not self.hilos:
+                atexit.register(self.cerrar)
+            while len(self.hilos) < self.cantidad_hilos:
+                hilo = threading.Thread(target=self._bucle, name=f"escritor-imagenes-{len(self.hilos)}", daemon=True)
+                hilo.start()
+                self.hilos.append(hilo)
+
+    def guardar(self, imagen, ruta):
+        """
+        Encola la escritura de una imagen
+
+        Args:
+            imagen: Bytes JPEG (se guardan tal cual) o numpy array (se codifica a JPEG),
+                    normalmente el resultado de preparar_imagen
+            ruta: Ruta final del archivo
+
+        Returns:
+            str: La misma ruta, válida en cuanto termine la escritura
+        """
+        self._iniciar()
+        try:
+            self.cola.put_nowait((imagen, ruta))
+        except queue.Full:
+            with self.lock:
+                self.en_linea += 1
+            self._escribir(imagen, ruta)
+            self._sincronizar()
+        return ruta
+
+    def _bucle(self):
+        while True:
+            imagen, ruta = self.cola.get()
+            try:
+                if ruta is None:
+                    return
+                self._escribir(imagen, ruta)
+                with self.lock:
+                    pendientes = len(self.sin_sincronizar)
+                if pendientes >= self.fsync_lote or self.cola.empty():
+                    self._sincronizar()
+            finally:
+                self.cola.task_done()
+
+    def _escribir(self, imagen, ruta):
+        # Dos workers pueden escribir la misma ruta (mismo contenido) a la vez
+        temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}{SUFIJO_PARCIAL}"
+        try:
+            if isinstance(imagen, np.ndarray):
+                ok, codificada = cv2.imencode('.jpg', imagen, [cv2.IMWRITE_JPEG_QUALITY, self.calidad])
+                if not ok:
+                    raise IOError("No se pudo codificar la imagen")
+                imagen = codificada
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            with open(temporal, 'wb') as archivo:
+                archivo.write(imagen)
+                if self.fsync == 'siempre':
+                    archivo.flush()
+                    os.fsync(archivo.fileno())
+            with self.lock:
+                os.replace(temporal, ruta)
+                self.escritas += 1
+                if self.fsync == 'lote':
+                    self.sin_sincronizar.append(ruta)
+            if self.fsync == 'siempre':
+                _fsync_directorio(os.path.dirname(ruta))
+        except Exception as e:
+            with self.lock:
+                self.errores += 1
+            print(f"Error al escribir imagen {ruta}: {str(e)}")
+            try:
+                os.remove(temporal)
+            except OSError:
+                pass
+
+    def _sincronizar(self):
+        """fsync de los archivos escritos desde la última sincronización (política 'lote')"""
+        with self.lock:
+            rutas, self.sin_sincronizar = self.sin_sincronizar, []
+        directorios = set()
+        for ruta in rutas:
+            try:
+                fd = os.open(ruta, os.O_RDONLY)
+            except OSError:
+                continue
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            directorios.add(os.path.dirname(ruta))
+        for directorio in directorios:
+            _fsync_directorio(directorio)
+
+    def esperar(self):
+        """Bloquea hasta que no quedan escrituras en cola"""
+        if self.hilos:
+            self.cola.join()
+        self._sincronizar()
+
+    def cerrar(self):
+        """Termina las escrituras pendientes y detiene los hilos"""
+        with self.lock:
+            hilos, self.hilos = self.hilos, []
+        for _ in hilos:
+            self.cola.put((None, None))
+        for hilo in hilos:
+            hilo.join()
+        self._sincronizar()
+
+    def metricas(self):
+        return {
+            'en_cola': self.cola.qsize(),
+            'cola_maxima': self.cola.maxsize,
+            'escritas': self.escritas,
+            'en_linea': self.en_linea,
+            'errores': self.errores,
+            'fsync': self.fsync
+        }
+
+def recuperar(directorio, db=None, horas=24, antiguedad=60):
+    """
+    Reconciliación tras una caída
+
+    Borra los archivos temporales que quedaron a medio escribir (con más de
+    `antiguedad` segundos, para no tocar los de otro worker en marcha) y, con
+    `db`, busca pertenencias de las últimas `horas` cuya imagen no llegó a
+    escribirse (la fila se inserta sin esperar al escritor). Los bytes de
+    esas imágenes estaban solo en la cola en memoria y se perdieron con el
+    proceso: su ruta_imagen se vacía para que la API responda 404 en lugar
+    de apuntar a un archivo que no existe. Las filas de menos de `antiguedad`
+    segundos no se revisan: su imagen puede seguir en la cola de otro worker.
+
+    Returns:
+        dict: parciales (temporales borrados) y perdidas (id, ruta_imagen de
+              filas sin archivo, ya vaciadas)
+    """
+    parciales = 0
+    ahora = time.time()
+    for raiz, _, archivos in os.walk(directorio):
+        for nombre in archivos:
+            if nombre.endswith(SUFIJO_PARCIAL):
+                ruta = os.path.join(raiz, nombre)
+                try:
+                    if ahora - os.path.getmtime(ruta) >= antiguedad:
+                        os.remove(ruta)
+                        parciales += 1
+                except OSError:
+                    pass
+
+    perdidas = []
+    if db is not None:
+        filas = db.obtener_todos(
+            "SELECT id, ruta_imagen FROM pertenencias "
+            "WHERE fecha_entrada >= CURRENT_TIMESTAMP - make_interval(hours => %s) "
+            "AND fecha_entrada < CURRENT_TIMESTAMP - make_interval(secs => %s) "
+            "AND ruta_imagen <> '' ORDER BY id",
+            (horas, antiguedad)
+        )
+        # ruta_imagen es relativa a `directorio` (o absoluta en filas antiguas)
+        perdidas = [(id_pertenencia, ruta) for id_pertenencia, ruta in filas
+                    if not os.path.exists(os.path.join(directorio, ruta))]
+        if perdidas:
+            # Solo si la ruta no cambió mientras tanto
+            db.ejecutar(
+                "UPDATE pertenencias SET ruta_imagen = '' "
+                "FROM unnest(%s::int[], %s::text[]) AS p(id, ruta) "
+                "WHERE pertenencias.id = p.id AND pertenencias.ruta_imagen = p.ruta",
+                ([id_pertenencia for id_pertenencia, _ in perdidas], [ruta for _, ruta in perdidas])
+            )
+    if parciales or perdidas:
+        print(f"Recuperación de imágenes: {parciales} temporales borrados, "
+              f"{len(perdidas)} pertenencias sin imagen (ruta_imagen vaciada)")
+    return {'parciales': parciales, 'perdidas': perdidas}
+
+_escritor = None
+_escritor_pid = None
+_escritor_lock = threading.Lock()
+
+def obtener_escritor():
+    """Escritor del proceso, creado al primer uso (y de nuevo tras un fork)"""
+    global _escritor, _escritor_pid
+    if _escritor is None or _escritor_pid != os.getpid():
+        with _escritor_lock:
+            if _escritor is None or _escritor_pid != os.getpid():
+                _escritor = EscritorImagenes(ESCRITOR_HILOS, ESCRITOR_COLA_MAXIMA, ESCRITOR_FSYNC,
+                                             ESCRITOR_FSYNC_LOTE, CALIDAD_JPEG)
+                _escritor_pid = os.getpid()
+    return _escritor
@@ -1,53 +1,161 @@
 from flask import Blueprint, send_file, request, jsonify
-from ..reportes.generador import GeneradorReportes
-from ..utils.database import Database
-from datetime import datetime
+from core.reportes.generador import GeneradorReportes
+from core.reportes.trabajos import obtener_cola
+from core.reportes.estadisticas import EstadisticasPertenencias
+from utils.database import Database
+from utils.auth import login_required
+from utils.config import REPORTE_ESPERA, ESTADISTICAS_DIAS
+from datetime import datetime, timedelta
 
 reportes_bp = Blueprint('reportes', __name__)
 
+# Tipos de reporte: (método de GeneradorReportes, extensión, mimetype)
+TIPOS_REPORTE = {
+    'pertenencias_excel': ('generar_reporte_pertenencias', 'xlsx',
+                           'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'pertenencias_pdf': ('generar_pdf_pertenencias', 'pdf', 'application/pdf'),
+}
+
+def _fecha(valor, fin=False):
+    """Fecha ISO; con fin=True una fecha sin hora incluye todo ese día"""
+    if not valor:
+        return None
+    fecha = datetime.fromisoformat(valor)
+    if fin and len(valor) == 10:
+        fecha += timedelta(days=1)
+    return fecha
+
+def _filtros(datos):
+    """Filtros del reporte a partir de los parámetros o del body"""
+    filtros = {
+        'estudiante': datos.get('estudiante'),
+        'codigo_estudiante': datos.get('codigo_estudiante'),
+        'estado': datos.get('estado'),
+        'desde': _fecha(datos.get('desde')),
+        'hasta': _fecha(datos.get('hasta'), fin=True)
+    }
+    return {clave: valor for clave, valor in filtros.items() if valor}
+
+def _encolar(tipo, filtros):
+    metodo, extension, _ = TIPOS_REPORTE[tipo]
+
+    def generar(archivo):
+        generador = GeneradorReportes(Database())
+        _, filas = getattr(generador, metodo)(filtros, destino=archivo)
+        return filas
+
+    nombre = f"Reporte_Pertenencias_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+    return obtener_cola().enviar(tipo, filtros, generar, extension, nombre)
+
+def _responder(tipo, datos):
+    """
+    Encola el reporte; si no se pidió asincrono y termina dentro de
+    REPORTE_ESPERA segundos, lo envía directamente, si no responde 202 con el trabajo
+    """
+    try:
+        filtros = _filtros(datos)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    cola = obtener_cola()
+    id_trabajo = _encolar(tipo, filtros)
+    asincrono = str(datos.get('asincrono', '')).lower() in ('1', 'true')
+    terminado = not asincrono and cola.esperar(id_trabajo, REPORTE_ESPERA)
+    if terminado:
+        archivo = cola.archivo(id_trabajo)
+        if archivo is not None:
+            ruta, nombre = archivo
+            return send_file(ruta, as_attachment=True, download_name=nombre, mimetype=TIPOS_REPORTE[tipo][2])
+    estado = cola.estado(id_trabajo)
+    if estado is None or (terminado and estado['estado'] == 'listo'):
+        # limpiar() (de este u otro worker) borró el trabajo antes de enviarlo
+        return jsonify({'error': 'El reporte ya no está disponible, vuelva a solicitarlo'}), 410
+    if terminado and estado['estado'] == 'error':
+        return jsonify({'error': estado.get('error') or 'Error al generar reporte'}), 500
+    return jsonify(estado), 202
+
 @reportes_bp.route('/reportes/pertenencias', methods=['GET'])
+@login_required
 def generar_reporte_pertenencias():
     try:
-        # Obtener filtros
-        filtros = {
-            'estudiante': request.args.get('estudiante'),
-            'estado': request.args.get('estado')
-        }
-        
-        # Generar reporte
-        db = Database()
-        generador = GeneradorReportes(db)
-        excel_buffer = generador.generar_reporte_pertenencias(filtros)
-        
-        # Enviar archivo
-        return send_file(
-            excel_buffer,
-            as_attachment=True,
-            download_name=f"Reporte_Pertenencias_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        
+        return _responder('pertenencias_excel', request.args)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @reportes_bp.route('/reportes/pertenencias/consulta', methods=['POST'])
+@login_required
 def consultar_pertenencias():
     try:
         # Obtener filtros del body
-        filtros = request.json or {}
-        
-        # Generar reporte
-        db = Database()
-        generador = GeneradorReportes(db)
-        excel_buffer = generador.generar_reporte_pertenencias(filtros)
-        
-        # Enviar archivo
-        return send_file(
-            excel_buffer,
-            as_attachment=True,
-            download_name=f"Reporte_Pertenencias_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        
+        return _responder('pertenencias_excel', request.json or {})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@reportes_bp.route('/ia/pertenencias/reporte/pdf', methods=['GET'])
+@login_required
+def reporte_pertenencias_pdf():
+    """
+    Reporte PDF de pertenencias
+
+    Parámetros: codigo_estudiante, estudiante, estado, desde, hasta (fechas ISO).
+    Con asincrono=1 responde 202 con el id del trabajo; el reporte se
+    descarga desde /ia/reportes/trabajos/<id>/descarga cuando esté listo.
+    """
+    try:
+        return _responder('pertenencias_pdf', request.args)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@reportes_bp.route('/ia/reportes/trabajos/<id_trabajo>', methods=['GET'])
+@login_required
+def estado_trabajo_reporte(id_trabajo):
+    estado = obtener_cola().estado(id_trabajo)
+    if estado is None:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    return jsonify(estado)
+
+@reportes_bp.route('/ia/reportes/trabajos/<id_trabajo>/descarga', methods=['GET'])
+@login_required
+def descargar_trabajo_reporte(id_trabajo):
+    cola = obtener_cola()
+    archivo = cola.archivo(id_trabajo)
+    if archivo is None:
+        estado = cola.estado(id_trabajo)
+        if estado is None:
+            return jsonify({'error': 'Trabajo no encontrado'}), 404
+        if estado['estado'] == 'error':
+            return jsonify({'error': estado.get('error')}), 500
+        return jsonify({'error': 'El reporte aún no está listo'}), 409
+    ruta, nombre = archivo
+    return send_file(ruta, as_attachment=True, download_name=nombre)
+
+@reportes_bp.route('/ia/estadisticas/resumen', methods=['GET'])
+@login_required
+def estadisticas_resumen():
+    """Objetos en custodia, entradas, salidas y permanencia promedio"""
+    try:
+        return jsonify(EstadisticasPertenencias(Database()).resumen())
     except Exception as e:
-        return jsonify({'error': str(e)}), 500 
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+@reportes_bp.route('/ia/estadisticas/tipos', methods=['GET'])
+@login_required
+def estadisticas_por_tipo():
+    """Las mismas cifras del resumen por tipo de objeto"""
+    try:
+        return jsonify({'tipos': EstadisticasPertenencias(Database()).por_tipo()})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@reportes_bp.route('/ia/estadisticas/horas', methods=['GET'])
+@login_required
+def estadisticas_horas():
+    """Entradas y salidas por hora del día; parámetro dias (por defecto ESTADISTICAS_DIAS)"""
+    try:
+        dias = int(request.args.get('dias', ESTADISTICAS_DIAS))
+    except ValueError:
+        return jsonify({'error': 'dias debe ser un número entero'}), 400
+    try:
+        return jsonify(EstadisticasPertenencias(Database()).horas_pico(min(max(dias, 1), 366)))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
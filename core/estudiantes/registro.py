@@ -0,0 +1,171 @@
+import os
+import time
+import bisect
+import threading
+from datetime import timedelta
+
+from utils.config import DATASET_FACIAL, REGISTRO_REFRESCO
+
+# Las filas se releen con este margen hacia atrás, por si una inscripción
+# confirmó tarde con un `actualizado` anterior a la última lectura
+MARGEN_SINCRONIZACION = timedelta(seconds=60)
+
+# Inscripción: agrega las fotos nuevas a las que ya tenía el estudiante
+REGISTRAR = '''
+    INSERT INTO estudiantes (codigo_estudiante, fotos) VALUES (%s, %s)
+    ON CONFLICT (codigo_estudiante) DO UPDATE
+    SET fotos = ARRAY(SELECT DISTINCT unnest(estudiantes.fotos || EXCLUDED.fotos) ORDER BY 1),
+        actualizado = CURRENT_TIMESTAMP
+    RETURNING codigo_estudiante, fotos, fecha_registro, actualizado
+'''
+
+# Reconciliación con DATASET_FACIAL: las fotos en disco reemplazan a las registradas
+RECONCILIAR = '''
+    INSERT INTO estudiantes (codigo_estudiante, fotos) VALUES %s
+    ON CONFLICT (codigo_estudiante) DO UPDATE
+    SET fotos = EXCLUDED.fotos, actualizado = CURRENT_TIMESTAMP
+    WHERE estudiantes.fotos IS DISTINCT FROM EXCLUDED.fotos
+    RETURNING codigo_estudiante, fotos, fecha_registro, actualizado
+'''
+
+COLUMNAS = 'codigo_estudiante, fotos, fecha_registro, actualizado'
+
+class RegistroEstudiantes:
+    """
+    Índice en memoria de los estudiantes inscritos: código -> fotos y fecha de inscripción
+
+    Se construye una vez al arrancar desde la tabla estudiantes, reconciliada
+    con los archivos de DATASET_FACIAL (una sola lectura de la carpeta), y
+    se actualiza en cada inscripción. Así el login es una búsqueda en un dict
+    y el listado una página de una lista ordenada, sin recorrer la carpeta.
+
+    Cada worker de gunicorn tiene su copia: las inscripciones hechas en otro
+    worker se traen de la tabla como mucho cada `refresco` segundos al
+    listar, y al momento si el login no encuentra el código.
+    """
+
+    def __init__(self, db, directorio=DATASET_FACIAL, refresco=REGISTRO_REFRESCO):
+        self.db = db
+        self.directorio = directorio
+        self.refresco = refresco
+        self.estudiantes = {}
+        self.codigos = []
+        self.ultimo = None
+        self.sincronizado = 0.0
+        self.lock = threading.Lock()
+
+    def _consultar(self, query, params=None):
+        return self.db.obtener_todos(query, params)
+
+    def _aplicar(self, filas):
+        """Incorpora filas (codigo, fotos, fecha_registro, actualizado) de la tabla"""
+        with self.lock:
+            for codigo, fotos, fecha_registro, actualizado in filas:
+                if codigo not in self.estudiantes:
+                    bisect.insort(self.codigos, codigo)
+                self.estudiantes[codigo] = {'fotos': list(fotos or []), 'fecha_registro': fecha_registro}
+                if self.ultimo is None or actualizado > self.ultimo:
+                    self.ultimo = actualizado
+
+    def _fotos_en_disco(self):
+        """Una lectura de DATASET_FACIAL: código -> nombres de archivo ordenados"""
+        fotos = {}
+        if not os.path.isdir(self.directorio):
+            return fotos
+        with os.scandir(self.directorio) as entradas:
+            for entrada in entradas:
+                if entrada.name.endswith('.jpg') and '_' in entrada.name:
+                    fotos.setdefault(entrada.name.split('_')[0], []).append(entrada.name)
+        return {codigo: sorted(nombres) for codigo, nombres in fotos.items()}
+
+    def cargar(self):
+        """Construye el índice desde la tabla y lo reconcilia con las fotos en disco"""
+        inicio = time.perf_counter()
+        self._aplicar(self._consultar(f'SELECT {COLUMNAS} FROM estudiantes'))
+        en_disco = self._fotos_en_disco()
+        pendientes = [(codigo, fotos) for codigo, fotos in en_disco.items()
+                      if self.estudiantes.get(codigo, {}).get('fotos') != fotos]
+        if pendientes:
+            try:
+                with self.db.transaccion() as t:
+                    self._aplicar(t.ejecutar_valores(RECONCILIAR, pendientes))
+            except Exception as e:
+                # Sin base de datos el índice sigue sirviendo con lo que hay en disco
+                print(f"Error al reconciliar estudiantes: {str(e)}")
+                self._aplicar([(codigo, fotos, None, self.ultimo) for codigo, fotos in pendientes])
+        self.sincronizado = time.monotonic()
+        print(f"Registro de estudiantes cargado ({len(self.estudiantes)} estudiantes, "
+              f"{(time.perf_counter() - inicio) * 1000:.1f} ms)")
+
+    def sincronizar(self, forzar=False):
+        """Trae de la tabla las inscripciones hechas por otros procesos"""
+        if not forzar and time.monotonic() - self.sincronizado < self.refresco:
+            return
+        self.sincronizado = time.monotonic()
+        if self.ultimo is None:
+            filas = self._consultar(f'SELECT {COLUMNAS} FROM estudiantes')
+        else:
+            filas = self._consultar(f'SELECT {COLUMNAS} FROM estudiantes WHERE actualizado >= %s',
+                                    (self.ultimo - MARGEN_SINCRONIZACION,))
+        self._aplicar(filas)
+
+    def registrar(self, codigo_estudiante, fotos):
+        """
+        Inscribe al estudiante (o agrega fotos) en la tabla y en el índice
+
+        Args:
+            codigo_estudiante: Código del estudiante
+            fotos: Nombres de archivo de las fotos nuevas en DATASET_FACIAL
+        """
+        fotos = sorted(os.path.basename(foto) for foto in fotos)
+        cursor = self.db.ejecutar(REGISTRAR, (codigo_estudiante, fotos))
+        if cursor is None:
+            raise RuntimeError('No se pudo registrar el estudiante')
+        self._aplicar(cursor.fetchall())
+
+    def existe(self, codigo_estudiante):
+        """Si el estudiante está inscrito; un código desconocido se busca en la tabla"""
+        if codigo_estudiante in self.estudiantes:
+            return True
+        filas = self._consultar(f'SELECT {COLUMNAS} FROM estudiantes WHERE codigo_estudiante = %s',
+                                (codigo_estudiante,))
+        self._aplicar(filas)
+        return bool(filas)
+
+    def _publico(self, codigo):
+        estudiante = self.estudiantes[codigo]
+        fecha = estudiante['fecha_registro']
+        return {
+            'codigo': codigo,
+            'fotos': [f"/ia/estudiantes/foto/{foto}" for foto in estudiante['fotos']],
+            'total_fotos': len(estudiante['fotos']),
+            'fecha_registro': fecha.isoformat() if fecha else None
+        }
+
+    def listar(self):
+        """Todos los estudiantes ordenados por código"""
+        self.sincronizar()
+        with self.lock:
+            return [self._publico(codigo) for codigo in self.codigos]
+
+    def pagina(self, limite, cursor=None):
+        """
+        Una página de estudiantes ordenados por código
+
+        Args:
+            limite: Estudiantes por página
+            cursor: Token 'siguiente' de la página anterior (None para la primera)
+
+        Returns:
+            dict: estudiantes, total y siguiente (token, o None si no hay más)
+        """
+        self.sincronizar()
+        with self.lock:
+            inicio = bisect.bisect_right(self.codigos, cursor) if cursor else 0
+            codigos = self.codigos[inicio:inicio + limite]
+            siguiente = codigos[-1] if inicio + limite < len(self.codigos) else None
+            return {
+                'estudiantes': [self._publico(codigo) for codigo in codigos],
+                'total': len(self.codigos),
+                'siguiente': siguiente
+            }
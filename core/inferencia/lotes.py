@@ -0,0 +1,154 @@
+import time
+import queue
+import threading
+from collections import Counter, deque
+from concurrent.futures import Future
+
+import numpy as np
+
+from core.inferencia.pool import PoolSaturado
+
+class MicroLotes:
+    """
+    Agrupa peticiones concurrentes en lotes dinámicos
+
+    Un hilo de fondo toma la primera petición de la cola y espera como máximo
+    `espera_ms` (desde que esa petición llegó) a que se junten hasta `maximo`
+    elementos; luego llama a `procesar_lote` una sola vez y reparte cada
+    resultado a la petición que lo espera. Bajo poca carga un lote es de 1 y
+    la latencia extra está acotada por `espera_ms`. Con `hilos` > 1 se arman
+    y procesan varios lotes a la vez (p. ej. uno por worker del pool).
+
+    La cola es acotada: con `cola_maxima` elementos esperando, enviar() lanza
+    PoolSaturado (503) en lugar de acumular peticiones sin límite.
+    """
+
+    def __init__(self, procesar_lote, maximo=8, espera_ms=5, hilos=1, nombre='micro-lotes', muestras=1000,
+                 cola_maxima=64, reintentar=1):
+        """
+        Args:
+            procesar_lote: Función lista de elementos -> lista de resultados (mismo orden)
+            maximo: Elementos máximos por lote
+            espera_ms: Espera máxima para completar un lote
+            hilos: Lotes que pueden estar en proceso a la vez
+            nombre: Nombre del hilo de fondo
+            muestras: Esperas recientes que se guardan para los percentiles
+            cola_maxima: Elementos en espera máximos antes de rechazar
+            reintentar: Segundos sugeridos al cliente en Retry-After al rechazar
+        """
+        self.procesar_lote = procesar_lote
+        self.maximo = max(1, maximo)
+        self.espera = espera_ms / 1000
+        self.nombre = nombre
+        self.cola = queue.Queue(maxsize=max(1, cola_maxima))
+        self.reintentar = reintentar
+        self.cantidad_hilos = max(1, hilos)
+        self.hilos = []
+        self.lock = threading.Lock()
+        # Métricas
+        self.tamanos = Counter()
+        self.esperas = deque(maxlen=muestras)
+        self.errores = 0
+        self.rechazados = 0
+
+    def _iniciar(self):
+        """Arranca los hilos en el primer uso (no al importar ni antes de un fork)"""
+        if len(self.hilos) == self.cantidad_hilos:
+            return
+        with self.lock:
+            while len(self.hilos) < self.cantidad_hilos:
+                hilo = threading.Thread(target=self._bucle, name=f"{self.nombre}-{len(self.hilos)}", daemon=True)
+                hilo.start()
+                self.hilos.append(hilo)
+
+    def enviar(self, elemento):
+        """
+        Encola un elemento
+
+        Returns:
+            Future: Se resuelve con (resultado, espera en cola en ms, tamaño del lote)
+
+        Raises:
+            PoolSaturado: Si ya hay cola_maxima elementos esperando
+        """
+        self._iniciar()
+        futuro = Future()
+        try:
+            self.cola.put_nowait((elemento, futuro, time.perf_counter()))
+        except queue.Full:
+            with self.lock:
+                self.rechazados += 1
+            raise PoolSaturado(self.reintentar)
+        return futuro
+
+    def procesar(self, elemento, timeout=None):
+        """Encola un elemento y espera su resultado (ver enviar)"""
+        return self.enviar(elemento).result(timeout)
+
+    def _bucle(self):
+        while True:
+            lote = [self.cola.get()]
+            limite = lote[0][2] + self.espera
+            while len(lote) < self.maximo:
+                # Lo ya encolado entra sin esperar; solo se espera mientras quede plazo
+                restante = limite - time.perf_counter()
+                try:
+                    if restante > 0:
+                        lote.append(self.cola.get(timeout=restante))
+                    else:
+                        lote.append(self.cola.get_nowait())
+                except queue.Empty:
+                    break
+            self._ejecutar(lote)
+
+    def _ejecutar(self, lote):
+        inicio = time.perf_counter()
+        esperas = [(inicio - encolado) * 1000 for _, _, encolado in lote]
+        with self.lock:
+            self.tamanos[len(lote)] += 1
+            self.esperas.extend(esperas)
+
+        try:
+            resultados = self.procesar_lote([elemento for elemento, _, _ in lote])
+        except BaseException as e:
+            with self.lock:
+                self.errores += 1
+            for _, futuro, _ in lote:
+                futuro.set_exception(e)
+            return
+
+        for (_, futuro, _), resultado, espera in zip(lote, resultados, esperas):
+            futuro.set_result((resultado, espera, len(lote)))
+
+    def metricas(self):
+        """
+        Distribución de tamaños de lote y espera en cola (últimas muestras)
+
+        Returns:
+            dict: lotes, elementos, tamano_medio, distribucion, espera_ms (p50/p95/max),
+                  errores, rechazados y ocupación de la cola
+        """
+        with self.lock:
+            tamanos = dict(self.tamanos)
+            esperas = np.array(self.esperas, dtype=np.float64)
+            errores = self.errores
+            rechazados = self.rechazados
+        lotes = sum(tamanos.values())
+        elementos = sum(tamano * cantidad for tamano, cantidad in tamanos.items())
+        return {
+            'lotes': lotes,
+            'elementos': elementos,
+            'tamano_medio': round(elementos / lotes, 2) if lotes else 0,
+            'distribucion': {str(tamano): tamanos[tamano] for tamano in sorted(tamanos)},
+            'espera_ms': {
+                'p50': round(float(np.percentile(esperas, 50)), 2) if len(esperas) else 0,
+                'p95': round(float(np.percentile(esperas, 95)), 2) if len(esperas) else 0,
+                'max': round(float(esperas.max()), 2) if len(esperas) else 0
+            },
+            'errores': errores,
+            'rechazados': rechazados,
+            'en_cola': self.cola.qsize(),
+            'cola_maxima': self.cola.maxsize,
+            'maximo': self.maximo,
+            'espera_maxima_ms': self.espera * 1000
+        }
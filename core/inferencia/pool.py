@@ -0,0 +1,121 @@
+import os
+import threading
+import importlib
+import multiprocessing
+from functools import wraps
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Servicios que cada worker carga una sola vez al iniciar (módulo, clase, argumentos)
+SERVICIOS = {
+    'facial': ('core.reconocimiento.facial', 'ReconocimientoFacial', {}),
+    # Los lotes se arman en el proceso web; el worker no necesita su propio MicroLotes
+    'objetos': ('core.objetos.deteccion', 'DeteccionObjetos', {'lotes': False}),
+}
+
+# Estado propio de cada proceso worker
+_servicios = {}
+
+class PoolSaturado(Exception):
+    """La cola de inferencia está llena; el cliente debe reintentar más tarde"""
+
+    def __init__(self, reintentar):
+        super().__init__('Servicio de inferencia saturado, reintente más tarde')
+        self.reintentar = reintentar
+
+def en_pool(servicio):
+    """
+    Decorador para métodos de visión: si la instancia tiene un pool asignado
+    (self.pool) la llamada se ejecuta en un worker; si no, en línea
+    """
+    def decorador(metodo):
+        @wraps(metodo)
+        def decorado(self, *args, **kwargs):
+            if getattr(self, 'pool', None) is not None:
+                return self.pool.ejecutar(servicio, metodo.__name__, *args, **kwargs)
+            return metodo(self, *args, **kwargs)
+        return decorado
+    return decorador
+
+def _inicializar_worker(hilos_opencv):
+    """Configura los hilos de OpenCV/BLAS y carga los modelos del worker"""
+    for variable in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ[variable] = str(hilos_opencv)
+
+    import cv2
+    cv2.setNumThreads(hilos_opencv)
+
+    for nombre, (modulo, clase, argumentos) in SERVICIOS.items():
+        try:
+            _servicios[nombre] = getattr(importlib.import_module(modulo), clase)(**argumentos)
+        except Exception as e:
+            print(f"Worker {os.getpid()}: error al cargar {nombre}: {str(e)}")
+    print(f"Worker de inferencia {os.getpid()} listo ({', '.join(_servicios)})")
+
+def _ejecutar(servicio, metodo, args, kwargs):
+    """Ejecuta un método del servicio local del worker"""
+    return getattr(_servicios[servicio], metodo)(*args, **kwargs)
+
+class PoolInferencia:
+    """
+    Pool de procesos para las llamadas de visión (CPU intensivas)
+
+    Cada worker carga los modelos una vez y ejecuta las llamadas fuera del
+    proceso web, sin competir por el GIL. Las tareas en curso están acotadas:
+    si la cola está llena se lanza PoolSaturado en vez de encolar sin límite.
+    """
+
+    def __init__(self, workers, hilos_opencv=1, cola_maxima=16, timeout=30, reintentar=1):
+        self.workers = workers
+        self.hilos_opencv = hilos_opencv
+        self.cola_maxima = cola_maxima
+        self.timeout = timeout
+        self.reintentar = reintentar
+        self.cupos = threading.BoundedSemaphore(cola_maxima)
+        self.lock = threading.Lock()
+        self.executor = None
+        self._crear_executor()
+
+    def _crear_executor(self):
+        # spawn: los workers no heredan hilos de OpenCV ni conexiones del proceso web
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_inicializar_worker,
+            initargs=(self.hilos_opencv,)
+        )
+
+    def ejecutar(self, servicio, metodo, *args, **kwargs):
+        """
+        Ejecuta servicio.metodo(*args, **kwargs) en un worker y espera el resultado
+
+        Raises:
+            PoolSaturado: Si ya hay cola_maxima tareas en curso
+        """
+        if not self.cupos.acquire(blocking=False):
+            raise PoolSaturado(self.reintentar)
+        try:
+            with self.lock:
+                executor = self.executor
+            futuro = executor.submit(_ejecutar, servicio, metodo, args, kwargs)
+        except BrokenProcessPool:
+            self.cupos.release()
+            self._reiniciar(executor)
+            raise
+        futuro.add_done_callback(lambda _: self.cupos.release())
+
+        try:
+            return futuro.result(timeout=self.timeout)
+        except BrokenProcessPool:
+            self._reiniciar(executor)
+            raise
+
+    def _reiniciar(self, roto):
+        """Reemplaza el executor si un worker murió (p. ej. por falta de memoria)"""
+        with self.lock:
+            if self.executor is roto:
+                print("Pool de inferencia roto, reiniciando workers...")
+                self._crear_executor()
+
+    def cerrar(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -1,48 +1,222 @@
-import cv2
 import numpy as np
 import os
 from pathlib import Path
 import sys
-from datetime import datetime
+import time
+import threading
 
 # Agregar el directorio raíz al path
 ROOT_DIR = Path(__file__).parent.parent.parent
 sys.path.append(str(ROOT_DIR))
 
-from utils.config import PERTENENCIAS_DIR
+from utils.config import (
+    MODELO_OBJETOS,
+    MODELO_OBJETOS_ONNX,
+    MOTOR_OBJETOS,
+    CONFIANZA_OBJETO,
+    IOU_OBJETO,
+    TAMANO_OBJETOS,
+    LOTE_OBJETOS_MAXIMO,
+    LOTE_OBJETOS_ESPERA_MS,
+    LOTE_OBJETOS_COLA_MAXIMA,
+    INFERENCIA_REINTENTAR
+)
+from core.inferencia.pool import en_pool
+from core.almacenamiento.contenido import obtener_almacen
+from core.inferencia.lotes import MicroLotes
 
 class DeteccionObjetos:
-    def __init__(self):
-        """Inicializa el detector de objetos"""
-        pass
+    def __init__(self, pool=None, lotes=True):
+        """
+        Inicializa el detector de objetos
+        
+        Args:
+            pool: PoolInferencia opcional para ejecutar la inferencia en workers
+            lotes: Si agrupa las peticiones en micro-lotes; los workers del pool
+                   lo desactivan porque ya reciben los lotes armados
+        """
+        self.pool = pool
+        self.modelo = None
+        self.motor = None
+        self.nombres = {}
+        # Ni el predictor de ultralytics ni cv2.dnn son seguros entre hilos
+        self.lock = threading.Lock()
+        # Micro-lotes delante del detector: agrupa las peticiones concurrentes
+        # del proceso web (con pool, cada lote se envía como una sola tarea)
+        self.lotes = None
+        if lotes and LOTE_OBJETOS_MAXIMO > 1:
+            self.lotes = MicroLotes(
+                self.detectar_objetos_lote, LOTE_OBJETOS_MAXIMO, LOTE_OBJETOS_ESPERA_MS,
+                hilos=pool.workers if pool is not None else 1, nombre='lotes-objetos',
+                cola_maxima=LOTE_OBJETOS_COLA_MAXIMA,
+                reintentar=pool.reintentar if pool is not None else INFERENCIA_REINTENTAR
+            )
+        # Con pool el modelo vive solo en los workers; el proceso web no lo carga
+        if pool is None:
+            self.cargar_modelo()
+        
+    def cargar_modelo(self):
+        """
+        Carga el detector una sola vez y hace una inferencia de calentamiento
+        para que la primera petición no pague la inicialización
+        
+        Con MOTOR_OBJETOS 'auto' se usa el modelo ONNX si existe (sin importar
+        torch) y, si no, el .pt con ultralytics.
+        """
+        if MOTOR_OBJETOS == 'onnx' or (MOTOR_OBJETOS == 'auto' and os.path.exists(MODELO_OBJETOS_ONNX)):
+            self._cargar_onnx()
+        else:
+            self._cargar_ultralytics()
+            
+    def _cargar_onnx(self):
+        """Carga el detector exportado a ONNX (onnxruntime o cv2.dnn)"""
+        try:
+            if not os.path.exists(MODELO_OBJETOS_ONNX):
+                print(f"Modelo de objetos ONNX no encontrado: {MODELO_OBJETOS_ONNX}")
+                return
+                
+            inicio = time.perf_counter()
+            from core.objetos.motor_onnx import MotorONNX
+            
+            motor = MotorONNX(MODELO_OBJETOS_ONNX, TAMANO_OBJETOS)
+            motor.detectar([np.zeros((motor.tamano, motor.tamano, 3), dtype=np.uint8)], CONFIANZA_OBJETO, IOU_OBJETO)
+            self.motor = motor
+            self.nombres = motor.nombres
+            print(f"Modelo de objetos ONNX cargado exitosamente ({motor.backend}, "
+                  f"{(time.perf_counter() - inicio) * 1000:.1f} ms)")
+        except Exception as e:
+            print(f"Error al cargar el modelo de objetos ONNX: {str(e)}")
+            
+    def _cargar_ultralytics(self):
+        """Carga el modelo .pt con ultralytics y fusiona Conv+BN"""
+        try:
+            if not os.path.exists(MODELO_OBJETOS):
+                print(f"Modelo de objetos no encontrado: {MODELO_OBJETOS}")
+                return
+                
+            inicio = time.perf_counter()
+            from ultralytics import YOLO
+            
+            modelo = YOLO(MODELO_OBJETOS)
+            modelo.fuse()
+            modelo.predict(
+                np.zeros((TAMANO_OBJETOS, TAMANO_OBJETOS, 3), dtype=np.uint8),
+                imgsz=TAMANO_OBJETOS, device='cpu', verbose=False
+            )
+            self.modelo = modelo
+            self.nombres = dict(modelo.names)
+            print(f"Modelo de objetos cargado exitosamente ({len(self.nombres)} clases, "
+                  f"{(time.perf_counter() - inicio) * 1000:.1f} ms)")
+        except Exception as e:
+            print(f"Error al cargar el modelo de objetos: {str(e)}")
+            
+    def detectar_objetos(self, imagen):
+        """
+        Detecta objetos en una imagen
+        
+        Las peticiones concurrentes se agrupan en micro-lotes (LOTE_OBJETOS_MAXIMO
+        imágenes o LOTE_OBJETOS_ESPERA_MS de espera, lo que ocurra primero).
+        
+        Args:
+            imagen: Imagen BGR en formato numpy array
+            
+        Returns:
+            dict: objetos (clase, nombre, confianza y caja x1/y1/x2/y2 en píxeles
+                  de la imagen original) y tiempos de la llamada en ms
+        """
+        if imagen is None:
+            raise ValueError("Imagen inválida")
+        if self.lotes is None:
+            return self.detectar_objetos_lote([imagen])[0]
+            
+        inicio = time.perf_counter()
+        resultado, cola, tamano = self.lotes.procesar(imagen)
+        resultado['tiempos']['cola'] = round(cola, 2)
+        resultado['tiempos']['total'] = round((time.perf_counter() - inicio) * 1000, 2)
+        resultado['lote'] = tamano
+        return resultado
+        
+    @en_pool('objetos')
+    def detectar_objetos_lote(self, imagenes):
+        """
+        Detecta objetos en varias imágenes con una sola pasada de la red
+        
+        Args:
+            imagenes: Lista de imágenes BGR
+            
+        Returns:
+            list: Por imagen, dict como detectar_objetos; los tiempos de
+                  preproceso/inferencia/postproceso son los del lote completo
+        """
+        if self.motor is None and self.modelo is None:
+            raise RuntimeError("Modelo de objetos no cargado")
+            
+        inicio = time.perf_counter()
+        with self.lock:
+            espera = time.perf_counter() - inicio
+            if self.motor is not None:
+                detecciones, tiempos = self.motor.detectar(imagenes, CONFIANZA_OBJETO, IOU_OBJETO)
+            else:
+                resultados = self.modelo.predict(
+                    imagenes, imgsz=TAMANO_OBJETOS, conf=CONFIANZA_OBJETO, iou=IOU_OBJETO,
+                    device='cpu', verbose=False
+                )
+                detecciones = [
+                    (r.boxes.xyxy.cpu().numpy(), r.boxes.cls.cpu().numpy(), r.boxes.conf.cpu().numpy())
+                    for r in resultados
+                ]
+                # ultralytics informa el promedio por imagen
+                tiempos = {
+                    'preproceso': resultados[0].speed['preprocess'] * len(imagenes),
+                    'inferencia': resultados[0].speed['inference'] * len(imagenes),
+                    'postproceso': resultados[0].speed['postprocess'] * len(imagenes)
+                }
+        
+        tiempos = {nombre: round(ms, 2) for nombre, ms in tiempos.items()}
+        tiempos['espera'] = round(espera * 1000, 2)
+        tiempos['total'] = round((time.perf_counter() - inicio) * 1000, 2)
+        return [
+            {'objetos': self._objetos(cajas, clases, puntajes), 'tiempos': dict(tiempos)}
+            for cajas, clases, puntajes in detecciones
+        ]
+        
+    def metricas(self):
+        """Métricas del micro-lotes (tamaños de lote y espera en cola)"""
+        return self.lotes.metricas() if self.lotes is not None else {}
+        
+    def _objetos(self, cajas, clases, puntajes):
+        """Detecciones en el formato JSON de la API"""
+        objetos = []
+        for (x1, y1, x2, y2), clase, confianza in zip(
+            np.asarray(cajas).tolist(),
+            np.asarray(clases).astype(int).tolist(),
+            np.asarray(puntajes).tolist()
+        ):
+            objetos.append({
+                'clase': clase,
+                'nombre': self.nombres.get(clase, str(clase)),
+                'confianza': round(confianza * 100, 2),
+                'caja': {'x1': round(x1), 'y1': round(y1), 'x2': round(x2), 'y2': round(y2)}
+            })
+        return objetos
         
     def guardar_imagen(self, imagen, codigo_estudiante, tipo_objeto):
         """
-        Guarda la imagen del objeto
+        Guarda la imagen del objeto en el almacén por contenido
+        (core/almacenamiento/contenido.py); la escritura sigue en segundo plano
         
         Args:
-            imagen: Imagen en formato numpy array
+            imagen: Bytes de la imagen subida (un JPEG se guarda tal cual, sin
+                    recodificar) o imagen en formato numpy array
             codigo_estudiante: Código del estudiante
             tipo_objeto: Tipo de objeto
             
         Returns:
-            str: Ruta de la imagen guardada o None si hay error
+            str: Ruta relativa de la imagen para ruta_imagen (la misma para imágenes idénticas)
+                 o None si hay error
         """
         try:
-            # Crear directorio si no existe
-            fecha = datetime.now().strftime("%Y%m%d")
-            ruta_directorio = os.path.join(PERTENENCIAS_DIR, codigo_estudiante, fecha)
-            os.makedirs(ruta_directorio, exist_ok=True)
-            
-            # Generar nombre único para la imagen
-            timestamp = datetime.now().strftime("%H%M%S")
-            nombre_archivo = f"{tipo_objeto}_{timestamp}.jpg"
-            ruta_imagen = os.path.join(ruta_directorio, nombre_archivo)
-            
-            # Guardar imagen
-            cv2.imwrite(ruta_imagen, imagen)
-            
-            return ruta_imagen
+            return obtener_almacen().guardar(imagen)
             
         except Exception as e:
             print(f"Error al guardar imagen: {str(e)}")
@@ -0,0 +1,183 @@
+import os
+import json
+import time
+import numpy as np
+import cv2
+
+# Color de relleno del letterbox (el mismo que usa ultralytics al entrenar)
+RELLENO = 114
+# Candidatos máximos antes de NMS y detecciones máximas por imagen
+MAX_CANDIDATOS = 30000
+MAX_DETECCIONES = 300
+# Desplazamiento por clase para hacer NMS por clase en una sola pasada
+DESPLAZAMIENTO_CLASE = 7680
+
+def letterbox(imagen, tamano):
+    """
+    Redimensiona manteniendo la proporción y rellena hasta tamano x tamano
+
+    Returns:
+        tuple: (imagen cuadrada, escala, (relleno_x, relleno_y))
+    """
+    alto, ancho = imagen.shape[:2]
+    escala = min(tamano / alto, tamano / ancho)
+    nuevo_ancho, nuevo_alto = int(round(ancho * escala)), int(round(alto * escala))
+    relleno_x, relleno_y = (tamano - nuevo_ancho) / 2, (tamano - nuevo_alto) / 2
+
+    if (nuevo_ancho, nuevo_alto) != (ancho, alto):
+        imagen = cv2.resize(imagen, (nuevo_ancho, nuevo_alto), interpolation=cv2.INTER_LINEAR)
+    arriba, abajo = int(round(relleno_y - 0.1)), int(round(relleno_y + 0.1))
+    izquierda, derecha = int(round(relleno_x - 0.1)), int(round(relleno_x + 0.1))
+    imagen = cv2.copyMakeBorder(
+        imagen, arriba, abajo, izquierda, derecha, cv2.BORDER_CONSTANT, value=(RELLENO,) * 3
+    )
+    return imagen, escala, (izquierda, arriba)
+
+def preprocesar(imagenes, tamano):
+    """
+    Letterbox de un lote de imágenes BGR y conversión a tensor NCHW RGB en [0, 1]
+
+    Returns:
+        tuple: (tensor float32 [n x 3 x tamano x tamano], transformaciones por imagen)
+    """
+    cuadradas = []
+    transformaciones = []
+    for imagen in imagenes:
+        cuadrada, escala, relleno = letterbox(imagen, tamano)
+        cuadradas.append(cuadrada)
+        transformaciones.append((escala, relleno, imagen.shape[:2]))
+    tensor = cv2.dnn.blobFromImages(cuadradas, scalefactor=1 / 255.0, swapRB=True)
+    return tensor, transformaciones
+
+def nms(cajas, puntajes, iou):
+    """
+    Supresión de no máximos voraz
+
+    Args:
+        cajas: Matriz [n x 4] en formato x1, y1, x2, y2
+        puntajes: Puntaje de cada caja
+        iou: Umbral de solapamiento a partir del cual se descarta una caja
+
+    Returns:
+        numpy array: Índices conservados, de mayor a menor puntaje
+    """
+    x1, y1, x2, y2 = cajas.T
+    areas = (x2 - x1) * (y2 - y1)
+    orden = puntajes.argsort()[::-1]
+    conservados = []
+    while orden.size:
+        i = orden[0]
+        conservados.append(i)
+        resto = orden[1:]
+        ancho = np.maximum(0, np.minimum(x2[i], x2[resto]) - np.maximum(x1[i], x1[resto]))
+        alto = np.maximum(0, np.minimum(y2[i], y2[resto]) - np.maximum(y1[i], y1[resto]))
+        interseccion = ancho * alto
+        solapamiento = interseccion / (areas[i] + areas[resto] - interseccion + 1e-9)
+        orden = resto[solapamiento <= iou]
+    return np.array(conservados, dtype=np.int64)
+
+def postprocesar(salida, transformaciones, confianza, iou, max_detecciones=MAX_DETECCIONES):
+    """
+    Convierte la salida YOLOv8 [n x (4 + clases) x anclas] en detecciones
+
+    Returns:
+        list: Por imagen, tupla (cajas [m x 4] x1/y1/x2/y2 en píxeles originales,
+              clases [m], puntajes [m])
+    """
+    resultados = []
+    for prediccion, (escala, (relleno_x, relleno_y), (alto, ancho)) in zip(salida, transformaciones):
+        prediccion = prediccion.T
+        puntajes_clase = prediccion[:, 4:]
+        clases = puntajes_clase.argmax(axis=1)
+        puntajes = puntajes_clase[np.arange(len(prediccion)), clases]
+        validos = np.flatnonzero(puntajes >= confianza)
+        if len(validos) > MAX_CANDIDATOS:
+            validos = validos[np.argpartition(puntajes[validos], -MAX_CANDIDATOS)[-MAX_CANDIDATOS:]]
+        centros = prediccion[validos, :4]
+        clases, puntajes = clases[validos], puntajes[validos]
+
+        cajas = np.empty_like(centros)
+        cajas[:, :2] = centros[:, :2] - centros[:, 2:] / 2
+        cajas[:, 2:] = centros[:, :2] + centros[:, 2:] / 2
+        conservados = nms(cajas + (clases * DESPLAZAMIENTO_CLASE)[:, None], puntajes, iou)[:max_detecciones]
+        cajas, clases, puntajes = cajas[conservados], clases[conservados], puntajes[conservados]
+
+        # Deshacer el letterbox
+        cajas -= (relleno_x, relleno_y, relleno_x, relleno_y)
+        cajas /= escala
+        cajas[:, [0, 2]] = cajas[:, [0, 2]].clip(0, ancho)
+        cajas[:, [1, 3]] = cajas[:, [1, 3]].clip(0, alto)
+        resultados.append((cajas, clases, puntajes))
+    return resultados
+
+def ruta_metadatos(ruta_modelo):
+    """Archivo JSON con nombres de clases y tamaño de entrada junto al .onnx"""
+    return os.path.splitext(ruta_modelo)[0] + '.json'
+
+class MotorONNX:
+    """
+    Detector YOLOv8 exportado a ONNX, sin torch ni ultralytics
+
+    Usa onnxruntime si está instalado y, si no, cv2.dnn. El preprocesado
+    (letterbox) y el NMS se hacen en NumPy/OpenCV, por lo que un worker solo
+    necesita cargar el archivo .onnx.
+    """
+
+    def __init__(self, ruta, tamano=640):
+        self.ruta = ruta
+        self.tamano = tamano
+        self.nombres = {}
+        # Modelos exportados con lote fijo se ejecutan imagen por imagen
+        self.lote_dinamico = True
+        if os.path.exists(ruta_metadatos(ruta)):
+            with open(ruta_metadatos(ruta), encoding='utf-8') as f:
+                metadatos = json.load(f)
+            self.nombres = {int(k): v for k, v in metadatos.get('nombres', {}).items()}
+            self.tamano = int(metadatos.get('tamano', tamano))
+            self.lote_dinamico = bool(metadatos.get('lote_dinamico', True))
+
+        try:
+            import onnxruntime as ort
+            opciones = ort.SessionOptions()
+            # Respeta el límite de hilos del worker (cv2.setNumThreads en el pool)
+            opciones.intra_op_num_threads = cv2.getNumThreads()
+            self.sesion = ort.InferenceSession(ruta, opciones, providers=['CPUExecutionProvider'])
+            self.entrada = self.sesion.get_inputs()[0].name
+            self.red = None
+            self.backend = 'onnxruntime'
+        except ImportError:
+            self.sesion = None
+            self.red = cv2.dnn.readNetFromONNX(ruta)
+            self.red.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+            self.red.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+            self.backend = 'cv2.dnn'
+
+    def inferir(self, tensor):
+        """Ejecuta la red sobre un tensor NCHW y devuelve la salida cruda"""
+        if not self.lote_dinamico and len(tensor) > 1:
+            return np.concatenate([self.inferir(tensor[i:i + 1]) for i in range(len(tensor))])
+        if self.sesion is not None:
+            return self.sesion.run(None, {self.entrada: tensor})[0]
+        self.red.setInput(tensor)
+        return self.red.forward()
+
+    def detectar(self, imagenes, confianza, iou):
+        """
+        Detecta objetos en un lote de imágenes BGR
+
+        Returns:
+            tuple: (detecciones por imagen como en postprocesar, tiempos en ms)
+        """
+        inicio = time.perf_counter()
+        tensor, transformaciones = preprocesar(imagenes, self.tamano)
+        preproceso = time.perf_counter()
+        salida = self.inferir(tensor)
+        inferencia = time.perf_counter()
+        detecciones = postprocesar(salida, transformaciones, confianza, iou)
+        fin = time.perf_counter()
+        tiempos = {
+            'preproceso': (preproceso - inicio) * 1000,
+            'inferencia': (inferencia - preproceso) * 1000,
+            'postproceso': (fin - inferencia) * 1000
+        }
+        return detecciones, tiempos
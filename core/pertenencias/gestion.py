@@ -1,38 +1,91 @@
-import os
-from utils.database import Database
+import json
+import base64
+from utils.database import Database, registrar_sentencia
+from utils.migraciones import migrar
 from datetime import datetime
 from pathlib import Path
 import sys
-import cv2
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # Agregar el directorio raíz al path
 ROOT_DIR = Path(__file__).parent.parent.parent
 sys.path.append(str(ROOT_DIR))
 
+from utils.config import HILOS_LOTE, PAGINA_DEFECTO, LOTE_CURSOR
+from core.almacenamiento.contenido import obtener_almacen
+
+# Consultas frecuentes como sentencias preparadas (una ida y vuelta por operación)
+registrar_sentencia('pertenencia_entrada', '''
+    INSERT INTO pertenencias (codigo_estudiante, tipo_objeto, descripcion, ruta_imagen, estado)
+    VALUES ($1, $2, $3, $4, $5)
+    RETURNING id
+''')
+# Salida atómica: toma la entrada más antigua del objeto y la marca en la misma
+# sentencia; SKIP LOCKED evita que dos salidas simultáneas retiren la misma fila.
+# Los estados van literales para que el plan genérico use el índice parcial
+registrar_sentencia('pertenencia_salida', '''
+    UPDATE pertenencias SET fecha_salida = CURRENT_TIMESTAMP, estado = 'RETIRADO'
+    WHERE id = (
+        SELECT id FROM pertenencias
+        WHERE codigo_estudiante = $1 AND tipo_objeto = $2 AND estado = 'ENTREGADO'
+        ORDER BY fecha_entrada
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, fecha_salida
+''')
+registrar_sentencia('pertenencias_estudiante', '''
+    SELECT tipo_objeto, descripcion, fecha_entrada, fecha_salida, estado, ruta_imagen
+    FROM pertenencias
+    WHERE codigo_estudiante = $1
+    ORDER BY fecha_entrada DESC
+''')
+
+# Columnas de los listados, en el orden que espera _fila
+COLUMNAS = 'id, codigo_estudiante, tipo_objeto, descripcion, ruta_imagen, fecha_entrada, fecha_salida, estado'
+
+# Salidas por lote en una sola sentencia: el pedido n-ésimo de un mismo
+# estudiante/objeto retira la n-ésima entrada más antigua aún ENTREGADA
+SALIDAS_LOTE = '''
+    WITH pedidos (orden, codigo_estudiante, tipo_objeto) AS (VALUES %s),
+    numerados AS (
+        SELECT orden, codigo_estudiante, tipo_objeto,
+               row_number() OVER (PARTITION BY codigo_estudiante, tipo_objeto ORDER BY orden) AS n
+        FROM pedidos
+    ),
+    disponibles AS (
+        SELECT id, codigo_estudiante, tipo_objeto, fecha_entrada FROM pertenencias
+        WHERE estado = 'ENTREGADO'
+          AND (codigo_estudiante, tipo_objeto) IN (SELECT codigo_estudiante, tipo_objeto FROM pedidos)
+        FOR UPDATE SKIP LOCKED
+    ),
+    ordenados AS (
+        SELECT id, codigo_estudiante, tipo_objeto,
+               row_number() OVER (PARTITION BY codigo_estudiante, tipo_objeto ORDER BY fecha_entrada, id) AS n
+        FROM disponibles
+    )
+    UPDATE pertenencias p SET fecha_salida = CURRENT_TIMESTAMP, estado = 'RETIRADO'
+    FROM numerados pe JOIN ordenados o USING (codigo_estudiante, tipo_objeto, n)
+    WHERE p.id = o.id
+    RETURNING pe.orden, p.id, p.fecha_salida
+'''
+
 class GestionPertenencias:
     def __init__(self):
         """Inicializa el gestor de pertenencias"""
         self.db = Database()
+        # Hilos para decodificar y escribir imágenes de los lotes (OpenCV libera el GIL)
+        self.hilos = None
+        self.lock = threading.Lock()
         self.crear_tablas()
         
     def crear_tablas(self):
-        """Crea las tablas necesarias si no existen"""
+        """Crea las tablas e índices aplicando las migraciones pendientes (utils/migraciones.py)"""
         try:
-            cursor = self.db.ejecutar('''
-                CREATE TABLE IF NOT EXISTS pertenencias (
-                    id SERIAL PRIMARY KEY,
-                    codigo_estudiante TEXT NOT NULL,
-                    tipo_objeto TEXT NOT NULL,
-                    descripcion TEXT,
-                    ruta_imagen TEXT NOT NULL,
-                    fecha_entrada TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    fecha_salida TIMESTAMP,
-                    estado TEXT DEFAULT 'entrada'
-                )
-            ''')
-            print("Tablas creadas exitosamente")
+            migrar(self.db)
         except Exception as e:
-            print(f"Error al crear tablas: {str(e)}")
+            print(f"Error al aplicar migraciones: {str(e)}")
             
     def registrar_pertenencia(self, codigo_estudiante, tipo_objeto, descripcion, ruta_imagen):
         """
@@ -48,12 +101,15 @@ class GestionPertenencias:
             dict: Resultado de la operación
         """
         try:
-            cursor = self.db.ejecutar(
-                'INSERT INTO pertenencias (codigo_estudiante, tipo_objeto, descripcion, ruta_imagen, estado) VALUES (%s, %s, %s, %s, %s)',
+            cursor = self.db.ejecutar_preparada(
+                'pertenencia_entrada',
                 (codigo_estudiante, tipo_objeto, descripcion, ruta_imagen, 'ENTREGADO')
             )
+            if not cursor:
+                return {'error': 'No se pudo registrar la pertenencia'}
             return {
                 'mensaje': 'Pertenencia registrada exitosamente',
+                'id': cursor.fetchone()[0],
                 'codigo_estudiante': codigo_estudiante,
                 'tipo_objeto': tipo_objeto
             }
@@ -72,25 +128,133 @@ class GestionPertenencias:
             dict: Resultado de la operación
         """
         try:
-            cursor = self.db.ejecutar(
-                'SELECT id FROM pertenencias WHERE codigo_estudiante = %s AND tipo_objeto = %s AND estado = %s',
-                (codigo_estudiante, tipo_objeto, 'ENTREGADO')
-            )
+            cursor = self.db.ejecutar_preparada('pertenencia_salida', (codigo_estudiante, tipo_objeto))
             resultado = cursor.fetchone() if cursor else None
             if not resultado:
                 return {'error': 'No se encontró una entrada registrada para este objeto'}
-            self.db.ejecutar(
-                'UPDATE pertenencias SET fecha_salida = CURRENT_TIMESTAMP, estado = %s WHERE id = %s',
-                ('RETIRADO', resultado[0])
-            )
             return {
                 'mensaje': 'Salida registrada exitosamente',
+                'id': resultado[0],
                 'codigo_estudiante': codigo_estudiante,
-                'tipo_objeto': tipo_objeto
+                'tipo_objeto': tipo_objeto,
+                'fecha_salida': resultado[1]
             }
         except Exception as e:
             return {'error': str(e)}
             
+    def registrar_pertenencias_lote(self, items):
+        """
+        Registra varias pertenencias: imágenes en paralelo y un solo INSERT
+        
+        Args:
+            items: Lista de dicts con codigo_estudiante, tipo_objeto,
+                   descripcion (opcional) e imagen (bytes JPEG/PNG); un ítem
+                   con 'error' (p. ej. imagen mal codificada) se informa sin registrarlo
+            
+        Returns:
+            dict: resultados por ítem (en el mismo orden, con id y ruta_imagen
+                  o error), registrados y errores
+        """
+        resultados = [{'indice': i} for i in range(len(items))]
+        validos = []
+        for i, item in enumerate(items):
+            if not isinstance(item, dict):
+                resultados[i]['error'] = 'El ítem debe ser un objeto'
+            elif item.get('error'):
+                resultados[i]['error'] = item['error']
+            elif not all([item.get('codigo_estudiante'), item.get('tipo_objeto'), item.get('imagen')]):
+                resultados[i]['error'] = 'Faltan datos requeridos'
+            else:
+                validos.append(i)
+        
+        if self.hilos is None:
+            with self.lock:
+                if self.hilos is None:
+                    self.hilos = ThreadPoolExecutor(max_workers=HILOS_LOTE, thread_name_prefix='pertenencias')
+                    
+        # Validación (y hash) de cada imagen en paralelo; la escritura es en segundo plano
+        def guardar(i):
+            try:
+                item = items[i]
+                return obtener_almacen().guardar(item['imagen']), None
+            except Exception as e:
+                return None, str(e)
+                
+        filas = []
+        guardados = []
+        for i, (ruta_imagen, error) in zip(validos, self.hilos.map(guardar, validos)):
+            if error:
+                resultados[i]['error'] = error
+                continue
+            item = items[i]
+            filas.append((item['codigo_estudiante'], item['tipo_objeto'], item.get('descripcion'), ruta_imagen, 'ENTREGADO'))
+            guardados.append(i)
+            resultados[i]['ruta_imagen'] = ruta_imagen
+            
+        try:
+            with self.db.transaccion() as t:
+                ids = t.ejecutar_valores(
+                    'INSERT INTO pertenencias (codigo_estudiante, tipo_objeto, descripcion, ruta_imagen, estado) '
+                    'VALUES %s RETURNING id',
+                    filas
+                )
+            for i, (id_pertenencia,) in zip(guardados, ids):
+                resultados[i]['id'] = id_pertenencia
+        except Exception as e:
+            # Las imágenes sin filas las borra AlmacenContenido.recolectar()
+            # (otra pertenencia puede estar usando el mismo archivo)
+            for i in guardados:
+                resultados[i].pop('ruta_imagen')
+                resultados[i]['error'] = f'Error al registrar en la base de datos: {str(e)}'
+                
+        errores = sum(1 for r in resultados if 'error' in r)
+        return {'resultados': resultados, 'registrados': len(items) - errores, 'errores': errores}
+        
+    def registrar_salidas_lote(self, items):
+        """
+        Registra la salida de varias pertenencias en una sola sentencia
+        
+        Args:
+            items: Lista de dicts con codigo_estudiante y tipo_objeto; el mismo
+                   par repetido retira tantas entradas como veces aparece
+            
+        Returns:
+            dict: resultados por ítem (id y fecha_salida o error), registrados y errores
+        """
+        resultados = [{'indice': i} for i in range(len(items))]
+        filas = []
+        for i, item in enumerate(items):
+            if not isinstance(item, dict):
+                resultados[i]['error'] = 'El ítem debe ser un objeto'
+            elif not item.get('codigo_estudiante') or not item.get('tipo_objeto'):
+                resultados[i]['error'] = 'Faltan datos requeridos'
+            else:
+                filas.append((i, item['codigo_estudiante'], item['tipo_objeto']))
+                
+        try:
+            with self.db.transaccion() as t:
+                retirados = t.ejecutar_valores(SALIDAS_LOTE, filas, plantilla='(%s::int, %s::text, %s::text)')
+            for orden, id_pertenencia, fecha_salida in retirados:
+                resultados[orden]['id'] = id_pertenencia
+                resultados[orden]['fecha_salida'] = fecha_salida
+            for orden, _, _ in filas:
+                if 'id' not in resultados[orden]:
+                    resultados[orden]['error'] = 'No se encontró una entrada registrada para este objeto'
+        except Exception as e:
+            for orden, _, _ in filas:
+                resultados[orden]['error'] = str(e)
+                
+        errores = sum(1 for r in resultados if 'error' in r)
+        return {'resultados': resultados, 'registrados': len(items) - errores, 'errores': errores}
+            
+    def obtener_ruta_imagen(self, id_pertenencia):
+        """
+        Returns:
+            str: Ruta en disco de la imagen de la pertenencia, o None si no existe
+        """
+        fila = self.db.obtener_uno('SELECT ruta_imagen FROM pertenencias WHERE id = %s', (id_pertenencia,))
+        return obtener_almacen().absoluta(fila[0]) if fila and fila[0] else None
+        
     def consultar_pertenencias(self, codigo_estudiante):
         """
         Consulta las pertenencias de un estudiante
@@ -102,10 +266,7 @@ class GestionPertenencias:
             list: Lista de pertenencias
         """
         try:
-            cursor = self.db.ejecutar(
-                'SELECT tipo_objeto, descripcion, fecha_entrada, fecha_salida, estado, ruta_imagen FROM pertenencias WHERE codigo_estudiante = %s ORDER BY fecha_entrada DESC',
-                (codigo_estudiante,)
-            )
+            cursor = self.db.ejecutar_preparada('pertenencias_estudiante', (codigo_estudiante,))
             pertenencias = []
             for row in cursor.fetchall() if cursor else []:
                 pertenencias.append({
@@ -176,16 +337,15 @@ class GestionPertenencias:
             # Guardar imagen si se proporciona
             ruta_imagen = None
             if imagen is not None:
-                os.makedirs(PERTENENCIAS_DIR, exist_ok=True)
-                nombre_archivo = f"{codigo_estudiante}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
-                ruta_imagen = os.path.join(PERTENENCIAS_DIR, nombre_archivo)
-                cv2.imwrite(ruta_imagen, imagen)
+                ruta_imagen = obtener_almacen().guardar(imagen)
                 
             # Registrar en base de datos
-            cursor = self.db.ejecutar('''
-                INSERT INTO pertenencias (codigo_estudiante, tipo_objeto, descripcion, ruta_imagen, estado)
-                VALUES (%s, %s, %s, %s, %s)
-            ''', (codigo_estudiante, tipo_objeto, descripcion, ruta_imagen, 'ENTREGADO'))
+            cursor = self.db.ejecutar_preparada(
+                'pertenencia_entrada',
+                (codigo_estudiante, tipo_objeto, descripcion, ruta_imagen, 'ENTREGADO')
+            )
+            if not cursor:
+                return False
             
             print(f"Pertinencia registrada exitosamente para estudiante {codigo_estudiante}")
             return True
@@ -206,38 +366,121 @@ class GestionPertenencias:
             list: Lista de pertenencias (como diccionarios)
         """
         try:
-            query = 'SELECT id, codigo_estudiante, tipo_objeto, descripcion, ruta_imagen, fecha_entrada, fecha_salida, estado FROM pertenencias'
-            params = []
-            if codigo_estudiante or estado:
-                query += ' WHERE'
-                if codigo_estudiante:
-                    query += ' codigo_estudiante = %s'
-                    params.append(codigo_estudiante)
-                if estado:
-                    if codigo_estudiante:
-                        query += ' AND'
-                    query += ' UPPER(estado) = %s'
-                    params.append(estado.upper())
-            query += ' ORDER BY fecha_entrada DESC'
-            cursor = self.db.ejecutar(query, tuple(params))
+            condiciones, params = self._filtros(codigo_estudiante, estado)
+            cursor = self.db.ejecutar(
+                f'SELECT {COLUMNAS} FROM pertenencias{condiciones} ORDER BY fecha_entrada DESC, id DESC',
+                tuple(params)
+            )
             rows = cursor.fetchall() if cursor else []
-            return [
-                {
-                    'id': row[0],
-                    'codigo_estudiante': row[1],
-                    'tipo_objeto': row[2],
-                    'descripcion': row[3],
-                    'ruta_imagen': row[4],
-                    'fecha_entrada': row[5],
-                    'fecha_salida': row[6],
-                    'estado': row[7]
-                }
-                for row in rows
-            ]
+            return [self._fila(row) for row in rows]
         except Exception as e:
             print(f'Error al obtener pertenencias: {str(e)}')
             return []
             
+    @staticmethod
+    def _fila(row):
+        return {
+            'id': row[0],
+            'codigo_estudiante': row[1],
+            'tipo_objeto': row[2],
+            'descripcion': row[3],
+            'ruta_imagen': row[4],
+            'fecha_entrada': row[5],
+            'fecha_salida': row[6],
+            'estado': row[7]
+        }
+        
+    @staticmethod
+    def _filtros(codigo_estudiante=None, estado=None, desde=None, hasta=None, despues_de=None):
+        """
+        Cláusula WHERE y parámetros de los listados (cada filtro tiene su índice)
+        
+        Args:
+            desde: Fecha de entrada mínima (inclusive)
+            hasta: Fecha de entrada máxima (exclusiva)
+            despues_de: (fecha_entrada, id) de la última fila de la página anterior
+        """
+        condiciones = []
+        params = []
+        if codigo_estudiante:
+            condiciones.append('codigo_estudiante = %s')
+            params.append(codigo_estudiante)
+        if estado:
+            condiciones.append('UPPER(estado) = %s')
+            params.append(estado.upper())
+        if desde:
+            condiciones.append('fecha_entrada >= %s')
+            params.append(desde)
+        if hasta:
+            condiciones.append('fecha_entrada < %s')
+            params.append(hasta)
+        if despues_de:
+            condiciones.append('(fecha_entrada, id) < (%s, %s)')
+            params.extend(despues_de)
+        return (' WHERE ' + ' AND '.join(condiciones) if condiciones else ''), params
+        
+    @staticmethod
+    def _codificar_cursor(fila):
+        """Token opaco con la posición (fecha_entrada, id) de la última fila"""
+        posicion = json.dumps([fila['fecha_entrada'].isoformat(), fila['id']])
+        return base64.urlsafe_b64encode(posicion.encode()).decode().rstrip('=')
+        
+    @staticmethod
+    def _decodificar_cursor(token):
+        try:
+            relleno = '=' * (-len(token) % 4)
+            fecha, id_pertenencia = json.loads(base64.urlsafe_b64decode(token + relleno))
+            return datetime.fromisoformat(fecha), int(id_pertenencia)
+        except Exception:
+            raise ValueError('Cursor de paginación inválido')
+            
+    def pagina_pertenencias(self, codigo_estudiante=None, estado=None, desde=None, hasta=None,
+                            limite=PAGINA_DEFECTO, cursor=None):
+        """
+        Una página de pertenencias con paginación por clave (keyset)
+        
+        En lugar de OFFSET se continúa desde la última fila vista, así cada
+        página cuesta lo mismo sin importar cuántas se hayan recorrido.
+        
+        Args:
+            limite: Filas por página
+            cursor: Token 'siguiente' de la página anterior (None para la primera)
+            
+        Returns:
+            dict: pertenencias y siguiente (token, o None si no hay más)
+            
+        Raises:
+            ValueError: Si el cursor no es válido
+        """
+        despues_de = self._decodificar_cursor(cursor) if cursor else None
+        condiciones, params = self._filtros(codigo_estudiante, estado, desde, hasta, despues_de)
+        cursor_bd = self.db.ejecutar(
+            f'SELECT {COLUMNAS} FROM pertenencias{condiciones} ORDER BY fecha_entrada DESC, id DESC LIMIT %s',
+            tuple(params) + (limite + 1,)
+        )
+        if cursor_bd is None:
+            raise RuntimeError('Error al consultar pertenencias')
+        filas = [self._fila(row) for row in cursor_bd.fetchall()]
+        siguiente = self._codificar_cursor(filas[limite - 1]) if len(filas) > limite else None
+        return {'pertenencias': filas[:limite], 'siguiente': siguiente}
+        
+    def iterar_pertenencias(self, codigo_estudiante=None, estado=None, desde=None, hasta=None,
+                            tamano_lote=LOTE_CURSOR):
+        """
+        Recorre las pertenencias con un cursor del servidor (memoria constante)
+        
+        Yields:
+            dict: Una pertenencia por fila, en orden de fecha de entrada descendente
+        """
+        condiciones, params = self._filtros(codigo_estudiante, estado, desde, hasta)
+        with self.db.cursor_servidor(tamano_lote) as cursor:
+            cursor.execute(
+                f'SELECT {COLUMNAS} FROM pertenencias{condiciones} ORDER BY fecha_entrada DESC, id DESC',
+                tuple(params)
+            )
+            for row in cursor:
+                yield self._fila(row)
+            
     def __del__(self):
         """Cierra la conexión a la base de datos"""
         pass 
\ No newline at end of file
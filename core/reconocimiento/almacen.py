@@ -0,0 +1,183 @@
+import os
+import struct
+import numpy as np
+import cv2
+
+from core.reconocimiento.lbph import RADIO, VECINOS, GRID_X, GRID_Y
+
+# Formato binario del modelo facial (little endian):
+#   cabecera de 64 bytes | etiquetas int32[filas] | escalas float32[filas] (solo uint16)
+#   | histogramas [filas x columnas] alineados a 64 bytes
+MAGIA = b'IGLBPH\x00\x00'
+VERSION = 1
+CABECERA = struct.Struct('<8sHBxIIHHHH')
+TAMANO_CABECERA = 64
+ALINEACION = 64
+TIPOS = {1: np.dtype('<f4'), 2: np.dtype('<u2')}
+CODIGOS_TIPO = {'float32': 1, 'uint16': 2}
+MAXIMO_UINT16 = 65535
+PARAMETROS_DEFECTO = {'radio': RADIO, 'vecinos': VECINOS, 'grid_x': GRID_X, 'grid_y': GRID_Y}
+
+def _alinear(offset):
+    return (offset + ALINEACION - 1) // ALINEACION * ALINEACION
+
+class SegmentoModelo:
+    """Matriz de histogramas LBPH con sus etiquetas (en memoria o mapeada)"""
+
+    def __init__(self, histogramas, etiquetas, escalas=None, parametros=None):
+        self.histogramas = histogramas
+        self.etiquetas = etiquetas
+        # Solo para uint16: valor real = valor cuantizado * escala de la fila
+        self.escalas = escalas
+        self.parametros = parametros or dict(PARAMETROS_DEFECTO)
+
+    @property
+    def filas(self):
+        return len(self.etiquetas)
+
+    def bloque(self, inicio, fin):
+        """Devuelve las filas [inicio, fin) como float32 (descuantizando si hace falta)"""
+        bloque = self.histogramas[inicio:fin]
+        if self.escalas is None:
+            return bloque
+        return bloque.astype(np.float32) * self.escalas[inicio:fin, None]
+
+    def seleccion(self, indices):
+        """Copia float32 de las filas indicadas (descuantizando si hace falta)"""
+        filas = np.asarray(self.histogramas[indices], dtype=np.float32)
+        if self.escalas is None:
+            return filas
+        return filas * self.escalas[indices, None]
+
+def guardar_segmento(ruta, histogramas, etiquetas, parametros=None, tipo='float32'):
+    """
+    Guarda un segmento del modelo en formato binario
+
+    La escritura es atómica (archivo temporal + os.replace), así los procesos
+    que tengan mapeada la versión anterior la siguen leyendo sin cambios.
+
+    Args:
+        ruta: Ruta del archivo .lbph
+        histogramas: Matriz [filas x columnas] de histogramas
+        etiquetas: Etiquetas (códigos de estudiante) de cada fila
+        parametros: Dict con radio, vecinos, grid_x y grid_y
+        tipo: 'float32' (exacto) o 'uint16' (cuantizado por fila, la mitad de tamaño)
+    """
+    parametros = parametros or PARAMETROS_DEFECTO
+    histogramas = np.ascontiguousarray(histogramas, dtype=np.float32)
+    etiquetas = np.ascontiguousarray(etiquetas, dtype='<i4')
+    filas = len(etiquetas)
+    columnas = histogramas.shape[1] if histogramas.ndim == 2 else 0
+
+    escalas = None
+    if tipo == 'uint16':
+        maximos = histogramas.max(axis=1) if columnas else np.zeros(filas, dtype=np.float32)
+        escalas = np.where(maximos > 0, maximos / MAXIMO_UINT16, 1.0).astype('<f4')
+        histogramas = np.rint(histogramas / escalas[:, None]).astype('<u2')
+
+    cabecera = CABECERA.pack(
+        MAGIA, VERSION, CODIGOS_TIPO[tipo], filas, columnas,
+        parametros['radio'], parametros['vecinos'], parametros['grid_x'], parametros['grid_y']
+    )
+
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    with open(temporal, 'wb') as f:
+        f.write(cabecera.ljust(TAMANO_CABECERA, b'\x00'))
+        f.write(etiquetas.tobytes())
+        if escalas is not None:
+            f.write(escalas.tobytes())
+        f.write(b'\x00' * (_alinear(f.tell()) - f.tell()))
+        f.write(histogramas.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, ruta)
+
+def cargar_segmento(ruta, mmap=True):
+    """
+    Carga un segmento binario del modelo
+
+    Con mmap=True la matriz se mapea en solo lectura: no se parsea nada y las
+    páginas se comparten entre los workers de gunicorn vía la caché del sistema.
+
+    Args:
+        ruta: Ruta del archivo .lbph
+        mmap: Mapear el archivo en lugar de leerlo a memoria
+
+    Returns:
+        SegmentoModelo: Segmento cargado
+    """
+    with open(ruta, 'rb') as f:
+        datos = f.read(TAMANO_CABECERA)
+    magia, version, codigo_tipo, filas, columnas, radio, vecinos, grid_x, grid_y = \
+        CABECERA.unpack(datos[:CABECERA.size])
+    if magia != MAGIA:
+        raise ValueError(f"{ruta} no es un modelo facial binario")
+    if version != VERSION:
+        raise ValueError(f"Versión de modelo no soportada: {version}")
+    tipo = TIPOS[codigo_tipo]
+
+    def leer(offset, dtype, forma):
+        if mmap and np.prod(forma) > 0:
+            return np.memmap(ruta, dtype=dtype, mode='r', offset=offset, shape=forma)
+        with open(ruta, 'rb') as f:
+            f.seek(offset)
+            return np.fromfile(f, dtype=dtype, count=int(np.prod(forma))).reshape(forma)
+
+    offset = TAMANO_CABECERA
+    etiquetas = leer(offset, np.dtype('<i4'), (filas,))
+    offset += filas * 4
+    escalas = None
+    if codigo_tipo == CODIGOS_TIPO['uint16']:
+        escalas = leer(offset, np.dtype('<f4'), (filas,))
+        offset += filas * 4
+    histogramas = leer(_alinear(offset), tipo, (filas, columnas))
+
+    parametros = {'radio': radio, 'vecinos': vecinos, 'grid_x': grid_x, 'grid_y': grid_y}
+    return SegmentoModelo(histogramas, etiquetas, escalas, parametros)
+
+def leer_xml(ruta):
+    """
+    Lee un modelo LBPH guardado por OpenCV (modeloEstudiantes.xml)
+
+    Returns:
+        SegmentoModelo: Histogramas y etiquetas del modelo en memoria
+    """
+    fs = cv2.FileStorage(ruta, cv2.FILE_STORAGE_READ)
+    try:
+        nodo = fs.getNode('opencv_lbphfaces')
+        parametros = {
+            'radio': int(nodo.getNode('radius').real()),
+            'vecinos': int(nodo.getNode('neighbors').real()),
+            'grid_x': int(nodo.getNode('grid_x').real()),
+            'grid_y': int(nodo.getNode('grid_y').real())
+        }
+        nodo_histogramas = nodo.getNode('histograms')
+        histogramas = [nodo_histogramas.at(i).mat().ravel() for i in range(nodo_histogramas.size())]
+        etiquetas = nodo.getNode('labels').mat()
+    finally:
+        fs.release()
+
+    matriz = np.vstack(histogramas).astype(np.float32) if histogramas else np.zeros((0, 0), np.float32)
+    etiquetas = np.asarray(etiquetas, dtype=np.int32).ravel() if etiquetas is not None else np.zeros(0, np.int32)
+    return SegmentoModelo(matriz, etiquetas, parametros=parametros)
+
+def convertir_xml(ruta_xml, ruta_binaria, tipo='float32'):
+    """
+    Convierte el modelo XML de OpenCV al formato binario
+
+    Returns:
+        SegmentoModelo: Segmento convertido (en memoria)
+    """
+    segmento = leer_xml(ruta_xml)
+    guardar_segmento(ruta_binaria, segmento.histogramas, segmento.etiquetas, segmento.parametros, tipo)
+    return segmento
+
+def concatenar(segmentos):
+    """Une varios segmentos en uno solo en memoria (para consolidar base + delta)"""
+    segmentos = [s for s in segmentos if s.filas > 0]
+    if not segmentos:
+        return SegmentoModelo(np.zeros((0, 0), np.float32), np.zeros(0, np.int32))
+    histogramas = np.vstack([s.bloque(0, s.filas) for s in segmentos])
+    etiquetas = np.concatenate([np.asarray(s.etiquetas) for s in segmentos])
+    return SegmentoModelo(histogramas, etiquetas, parametros=segmentos[0].parametros)
@@ -0,0 +1,234 @@
+import numpy as np
+
+METRICAS = ('chi2', 'l1', 'l2')
+AGREGACIONES = ('min', 'mean')
+
+# Elementos float32 por bloque temporal (~512 KB): el bloque cabe en caché y la
+# memoria temporal no crece con el tamaño de la galería
+ELEMENTOS_POR_BLOQUE = 128 * 1024
+
+class ComparadorLBPH:
+    """
+    Comparador vectorizado de histogramas LBPH contra toda la galería
+
+    Calcula en NumPy, por bloques de filas, la distancia de una o varias
+    consultas a todos los histogramas de los segmentos del modelo. Para
+    chi-cuadrado aprovecha que los histogramas LBPH son dispersos: en los bins
+    donde la consulta es 0 el término vale exactamente el valor de la galería,
+    así que basta con la suma de cada fila y las columnas no nulas de la consulta.
+    """
+
+    def __init__(self, segmentos, metrica='chi2'):
+        if metrica not in METRICAS:
+            raise ValueError(f"Métrica no soportada: {metrica}")
+        self.segmentos = [s for s in segmentos if s.filas > 0]
+        self.metrica = metrica
+        self.etiquetas = (
+            np.concatenate([np.asarray(s.etiquetas) for s in self.segmentos])
+            if self.segmentos else np.zeros(0, dtype=np.int32)
+        )
+        # Fila global donde empieza cada segmento
+        self.desplazamientos = np.cumsum([0] + [s.filas for s in self.segmentos])
+        # Agrupación por estudiante: orden estable por etiqueta e inicio de cada grupo
+        self.orden = np.argsort(self.etiquetas, kind='stable')
+        self.estudiantes, self.inicios, self.cantidades = np.unique(
+            self.etiquetas[self.orden], return_index=True, return_counts=True
+        )
+        self._sumas = {}
+        self._normas = {}
+
+    @property
+    def filas(self):
+        return len(self.etiquetas)
+
+    def _sumas_filas(self, indice):
+        """Suma de cada fila del segmento (se calcula una vez, al primer uso)"""
+        if indice not in self._sumas:
+            segmento = self.segmentos[indice]
+            self._sumas[indice] = np.concatenate([
+                segmento.bloque(inicio, inicio + 1024).sum(axis=1, dtype=np.float64)
+                for inicio in range(0, segmento.filas, 1024)
+            ])
+        return self._sumas[indice]
+
+    def _normas_filas(self, indice):
+        """Norma L2 al cuadrado de cada fila del segmento (para la métrica l2)"""
+        if indice not in self._normas:
+            segmento = self.segmentos[indice]
+            self._normas[indice] = np.concatenate([
+                np.einsum('ij,ij->i', b, b, dtype=np.float64)
+                for b in (segmento.bloque(inicio, inicio + 1024) for inicio in range(0, segmento.filas, 1024))
+            ])
+        return self._normas[indice]
+
+    def _columnas(self, segmento, inicio, fin, columnas):
+        """Copia de las filas [inicio, fin) del segmento restringidas a las columnas dadas"""
+        bloque = segmento.histogramas[inicio:fin][:, columnas]
+        if segmento.escalas is None:
+            return bloque
+        return bloque.astype(np.float32) * segmento.escalas[inicio:fin, None]
+
+    def distancias(self, consultas, metrica=None):
+        """
+        Distancia de cada consulta a cada histograma de la galería
+
+        Args:
+            consultas: Matriz [q x columnas] (o vector) de histogramas
+            metrica: 'chi2' (CHISQR_ALT de OpenCV), 'l1' o 'l2'
+
+        Returns:
+            numpy array: Matriz [q x filas] de distancias (float64)
+        """
+        metrica = metrica or self.metrica
+        consultas = np.atleast_2d(np.asarray(consultas, dtype=np.float32))
+        resultado = np.empty((len(consultas), self.filas), dtype=np.float64)
+        if self.filas == 0:
+            return resultado
+
+        columnas = consultas.shape[1]
+        desplazamiento = 0
+        for indice, segmento in enumerate(self.segmentos):
+            fin_segmento = desplazamiento + segmento.filas
+            destino = resultado[:, desplazamiento:fin_segmento]
+
+            if metrica == 'chi2':
+                sumas = self._sumas_filas(indice)
+                dispersas = [(np.flatnonzero(c), c[np.flatnonzero(c)]) for c in consultas]
+                # Bloques de filas por fuera: con varias consultas cada bloque de la
+                # galería se lee de memoria una sola vez y se reutiliza desde caché
+                paso = max(1, ELEMENTOS_POR_BLOQUE // max(1, max(len(n) for n, _ in dispersas)))
+                for inicio in range(0, segmento.filas, paso):
+                    fin = min(inicio + paso, segmento.filas)
+                    for q, (no_nulos, valores) in enumerate(dispersas):
+                        bloque = np.asarray(self._columnas(segmento, inicio, fin, no_nulos), dtype=np.float32)
+                        resto = sumas[inicio:fin] - bloque.sum(axis=1)
+                        # consulta > 0 en estas columnas, así que el denominador nunca es 0
+                        denominador = bloque + valores
+                        bloque -= valores
+                        np.square(bloque, out=bloque)
+                        bloque /= denominador
+                        destino[q, inicio:fin] = 2 * (bloque.sum(axis=1) + resto)
+            else:
+                paso = max(1, ELEMENTOS_POR_BLOQUE // (columnas * len(consultas)))
+                for inicio in range(0, segmento.filas, paso):
+                    fin = min(inicio + paso, segmento.filas)
+                    bloque = segmento.bloque(inicio, fin)
+                    if metrica == 'l1':
+                        destino[:, inicio:fin] = np.abs(
+                            bloque[None, :, :] - consultas[:, None, :]
+                        ).sum(axis=2, dtype=np.float64)
+                    else:
+                        productos = consultas.astype(np.float64) @ bloque.T.astype(np.float64)
+                        cuadrados = np.einsum('ij,ij->i', consultas, consultas, dtype=np.float64)
+                        destino[:, inicio:fin] = np.sqrt(np.maximum(
+                            cuadrados[:, None] + self._normas_filas(indice)[None, inicio:fin] - 2 * productos, 0
+                        ))
+            desplazamiento = fin_segmento
+        return resultado
+
+    def distancias_filas(self, consulta, indices, metrica=None):
+        """
+        Distancia exacta de una consulta solo a las filas indicadas
+
+        Se usa para re-ordenar los candidatos de un índice aproximado sin
+        recorrer la galería completa.
+
+        Args:
+            consulta: Histograma de la consulta
+            indices: Índices globales de fila (numpy array de enteros)
+
+        Returns:
+            numpy array: Distancias (float64) en el mismo orden que indices
+        """
+        metrica = metrica or self.metrica
+        consulta = np.asarray(consulta, dtype=np.float32).ravel()
+        indices = np.asarray(indices, dtype=np.int64)
+        resultado = np.empty(len(indices), dtype=np.float64)
+        no_nulos = np.flatnonzero(consulta)
+        valores = consulta[no_nulos]
+
+        for indice, segmento in enumerate(self.segmentos):
+            inicio, fin = self.desplazamientos[indice], self.desplazamientos[indice + 1]
+            posiciones = np.flatnonzero((indices >= inicio) & (indices < fin))
+            if len(posiciones) == 0:
+                continue
+            locales = indices[posiciones] - inicio
+            bloque = segmento.seleccion(locales)
+
+            if metrica == 'chi2':
+                parcial = bloque[:, no_nulos]
+                resto = bloque.sum(axis=1) - parcial.sum(axis=1)
+                denominador = parcial + valores
+                parcial -= valores
+                np.square(parcial, out=parcial)
+                parcial /= denominador
+                resultado[posiciones] = 2 * (parcial.sum(axis=1) + resto)
+            elif metrica == 'l1':
+                resultado[posiciones] = np.abs(bloque - consulta).sum(axis=1, dtype=np.float64)
+            else:
+                resultado[posiciones] = np.sqrt(((bloque - consulta) ** 2).sum(axis=1, dtype=np.float64))
+        return resultado
+
+    def top_k(self, consultas, k=5, metrica=None):
+        """
+        Los k histogramas más cercanos a cada consulta
+
+        Returns:
+            list: Por consulta, lista de (etiqueta, distancia) ordenada por distancia
+        """
+        distancias = self.distancias(consultas, metrica)
+        return [self._mejores(fila, self.etiquetas, k) for fila in distancias]
+
+    def por_estudiante(self, consultas, k=5, agregacion='min', metrica=None):
+        """
+        Los k estudiantes más cercanos, agregando las distancias de sus imágenes
+
+        Args:
+            consultas: Histogramas a comparar
+            k: Número de estudiantes a devolver
+            agregacion: 'min' (equivale al vecino más cercano) o 'mean'
+
+        Returns:
+            list: Por consulta, lista de (codigo_estudiante, distancia) ordenada
+        """
+        if agregacion not in AGREGACIONES:
+            raise ValueError(f"Agregación no soportada: {agregacion}")
+        distancias = self.distancias(consultas, metrica)
+        if self.filas == 0:
+            return [[] for _ in distancias]
+
+        ordenadas = distancias[:, self.orden]
+        if agregacion == 'min':
+            agregadas = np.minimum.reduceat(ordenadas, self.inicios, axis=1)
+        else:
+            agregadas = np.add.reduceat(ordenadas, self.inicios, axis=1) / self.cantidades
+        return [self._mejores(fila, self.estudiantes, k) for fila in agregadas]
+
+    @staticmethod
+    def agrupar(etiquetas, distancias, k=5, agregacion='min'):
+        """
+        Agrega por estudiante un conjunto arbitrario de (etiqueta, distancia)
+
+        Returns:
+            list: Lista de (codigo_estudiante, distancia) ordenada, de largo <= k
+        """
+        if agregacion not in AGREGACIONES:
+            raise ValueError(f"Agregación no soportada: {agregacion}")
+        if len(etiquetas) == 0:
+            return []
+        estudiantes, inversa, cantidades = np.unique(etiquetas, return_inverse=True, return_counts=True)
+        if agregacion == 'min':
+            agregadas = np.full(len(estudiantes), np.inf)
+            np.minimum.at(agregadas, inversa, distancias)
+        else:
+            agregadas = np.bincount(inversa, weights=distancias, minlength=len(estudiantes)) / cantidades
+        return ComparadorLBPH._mejores(agregadas, estudiantes, k)
+
+    @staticmethod
+    def _mejores(distancias, etiquetas, k):
+        k = min(k, len(distancias))
+        if k <= 0:
+            return []
+        candidatos = np.argpartition(distancias, k - 1)[:k]
+        candidatos = candidatos[np.argsort(distancias[candidatos], kind='stable')]
+        return [(int(etiquetas[i]), float(distancias[i])) for i in candidatos]
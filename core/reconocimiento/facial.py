@@ -3,6 +3,16 @@ import numpy as np
 import os
 from pathlib import Path
 import sys
+import time
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: sin bloqueo entre procesos (allí no corre gunicorn)
+    fcntl = None
 
 # Agregar el directorio raíz al path
 ROOT_DIR = Path(__file__).parent.parent.parent
@@ -10,31 +20,272 @@ sys.path.append(str(ROOT_DIR))
 
 from utils.config import (
     MODELO_FACIAL,
+    MODELO_FACIAL_BINARIO,
+    MODELO_FACIAL_DELTA,
+    MODELO_FACIAL_TIPO,
     DATASET_FACIAL,
     CONFIANZA_MINIMA,
-    MAX_FOTOS
+    MAX_FOTOS,
+    METRICA_FACIAL,
+    AGREGACION_FACIAL,
+    DISTANCIA_MAXIMA_FACIAL,
+    MODELO_FACIAL_INDICE,
+    ANN_FACIAL,
+    ANN_MIN_FILAS,
+    ANN_DIMENSIONES,
+    ANN_SONDAS,
+    ANN_CANDIDATOS,
+    HILOS_LOTE
+)
+from core.reconocimiento.lbph import calcular_histograma
+from core.reconocimiento.almacen import (
+    SegmentoModelo,
+    guardar_segmento,
+    cargar_segmento,
+    convertir_xml,
+    concatenar
 )
+from core.reconocimiento.comparador import ComparadorLBPH
+from core.reconocimiento.indice import IndiceIVF
+from core.inferencia.pool import en_pool
 
 class ReconocimientoFacial:
-    def __init__(self):
-        """Inicializa el reconocedor facial"""
-        self.modelo = None
+    def __init__(self, pool=None):
+        """
+        Inicializa el reconocedor facial
+        
+        Args:
+            pool: PoolInferencia opcional; si se indica, las llamadas de visión
+                  se ejecutan en sus workers en lugar del hilo de la petición
+        """
+        self.pool = pool
+        # Base mapeada en memoria (compartida entre procesos) + delta pequeño en RAM
+        self.base = None
+        self.delta = None
+        self.versiones = None
+        self.comparador = ComparadorLBPH([], METRICA_FACIAL)
+        # Índice aproximado sobre la base (opcional) y comparador exacto del delta
+        self.indice = None
+        self.comparador_delta = ComparadorLBPH([], METRICA_FACIAL)
+        self.lock = threading.RLock()
+        # Hilos para decodificar/detectar lotes (OpenCV libera el GIL)
+        self.hilos = None
         self.detector = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
         self.cargar_modelo()
         
     def cargar_modelo(self):
-        """Carga el modelo de reconocimiento facial"""
+        """Carga el modelo de reconocimiento facial (formato binario mapeado en memoria)"""
         try:
-            if os.path.exists(MODELO_FACIAL):
-                self.modelo = cv2.face.LBPHFaceRecognizer_create()
-                self.modelo.read(MODELO_FACIAL)
-                print("Modelo facial cargado exitosamente")
-            else:
-                print("Modelo facial no encontrado. Se creará uno nuevo.")
-                self.entrenar_modelo()
+            inicio = time.perf_counter()
+            if not os.path.exists(MODELO_FACIAL_BINARIO):
+                if os.path.exists(MODELO_FACIAL):
+                    print("Convirtiendo modelo facial XML a formato binario...")
+                    convertir_xml(MODELO_FACIAL, MODELO_FACIAL_BINARIO, MODELO_FACIAL_TIPO)
+                else:
+                    print("Modelo facial no encontrado. Se creará uno nuevo.")
+                    self.entrenar_modelo()
+                    return
+                    
+            self.base = cargar_segmento(MODELO_FACIAL_BINARIO)
+            self.delta = cargar_segmento(MODELO_FACIAL_DELTA, mmap=False) if os.path.exists(MODELO_FACIAL_DELTA) else None
+            self.versiones = self._versiones_en_disco()
+            self._actualizar_comparador(base_modificada=True)
+            
+            filas = self.base.filas + (self.delta.filas if self.delta else 0)
+            print(f"Modelo facial cargado exitosamente ({filas} histogramas, {(time.perf_counter() - inicio) * 1000:.1f} ms)")
         except Exception as e:
             print(f"Error al cargar el modelo facial: {str(e)}")
             
+    def _versiones_en_disco(self):
+        """Marca de modificación y tamaño de la base y el delta, para detectar cambios de otros procesos"""
+        versiones = []
+        for ruta in (MODELO_FACIAL_BINARIO, MODELO_FACIAL_DELTA):
+            try:
+                estado = os.stat(ruta)
+                versiones.append((estado.st_mtime_ns, estado.st_size))
+            except FileNotFoundError:
+                versiones.append(None)
+        return tuple(versiones)
+        
+    @contextmanager
+    def _bloqueo_archivos(self):
+        """
+        Bloqueo exclusivo entre procesos (flock sobre MODELO_FACIAL_DELTA.lock)
+        para leer, modificar y escribir los archivos del modelo sin perder
+        los cambios de otro worker
+        """
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(MODELO_FACIAL_DELTA), exist_ok=True)
+        with open(f"{MODELO_FACIAL_DELTA}.lock", 'a') as archivo:
+            fcntl.flock(archivo.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(archivo.fileno(), fcntl.LOCK_UN)
+        
+    def sincronizar(self):
+        """Recarga el modelo si otro worker lo modificó (registro o consolidación)"""
+        if self.versiones is not None and self._versiones_en_disco() != self.versiones:
+            with self.lock:
+                if self._versiones_en_disco() != self.versiones:
+                    self.cargar_modelo()
+                    
+    def segmentos(self):
+        """Segmentos actuales de la galería (base y delta)"""
+        return [s for s in (self.base, self.delta) if s is not None and s.filas > 0]
+        
+    def _actualizar_comparador(self, base_modificada=False):
+        """Reconstruye los comparadores tras un cambio en la galería (reemplazo atómico)"""
+        if base_modificada:
+            self.indice = self._preparar_indice()
+        self.comparador_delta = ComparadorLBPH([self.delta] if self.delta is not None else [], METRICA_FACIAL)
+        self.comparador = ComparadorLBPH(self.segmentos(), METRICA_FACIAL)
+        
+    def _usa_indice(self):
+        """ANN_FACIAL: 'si' siempre, 'no' nunca, 'auto' desde ANN_MIN_FILAS histogramas"""
+        if self.base is None or ANN_FACIAL == 'no':
+            return False
+        return ANN_FACIAL == 'si' or self.base.filas >= ANN_MIN_FILAS
+        
+    def _firma_indice(self):
+        """Identifica la base para la que se construyó el índice (se invalida si cambia)"""
+        estado = os.stat(MODELO_FACIAL_BINARIO)
+        return (estado.st_mtime_ns, estado.st_size, self.base.filas, ANN_DIMENSIONES)
+        
+    def _preparar_indice(self):
+        """
+        Carga el índice aproximado de la base desde MODELO_FACIAL_INDICE si corresponde
+        
+        Solo se carga: construirlo (PCA + k-means) tarda segundos y se hace
+        fuera de las peticiones con construir_indice(). Sin índice vigente se
+        usa la búsqueda exacta.
+        """
+        if not self._usa_indice():
+            return None
+        try:
+            indice = IndiceIVF(self.base, METRICA_FACIAL)
+            if indice.cargar(MODELO_FACIAL_INDICE, self._firma_indice()):
+                return indice
+            print("Índice facial aproximado ausente o desactualizado, se usa búsqueda exacta "
+                  "(construirlo con scripts/reentrenar_modelo.py --indice)")
+        except Exception as e:
+            print(f"Error al cargar índice facial, se usa búsqueda exacta: {str(e)}")
+        return None
+        
+    def construir_indice(self):
+        """
+        Construye y guarda el índice aproximado de la base actual
+        
+        Operación offline (scripts/reentrenar_modelo.py) o de precarga en el
+        master de gunicorn; las peticiones solo lo cargan.
+        
+        Returns:
+            bool: True si el modelo quedó con índice vigente
+        """
+        try:
+            with self.lock:
+                if not self._usa_indice():
+                    return False
+                if self.indice is not None:
+                    return True
+                inicio = time.perf_counter()
+                indice = IndiceIVF(self.base, METRICA_FACIAL)
+                indice.construir(dimensiones=ANN_DIMENSIONES)
+                indice.guardar(MODELO_FACIAL_INDICE, self._firma_indice())
+                self.indice = indice
+            print(f"Índice facial aproximado construido ({(time.perf_counter() - inicio):.1f} s)")
+            return True
+        except Exception as e:
+            print(f"Error al construir índice facial: {str(e)}")
+            return False
+        
+    def predecir(self, rostro):
+        """
+        Busca el estudiante más cercano al rostro (chi-cuadrado, como LBPH de OpenCV)
+        
+        Args:
+            rostro: Rostro en escala de grises
+            
+        Returns:
+            tuple: (etiqueta, distancia) o (-1, inf) si la galería está vacía
+        """
+        candidatos = self.candidatos(rostro, k=1)
+        if not candidatos:
+            return -1, float('inf')
+        return candidatos[0]
+        
+    def candidatos(self, rostro, k=5, agregacion=AGREGACION_FACIAL):
+        """
+        Los k estudiantes más cercanos a un rostro, en una sola pasada vectorizada
+        
+        Args:
+            rostro: Rostro en escala de grises
+            k: Número de candidatos
+            agregacion: 'min' o 'mean' sobre las imágenes de cada estudiante
+            
+        Returns:
+            list: Lista de (codigo_estudiante, distancia) ordenada por distancia
+        """
+        comparador = self.comparador
+        if comparador.filas == 0:
+            return []
+        return self.candidatos_histogramas(self._histograma(rostro, comparador.segmentos[0].parametros), k, agregacion)[0]
+        
+    def candidatos_histogramas(self, consultas, k=5, agregacion=AGREGACION_FACIAL):
+        """
+        Candidatos por estudiante para varios histogramas a la vez
+        
+        En la búsqueda exacta todas las consultas se comparan en una sola pasada
+        sobre la galería.
+        
+        Args:
+            consultas: Matriz [q x columnas] de histogramas LBPH
+            
+        Returns:
+            list: Por consulta, lista de (codigo_estudiante, distancia)
+        """
+        comparador = self.comparador
+        indice = self.indice
+        consultas = np.atleast_2d(consultas)
+        if comparador.filas == 0:
+            return [[] for _ in consultas]
+        if indice is None:
+            return comparador.por_estudiante(consultas, k=k, agregacion=agregacion)
+            
+        # Base: candidatos del índice re-ordenados con distancia exacta; delta: búsqueda exacta
+        delta = self.comparador_delta
+        distancias_delta = delta.distancias(consultas) if delta.filas else None
+        resultados = []
+        for q, consulta in enumerate(consultas):
+            filas, distancias = indice.buscar(consulta, sondas=ANN_SONDAS, candidatos=ANN_CANDIDATOS)
+            etiquetas = np.asarray(indice.segmento.etiquetas)[filas]
+            if distancias_delta is not None:
+                etiquetas = np.concatenate([etiquetas, delta.etiquetas])
+                distancias = np.concatenate([distancias, distancias_delta[q]])
+            resultados.append(ComparadorLBPH.agrupar(etiquetas, distancias, k=k, agregacion=agregacion))
+        return resultados
+        
+    def _confianza(self, distancia):
+        """Porcentaje de similitud de una distancia según la escala de METRICA_FACIAL"""
+        return max(0.0, 100 * (1 - distancia / DISTANCIA_MAXIMA_FACIAL[METRICA_FACIAL]))
+        
+    def _resultado(self, candidatos):
+        """Convierte el mejor candidato en (codigo, porcentaje) aplicando CONFIANZA_MINIMA"""
+        if not candidatos:
+            return None, 0
+        codigo, distancia = candidatos[0]
+        
+        # Convertir confianza a porcentaje
+        porcentaje = self._confianza(distancia)
+        
+        if porcentaje >= CONFIANZA_MINIMA * 100:
+            return codigo, porcentaje
+        else:
+            return None, 0
+            
+    @en_pool('facial')
     def reconocimiento_facial(self, imagen):
         """
         Realiza el reconocimiento facial en una imagen
@@ -46,46 +297,211 @@ class ReconocimientoFacial:
             tuple: (codigo_estudiante, porcentaje_similitud) o (None, 0) si no se reconoce
         """
         try:
-            # Convertir a escala de grises
-            gris = cv2.cvtColor(imagen, cv2.COLOR_BGR2GRAY)
-            
-            # Detectar rostros
-            rostros = self.detector.detectMultiScale(
-                gris,
-                scaleFactor=1.1,
-                minNeighbors=5,
-                minSize=(30, 30)
-            )
-            
-            if len(rostros) == 0:
+            rostro = self.extraer_rostro(imagen)
+            if rostro is None:
                 return None, 0
                 
-            # Tomar el primer rostro detectado
-            x, y, w, h = rostros[0]
-            rostro = gris[y:y+h, x:x+w]
-            
             # Realizar predicción
-            codigo, confianza = self.modelo.predict(rostro)
-            
-            # Convertir confianza a porcentaje
-            porcentaje = 100 - confianza
-            
-            if porcentaje >= CONFIANZA_MINIMA * 100:
-                return codigo, porcentaje
-            else:
-                return None, 0
+            self.sincronizar()
+            return self._resultado(self.candidatos(rostro, k=1))
                 
         except Exception as e:
             print(f"Error en reconocimiento facial: {str(e)}")
             return None, 0
             
+    def _histogramas_imagen(self, imagen, parametros):
+        """Decodifica (si son bytes), detecta todos los rostros y calcula sus histogramas"""
+        if isinstance(imagen, (bytes, bytearray, memoryview)):
+            imagen = cv2.imdecode(np.frombuffer(imagen, np.uint8), cv2.IMREAD_COLOR)
+        if imagen is None:
+            raise ValueError("Imagen inválida")
+        return [(caja, self._histograma(rostro, parametros)) for caja, rostro in self.detectar_rostros(imagen)]
+        
+    def _reconocer_grupos(self, grupos):
+        """
+        Compara en una sola llamada todos los rostros de varios grupos (imágenes)
+        
+        Args:
+            grupos: Lista (por imagen) de listas de (caja, histograma)
+            
+        Returns:
+            list: Por imagen, lista de rostros reconocidos (ver reconocer_rostros)
+        """
+        histogramas = [histograma for grupo in grupos for _, histograma in grupo]
+        candidatos = self.candidatos_histogramas(np.vstack(histogramas), k=1) if histogramas else []
+        
+        resultados = []
+        posicion = 0
+        for grupo in grupos:
+            rostros = []
+            for (x, y, w, h), _ in grupo:
+                mejores = candidatos[posicion]
+                posicion += 1
+                codigo, confianza = self._resultado(mejores)
+                rostros.append({
+                    'caja': {'x': x, 'y': y, 'ancho': w, 'alto': h},
+                    'codigo_estudiante': codigo,
+                    'confianza': confianza,
+                    'distancia': mejores[0][1] if mejores else None
+                })
+            resultados.append(rostros)
+        return resultados
+        
+    @en_pool('facial')
+    def reconocer_rostros(self, imagen):
+        """
+        Reconoce todos los rostros de una imagen
+        
+        Todos los rostros detectados se comparan contra la galería en una sola
+        pasada, así un mismo cuadro puede identificar a varios estudiantes.
+        
+        Args:
+            imagen: Imagen en formato numpy array
+            
+        Returns:
+            list: Por rostro (en el orden del detector), dict con caja
+                  (x, y, ancho, alto), codigo_estudiante, confianza y distancia
+        """
+        try:
+            self.sincronizar()
+            comparador = self.comparador
+            parametros = comparador.segmentos[0].parametros if comparador.filas else None
+            return self._reconocer_grupos([self._histogramas_imagen(imagen, parametros)])[0]
+        except Exception as e:
+            print(f"Error en reconocimiento facial: {str(e)}")
+            return []
+            
+    @en_pool('facial')
+    def reconocimiento_facial_lote(self, imagenes):
+        """
+        Reconoce un lote de imágenes
+        
+        La decodificación, detección e histogramas se hacen en paralelo y todos
+        los rostros de todas las imágenes se comparan contra la galería en una
+        sola pasada.
+        
+        Args:
+            imagenes: Lista de imágenes (numpy arrays o bytes JPEG/PNG sin decodificar)
+            
+        Returns:
+            list: Por imagen y en el mismo orden, dict con codigo_estudiante y
+                  confianza del primer rostro, rostro_detectado y la lista de
+                  rostros (o error)
+        """
+        self.sincronizar()
+        comparador = self.comparador
+        parametros = comparador.segmentos[0].parametros if comparador.filas else None
+        
+        if self.hilos is None:
+            with self.lock:
+                if self.hilos is None:
+                    self.hilos = ThreadPoolExecutor(max_workers=HILOS_LOTE, thread_name_prefix='facial')
+                    
+        def procesar(imagen):
+            try:
+                return self._histogramas_imagen(imagen, parametros), None
+            except Exception as e:
+                return [], str(e)
+                
+        procesadas = list(self.hilos.map(procesar, imagenes))
+        reconocidas = self._reconocer_grupos([grupo for grupo, _ in procesadas])
+        
+        resultados = []
+        for (_, error), rostros in zip(procesadas, reconocidas):
+            if error:
+                resultados.append({'error': error, 'rostro_detectado': False, 'rostros': []})
+                continue
+            primero = rostros[0] if rostros else {'codigo_estudiante': None, 'confianza': 0}
+            resultados.append({
+                'codigo_estudiante': primero['codigo_estudiante'],
+                'confianza': primero['confianza'],
+                'rostro_detectado': bool(rostros),
+                'rostros': rostros
+            })
+        return resultados
+        
+    def detectar_rostros(self, imagen):
+        """
+        Detecta todos los rostros de la imagen
+        
+        Returns:
+            list: Lista de ((x, y, ancho, alto), rostro en escala de grises)
+        """
+        # Convertir a escala de grises
+        gris = cv2.cvtColor(imagen, cv2.COLOR_BGR2GRAY)
+        
+        # Detectar rostros
+        rostros = self.detector.detectMultiScale(
+            gris,
+            scaleFactor=1.1,
+            minNeighbors=5,
+            minSize=(30, 30)
+        )
+        
+        return [
+            ((int(x), int(y), int(w), int(h)), gris[y:y+h, x:x+w])
+            for x, y, w, h in rostros
+        ]
+        
+    def extraer_rostro(self, imagen):
+        """
+        Detecta el primer rostro de la imagen y lo recorta en escala de grises
+        
+        Returns:
+            numpy array: Rostro recortado o None si no se detecta ninguno
+        """
+        rostros = self.detectar_rostros(imagen)
+        return rostros[0][1] if rostros else None
+        
+    @en_pool('facial')
+    def extraer_rostro_principal(self, imagen):
+        """
+        Recorta el rostro más grande de la imagen (el de la persona más cercana)
+        
+        Returns:
+            numpy array: Rostro recortado o None si no se detecta ninguno
+        """
+        rostros = self.detectar_rostros(imagen)
+        if not rostros:
+            return None
+        return max(rostros, key=lambda r: r[0][2] * r[0][3])[1]
+        
+    @en_pool('facial')
+    def reconocer_top_k(self, imagen, k=5):
+        """
+        Devuelve los k estudiantes más parecidos al rostro de la imagen
+        
+        Args:
+            imagen: Imagen en formato numpy array
+            k: Número de candidatos
+            
+        Returns:
+            list: Lista de dicts con codigo_estudiante, distancia y confianza
+        """
+        rostro = self.extraer_rostro(imagen)
+        if rostro is None:
+            return []
+        self.sincronizar()
+        return [
+            {
+                'codigo_estudiante': codigo,
+                'distancia': distancia,
+                'confianza': self._confianza(distancia)
+            }
+            for codigo, distancia in self.candidatos(rostro, k=k)
+        ]
+        
     def capturar_rostro(self, codigo_estudiante):
         """
         Captura rostros desde la cámara y los guarda
         
         Args:
             codigo_estudiante: Código del estudiante para nombrar las imágenes
+            
+        Returns:
+            list: Rutas de las fotos guardadas
         """
+        rutas = []
         try:
             # Crear directorio si no existe
             os.makedirs(DATASET_FACIAL, exist_ok=True)
@@ -93,6 +509,7 @@ class ReconocimientoFacial:
             # Iniciar cámara
             cap = cv2.VideoCapture(0)
             contador = 0
+            rostros_capturados = []
             
             while contador < MAX_FOTOS:
                 ret, frame = cap.read()
@@ -118,6 +535,8 @@ class ReconocimientoFacial:
                     rostro = gris[y:y+h, x:x+w]
                     ruta = os.path.join(DATASET_FACIAL, f"{codigo_estudiante}_{contador}.jpg")
                     cv2.imwrite(ruta, rostro)
+                    rutas.append(ruta)
+                    rostros_capturados.append(rostro)
                     contador += 1
                     
                 # Mostrar contador
@@ -139,17 +558,116 @@ class ReconocimientoFacial:
             cap.release()
             cv2.destroyAllWindows()
             
-            # Entrenar modelo con nuevas imágenes
-            self.entrenar_modelo()
+            # Agregar solo los rostros nuevos al modelo
+            self.actualizar_modelo(codigo_estudiante, rostros_capturados)
             
         except Exception as e:
             print(f"Error al capturar rostro: {str(e)}")
+        return rutas
+            
+    def actualizar_modelo(self, codigo_estudiante, rostros):
+        """
+        Agrega los rostros de un estudiante al modelo sin reentrenarlo completo
+        
+        Solo se calculan los histogramas de los rostros nuevos y se persiste
+        únicamente el delta (MODELO_FACIAL_DELTA); la base binaria no se toca.
+        Si el estudiante ya tenía rostros en el delta (nueva inscripción), se
+        reemplazan en lugar de acumularse. El delta se relee y reescribe bajo un bloqueo entre procesos, así las
+        inscripciones simultáneas en distintos workers no se pisan.
+        El reentrenamiento completo queda como operación offline (entrenar_modelo).
+        
+        Args:
+            codigo_estudiante: Código del estudiante
+            rostros: Lista de rostros en escala de grises (numpy arrays)
+            
+        Returns:
+            bool: True si el modelo se actualizó exitosamente
+        """
+        try:
+            if not rostros:
+                return False
+                
+            parametros = self.base.parametros if self.base is not None else None
+            etiqueta = int(codigo_estudiante)
+            nuevo = SegmentoModelo(
+                np.vstack([self._histograma(rostro, parametros) for rostro in rostros]),
+                np.full(len(rostros), etiqueta, dtype=np.int32),
+                parametros=parametros
+            )
+            
+            with self.lock, self._bloqueo_archivos():
+                # Otro worker pudo agregar rostros (o consolidar) desde la última lectura
+                self.sincronizar()
+                anterior = self.delta
+                if anterior is not None:
+                    # Los rostros anteriores del estudiante en el delta se reemplazan
+                    conservar = np.asarray(anterior.etiquetas) != etiqueta
+                    if not conservar.all():
+                        anterior = SegmentoModelo(
+                            anterior.bloque(0, anterior.filas)[conservar],
+                            np.asarray(anterior.etiquetas)[conservar],
+                            parametros=anterior.parametros
+                        )
+                delta = concatenar([s for s in (anterior, nuevo) if s is not None])
+                guardar_segmento(MODELO_FACIAL_DELTA, delta.histogramas, delta.etiquetas, delta.parametros)
+                self.delta = delta
+                self.versiones = self._versiones_en_disco()
+                self._actualizar_comparador()
+                
+            print(f"Modelo facial actualizado con {len(rostros)} rostros de {codigo_estudiante}")
+            return True
+            
+        except Exception as e:
+            print(f"Error al actualizar modelo: {str(e)}")
+            return False
+            
+    def _histograma(self, rostro, parametros=None):
+        """Histograma LBPH de un rostro con los parámetros del modelo"""
+        if parametros is None:
+            return calcular_histograma(rostro)
+        return calcular_histograma(
+            rostro, parametros['radio'], parametros['vecinos'], parametros['grid_x'], parametros['grid_y']
+        )
+        
+    def _guardar_base(self, segmento):
+        """Escribe la base binaria, elimina el delta y vuelve a mapear la base"""
+        guardar_segmento(
+            MODELO_FACIAL_BINARIO, segmento.histogramas, segmento.etiquetas,
+            segmento.parametros, MODELO_FACIAL_TIPO
+        )
+        if os.path.exists(MODELO_FACIAL_DELTA):
+            os.remove(MODELO_FACIAL_DELTA)
+        self.base = cargar_segmento(MODELO_FACIAL_BINARIO)
+        self.delta = None
+        self.versiones = self._versiones_en_disco()
+        self._actualizar_comparador(base_modificada=True)
+        
+    def consolidar_modelo(self):
+        """Incorpora el delta a la base binaria y lo vacía"""
+        try:
+            with self.lock, self._bloqueo_archivos():
+                self.sincronizar()
+                if not self.segmentos():
+                    print("No hay modelo para consolidar")
+                    return False
+                self._guardar_base(concatenar(self.segmentos()))
+            print("Modelo facial consolidado exitosamente")
+            return True
+            
+        except Exception as e:
+            print(f"Error al consolidar modelo: {str(e)}")
+            return False
             
     def entrenar_modelo(self):
-        """Entrena el modelo con las imágenes disponibles"""
+        """
+        Reentrena el modelo completo con todas las imágenes disponibles
+        
+        Es una operación O(dataset): se usa offline (scripts/reentrenar_modelo.py)
+        o cuando no existe modelo; el registro de estudiantes usa actualizar_modelo.
+        """
         try:
-            # Obtener imágenes y etiquetas
-            imagenes = []
+            # Obtener histogramas y etiquetas
+            histogramas = []
             etiquetas = []
             
             for archivo in os.listdir(DATASET_FACIAL):
@@ -161,20 +679,15 @@ class ReconocimientoFacial:
                     ruta = os.path.join(DATASET_FACIAL, archivo)
                     imagen = cv2.imread(ruta, cv2.IMREAD_GRAYSCALE)
                     
-                    imagenes.append(imagen)
+                    histogramas.append(calcular_histograma(imagen))
                     etiquetas.append(codigo)
                     
-            if len(imagenes) > 0:
-                # Crear y entrenar modelo
-                self.modelo = cv2.face.LBPHFaceRecognizer_create()
-                self.modelo.train(imagenes, np.array(etiquetas))
-                
-                # Guardar modelo
-                os.makedirs(os.path.dirname(MODELO_FACIAL), exist_ok=True)
-                self.modelo.save(MODELO_FACIAL)
+            if len(histogramas) > 0:
+                with self.lock, self._bloqueo_archivos():
+                    self._guardar_base(SegmentoModelo(np.vstack(histogramas), np.array(etiquetas)))
                 print("Modelo facial entrenado y guardado exitosamente")
             else:
                 print("No hay imágenes para entrenar el modelo")
                 
         except Exception as e:
-            print(f"Error al entrenar modelo: {str(e)}") 
\ No newline at end of file
+            print(f"Error al entrenar modelo: {str(e)}")
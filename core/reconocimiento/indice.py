@@ -0,0 +1,177 @@
+import os
+import numpy as np
+
+from core.reconocimiento.comparador import ComparadorLBPH
+
+# Filas que se proyectan por bloque al construir el índice
+FILAS_POR_BLOQUE = 1024
+
+class IndiceIVF:
+    """
+    Índice aproximado (IVF) sobre los histogramas LBPH de un segmento
+
+    Construcción:
+      1. Transformación raíz cuadrada (Hellinger): la distancia euclídea entre
+         raíces aproxima bien a chi-cuadrado en histogramas normalizados.
+      2. PCA aleatorizado a pocas dimensiones (NumPy, sobre una muestra).
+      3. k-means en el espacio reducido: cada fila queda en la lista de su centroide.
+
+    Búsqueda: se proyecta la consulta, se visitan las `sondas` listas más
+    cercanas, se pre-ordenan sus filas en el espacio reducido y los mejores
+    `candidatos` se re-ordenan con la distancia exacta del ComparadorLBPH.
+    Más sondas/candidatos = más recall y más latencia.
+    """
+
+    def __init__(self, segmento, metrica='chi2'):
+        self.segmento = segmento
+        self.comparador = ComparadorLBPH([segmento], metrica)
+        self.media = None
+        self.componentes = None
+        self.centroides = None
+        self.reducidos = None
+        # Filas ordenadas por lista y offset de inicio de cada lista
+        self.orden = None
+        self.offsets = None
+
+    @property
+    def construido(self):
+        return self.centroides is not None
+
+    def _bloque_hellinger(self, inicio, fin):
+        return np.sqrt(np.asarray(self.segmento.bloque(inicio, fin), dtype=np.float32))
+
+    def _proyectar(self, bloque):
+        return ((bloque - self.media) @ self.componentes.T).astype(np.float32)
+
+    def construir(self, dimensiones=64, listas=None, muestra=4096, iteraciones=20, semilla=0):
+        """
+        Construye el índice
+
+        Args:
+            dimensiones: Dimensiones tras el PCA
+            listas: Número de listas (centroides); por defecto ~ sqrt(filas)
+            muestra: Filas usadas para ajustar el PCA
+            iteraciones: Iteraciones de k-means
+            semilla: Semilla para resultados reproducibles
+        """
+        rng = np.random.default_rng(semilla)
+        filas = self.segmento.filas
+        listas = int(listas or max(1, round(np.sqrt(filas))))
+        listas = min(listas, filas)
+
+        # PCA aleatorizado sobre una muestra
+        elegidas = np.sort(rng.choice(filas, size=min(muestra, filas), replace=False))
+        datos = np.sqrt(self.segmento.seleccion(elegidas))
+        self.media = datos.mean(axis=0)
+        centrados = datos - self.media
+        dimensiones = min(dimensiones, *centrados.shape)
+        aleatoria = rng.standard_normal((centrados.shape[1], dimensiones + 10)).astype(np.float32)
+        base = centrados @ aleatoria
+        for _ in range(2):
+            base, _ = np.linalg.qr(centrados @ (centrados.T @ base))
+        base, _ = np.linalg.qr(base)
+        _, _, vt = np.linalg.svd(base.T @ centrados, full_matrices=False)
+        self.componentes = vt[:dimensiones].astype(np.float32)
+
+        # Proyectar todas las filas por bloques
+        self.reducidos = np.vstack([
+            self._proyectar(self._bloque_hellinger(inicio, inicio + FILAS_POR_BLOQUE))
+            for inicio in range(0, filas, FILAS_POR_BLOQUE)
+        ])
+
+        # k-means (inicialización k-means++) en el espacio reducido
+        self.centroides = self._kmeans(self.reducidos, listas, iteraciones, rng)
+        asignacion = self._mas_cercanos(self.reducidos, self.centroides, 1)[:, 0]
+        self.orden = np.argsort(asignacion, kind='stable')
+        self.offsets = np.searchsorted(asignacion[self.orden], np.arange(listas + 1))
+        return self
+
+    @staticmethod
+    def _mas_cercanos(puntos, centroides, n):
+        distancias = (
+            (puntos * puntos).sum(axis=1)[:, None]
+            - 2 * puntos @ centroides.T
+            + (centroides * centroides).sum(axis=1)[None, :]
+        )
+        n = min(n, len(centroides))
+        cercanos = np.argpartition(distancias, n - 1, axis=1)[:, :n]
+        orden = np.take_along_axis(distancias, cercanos, axis=1).argsort(axis=1)
+        return np.take_along_axis(cercanos, orden, axis=1)
+
+    @staticmethod
+    def _kmeans(puntos, k, iteraciones, rng):
+        centroides = [puntos[rng.integers(len(puntos))]]
+        minimas = ((puntos - centroides[0]) ** 2).sum(axis=1)
+        for _ in range(1, k):
+            total = minimas.sum()
+            indice = rng.choice(len(puntos), p=minimas / total) if total > 0 else rng.integers(len(puntos))
+            centroides.append(puntos[indice])
+            minimas = np.minimum(minimas, ((puntos - puntos[indice]) ** 2).sum(axis=1))
+        centroides = np.array(centroides, dtype=np.float32)
+
+        for _ in range(iteraciones):
+            asignacion = IndiceIVF._mas_cercanos(puntos, centroides, 1)[:, 0]
+            cantidades = np.bincount(asignacion, minlength=k)
+            sumas = np.zeros_like(centroides)
+            np.add.at(sumas, asignacion, puntos)
+            no_vacios = cantidades > 0
+            nuevos = centroides.copy()
+            nuevos[no_vacios] = sumas[no_vacios] / cantidades[no_vacios, None]
+            if np.allclose(nuevos, centroides):
+                break
+            centroides = nuevos
+        return centroides
+
+    def buscar(self, consulta, sondas=8, candidatos=200):
+        """
+        Busca las filas más cercanas a la consulta
+
+        Args:
+            consulta: Histograma de la consulta
+            sondas: Listas a visitar
+            candidatos: Filas que se re-ordenan con la distancia exacta
+
+        Returns:
+            tuple: (indices de fila, distancias exactas), ordenados por distancia
+        """
+        consulta = np.asarray(consulta, dtype=np.float32).ravel()
+        reducida = self._proyectar(np.sqrt(consulta)[None, :])
+        listas = self._mas_cercanos(reducida, self.centroides, sondas)[0]
+        filas = np.concatenate([self.orden[self.offsets[l]:self.offsets[l + 1]] for l in listas])
+        if len(filas) > candidatos:
+            diferencias = self.reducidos[filas] - reducida
+            aproximadas = np.einsum('ij,ij->i', diferencias, diferencias)
+            filas = filas[np.argpartition(aproximadas, candidatos - 1)[:candidatos]]
+        exactas = self.comparador.distancias_filas(consulta, filas)
+        orden = np.argsort(exactas, kind='stable')
+        return filas[orden], exactas[orden]
+
+    def guardar(self, ruta, firma):
+        """Guarda el índice junto a la firma del segmento que indexa"""
+        temporal = f"{ruta}.{os.getpid()}.tmp.npz"
+        np.savez(
+            temporal, firma=np.array(firma, dtype=np.int64), media=self.media,
+            componentes=self.componentes, centroides=self.centroides,
+            reducidos=self.reducidos, orden=self.orden, offsets=self.offsets
+        )
+        os.replace(temporal, ruta)
+
+    def cargar(self, ruta, firma):
+        """
+        Carga el índice si fue construido para el mismo segmento
+
+        Returns:
+            bool: True si el índice guardado es válido para la firma dada
+        """
+        if not os.path.exists(ruta):
+            return False
+        with np.load(ruta) as datos:
+            if tuple(datos['firma']) != tuple(firma):
+                return False
+            self.media = datos['media']
+            self.componentes = datos['componentes']
+            self.centroides = datos['centroides']
+            self.reducidos = datos['reducidos']
+            self.orden = datos['orden']
+            self.offsets = datos['offsets']
+        return True
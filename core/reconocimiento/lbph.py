@@ -0,0 +1,86 @@
+import numpy as np
+
+# Parámetros por defecto de cv2.face.LBPHFaceRecognizer_create()
+RADIO = 1
+VECINOS = 8
+GRID_X = 8
+GRID_Y = 8
+
+def calcular_lbp(imagen, radio=RADIO, vecinos=VECINOS):
+    """
+    Calcula la imagen LBP extendida (circular) igual que OpenCV (elbp)
+
+    Args:
+        imagen: Imagen en escala de grises (numpy array uint8)
+        radio: Radio del vecindario circular
+        vecinos: Número de puntos del vecindario
+
+    Returns:
+        numpy array: Códigos LBP de tamaño (alto - 2*radio, ancho - 2*radio)
+    """
+    src = imagen.astype(np.float32)
+    alto, ancho = src.shape
+    centro = src[radio:alto - radio, radio:ancho - radio]
+    lbp = np.zeros(centro.shape, dtype=np.int32)
+    eps = np.finfo(np.float32).eps
+
+    for n in range(vecinos):
+        # Mismas operaciones en float32 que OpenCV para obtener códigos idénticos
+        x = np.float32(radio * np.cos(2.0 * np.pi * n / float(vecinos)))
+        y = np.float32(-radio * np.sin(2.0 * np.pi * n / float(vecinos)))
+        fx, fy = int(np.floor(x)), int(np.floor(y))
+        cx, cy = int(np.ceil(x)), int(np.ceil(y))
+        ty = np.float32(y - fy)
+        tx = np.float32(x - fx)
+        w1 = np.float32((1 - tx) * (1 - ty))
+        w2 = np.float32(tx * (1 - ty))
+        w3 = np.float32((1 - tx) * ty)
+        w4 = np.float32(tx * ty)
+
+        def vecindad(dy, dx):
+            return src[radio + dy:alto - radio + dy, radio + dx:ancho - radio + dx]
+
+        t = (w1 * vecindad(fy, fx) + w2 * vecindad(fy, cx)
+             + w3 * vecindad(cy, fx) + w4 * vecindad(cy, cx))
+        activo = (t > centro) | (np.abs(t - centro) < eps)
+        lbp += activo.astype(np.int32) << n
+
+    return lbp
+
+def histograma_espacial(lbp, patrones, grid_x=GRID_X, grid_y=GRID_Y):
+    """
+    Concatena los histogramas normalizados de cada celda de la grilla
+
+    Args:
+        lbp: Imagen de códigos LBP
+        patrones: Número de bins por celda (2 ** vecinos)
+        grid_x: Celdas en horizontal
+        grid_y: Celdas en vertical
+
+    Returns:
+        numpy array: Vector float32 de grid_x * grid_y * patrones elementos
+    """
+    ancho = lbp.shape[1] // grid_x
+    alto = lbp.shape[0] // grid_y
+    # Recortar a la grilla y agrupar por celda para un único bincount
+    celdas = lbp[:alto * grid_y, :ancho * grid_x].reshape(grid_y, alto, grid_x, ancho)
+    celdas = celdas.transpose(0, 2, 1, 3).reshape(grid_y * grid_x, alto * ancho)
+    desplazamiento = (np.arange(grid_y * grid_x) * patrones)[:, None]
+    conteos = np.bincount((celdas + desplazamiento).ravel(), minlength=grid_y * grid_x * patrones)
+    total = alto * ancho
+    if total == 0:
+        return np.zeros(grid_x * grid_y * patrones, dtype=np.float32)
+    return (conteos.astype(np.float32) / np.float32(total))
+
+def calcular_histograma(rostro, radio=RADIO, vecinos=VECINOS, grid_x=GRID_X, grid_y=GRID_Y):
+    """
+    Calcula el histograma LBPH de un rostro, equivalente al de OpenCV
+
+    Args:
+        rostro: Rostro en escala de grises (numpy array)
+
+    Returns:
+        numpy array: Histograma float32 (16384 elementos con los valores por defecto)
+    """
+    lbp = calcular_lbp(rostro, radio, vecinos)
+    return histograma_espacial(lbp, 2 ** vecinos, grid_x, grid_y)
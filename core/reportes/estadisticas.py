@@ -0,0 +1,100 @@
+from datetime import date, timedelta
+
+class EstadisticasPertenencias:
+    """
+    Consultas para los tableros de administración
+
+    Leen las tablas estadisticas_objetos y estadisticas_horas, que los
+    triggers de pertenencias mantienen al día en cada entrada y salida
+    (migración 'estadisticas_pertenencias'). El costo depende de la cantidad
+    de tipos de objeto y de días consultados, no del tamaño del historial.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def _consultar(self, query, params=None):
+        cursor = self.db.ejecutar(query, params)
+        if cursor is None:
+            raise RuntimeError('Error al consultar estadísticas')
+        return cursor.fetchall()
+
+    @staticmethod
+    def _minutos(segundos, cantidad):
+        return round(segundos / cantidad / 60, 1) if cantidad else None
+
+    def por_tipo(self):
+        """
+        Returns:
+            list: Por tipo de objeto: en_custodia, entradas, salidas y
+                  permanencia_promedio_minutos (de los objetos ya retirados)
+        """
+        filas = self._consultar('''
+            SELECT tipo_objeto, en_custodia, entradas, salidas, permanencia_segundos
+            FROM estadisticas_objetos
+            WHERE entradas > 0
+            ORDER BY en_custodia DESC, tipo_objeto
+        ''')
+        return [{
+            'tipo_objeto': tipo,
+            'en_custodia': en_custodia,
+            'entradas': entradas,
+            'salidas': salidas,
+            'permanencia_promedio_minutos': self._minutos(float(permanencia), salidas)
+        } for tipo, en_custodia, entradas, salidas, permanencia in filas]
+
+    def resumen(self):
+        """
+        Returns:
+            dict: Totales de todos los tipos: en_custodia, entradas, salidas,
+                  permanencia_promedio_minutos
+        """
+        fila, = self._consultar('''
+            SELECT COALESCE(SUM(en_custodia), 0), COALESCE(SUM(entradas), 0),
+                   COALESCE(SUM(salidas), 0), COALESCE(SUM(permanencia_segundos), 0)
+            FROM estadisticas_objetos
+        ''')
+        en_custodia, entradas, salidas, permanencia = fila
+        return {
+            'en_custodia': int(en_custodia),
+            'entradas': int(entradas),
+            'salidas': int(salidas),
+            'permanencia_promedio_minutos': self._minutos(float(permanencia), int(salidas))
+        }
+
+    def horas_pico(self, dias=30):
+        """
+        Entradas y salidas por hora del día en los últimos `dias` días
+
+        Returns:
+            dict: desde, horas (24 elementos con hora, entradas y salidas),
+                  hora_pico_entradas y hora_pico_salidas (None si no hubo movimiento)
+        """
+        desde = date.today() - timedelta(days=max(dias, 1) - 1)
+        filas = self._consultar('''
+            SELECT hora, SUM(entradas), SUM(salidas)
+            FROM estadisticas_horas
+            WHERE dia >= %s
+            GROUP BY hora
+        ''', (desde,))
+        horas = [{'hora': hora, 'entradas': 0, 'salidas': 0} for hora in range(24)]
+        for hora, entradas, salidas in filas:
+            horas[hora]['entradas'] = int(entradas)
+            horas[hora]['salidas'] = int(salidas)
+
+        def pico(campo):
+            mejor = max(horas, key=lambda h: h[campo])
+            return mejor['hora'] if mejor[campo] else None
+
+        return {
+            'desde': desde.isoformat(),
+            'horas': horas,
+            'hora_pico_entradas': pico('entradas'),
+            'hora_pico_salidas': pico('salidas')
+        }
+
+    def recalcular(self):
+        """Reconstruye los agregados desde pertenencias (p. ej. tras cargas manuales)"""
+        with self.db.transaccion() as t:
+            t.ejecutar('LOCK TABLE pertenencias IN SHARE ROW EXCLUSIVE MODE')
+            t.ejecutar('SELECT recalcular_estadisticas_pertenencias()')
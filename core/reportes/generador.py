@@ -1,109 +1,171 @@
 from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment
-from io import BytesIO
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, NamedStyle
+from openpyxl.utils import get_column_letter
+from itertools import chain, islice
 from datetime import datetime
+import tempfile
 import os
 
+from utils.config import REPORTE_MEMORIA_MAXIMA, LOTE_CURSOR
+from core.reportes.pdf import escribir_pdf_pertenencias
+
+# Encabezados del reporte, en el orden de las columnas de la consulta
+ENCABEZADOS = ['ID', 'Código Estudiante', 'Objeto', 'Descripción',
+               'Hora Entrada', 'Hora Salida', 'Estado']
+# Estilo con nombre de cada columna
+ESTILOS_COLUMNAS = ['celda', 'celda', 'celda', 'celda', 'fecha', 'fecha', 'celda']
+# Filas que se miden para calcular el ancho de las columnas
+MUESTRA_ANCHOS = 500
+ANCHO_MAXIMO = 60
+FORMATO_FECHA = 'yyyy-mm-dd hh:mm:ss'
+
+def _estilos():
+    """Estilos con nombre: se guardan una vez en el libro y cada celda solo los referencia"""
+    centrado = Alignment(horizontal='center')
+    return [
+        NamedStyle(name='encabezado', font=Font(bold=True, color="FFFFFF"),
+                   fill=PatternFill(start_color="366092", end_color="366092", fill_type="solid"),
+                   alignment=centrado),
+        NamedStyle(name='celda', alignment=centrado),
+        NamedStyle(name='fecha', alignment=centrado, number_format=FORMATO_FECHA),
+    ]
+
+def _largo(valor):
+    if valor is None:
+        return 0
+    if isinstance(valor, datetime):
+        return len(FORMATO_FECHA)
+    return len(str(valor))
+
+def escribir_excel_pertenencias(filas, destino):
+    """
+    Escribe el reporte Excel en modo de solo escritura (en flujo)
+
+    openpyxl no guarda las filas ya escritas, así que la memoria no crece con
+    el reporte. Como el ancho de las columnas debe fijarse antes de la primera
+    fila, se calcula con las primeras MUESTRA_ANCHOS filas.
+
+    Args:
+        filas: Iterable de tuplas en el orden de ENCABEZADOS
+        destino: Archivo binario abierto para escritura
+
+    Returns:
+        int: Filas escritas
+    """
+    wb = Workbook(write_only=True)
+    for estilo in _estilos():
+        wb.add_named_style(estilo)
+    ws = wb.create_sheet("Reporte de Pertenencias")
+
+    filas = iter(filas)
+    muestra = list(islice(filas, MUESTRA_ANCHOS))
+    for col, encabezado in enumerate(ENCABEZADOS):
+        largo = max([len(encabezado)] + [_largo(fila[col]) for fila in muestra])
+        ws.column_dimensions[get_column_letter(col + 1)].width = min(largo + 2, ANCHO_MAXIMO)
+
+    def celda(valor, estilo):
+        c = WriteOnlyCell(ws, value=valor)
+        c.style = estilo
+        return c
+
+    ws.append([celda(encabezado, 'encabezado') for encabezado in ENCABEZADOS])
+    # Una celda con estilo por columna que se reutiliza en todas las filas:
+    # append serializa cada celda antes de pasar a la siguiente
+    plantillas = [celda(None, estilo) for estilo in ESTILOS_COLUMNAS]
+    total = 0
+    for fila in chain(muestra, filas):
+        for plantilla, valor in zip(plantillas, fila):
+            plantilla.value = valor
+        ws.append(plantillas)
+        total += 1
+
+    wb.save(destino)
+    return total
+
 class GeneradorReportes:
     def __init__(self, db):
         self.db = db
-        
-    def generar_reporte_pertenencias(self, filtros=None):
+
+    def _consulta(self, filtros):
+        """SQL y parámetros del reporte de pertenencias según los filtros"""
+        query = """
+            SELECT id, codigo_estudiante, tipo_objeto, descripcion,
+                   fecha_entrada, fecha_salida, estado
+            FROM pertenencias
+            WHERE 1=1
         """
-        Genera un reporte Excel de pertenencias
-        
-        Args:
-            filtros: Diccionario con filtros opcionales (estudiante, estado, etc)
-            
+        params = []
+        if filtros:
+            if filtros.get('estudiante'):
+                query += " AND codigo_estudiante ILIKE %s"
+                params.append(f"%{filtros['estudiante']}%")
+            if filtros.get('codigo_estudiante'):
+                query += " AND codigo_estudiante = %s"
+                params.append(filtros['codigo_estudiante'])
+            if filtros.get('estado'):
+                query += " AND UPPER(estado) LIKE %s"
+                params.append(f"%{filtros['estado'].upper()}%")
+            if filtros.get('desde'):
+                query += " AND fecha_entrada >= %s"
+                params.append(filtros['desde'])
+            if filtros.get('hasta'):
+                query += " AND fecha_entrada < %s"
+                params.append(filtros['hasta'])
+        query += " ORDER BY fecha_entrada DESC, id DESC"
+        return query, tuple(params)
+
+    def _generar(self, escribir, filtros, destino, sufijo, tamano_lote):
+        """
+        Lee las pertenencias por lotes con un cursor del servidor y las pasa a `escribir`
+
         Returns:
-            BytesIO: Buffer con el archivo Excel
+            tuple: (archivo posicionado al inicio, filas escritas)
         """
+        propio = destino is None
+        if propio:
+            destino = tempfile.SpooledTemporaryFile(max_size=REPORTE_MEMORIA_MAXIMA, suffix=sufijo)
         try:
-            # Obtener datos de la base de datos
-            query = """
-                SELECT 
-                    rp.idPertenencia,
-                    e.codigoEstudiante,
-                    e.Nombres,
-                    o.Nombre as nombreObjeto,
-                    rp.Hora_Entrada,
-                    rp.Hora_Salida,
-                    ep.estado
-                FROM registros_pertenencia rp
-                JOIN estudiantes e ON rp.idEstudiante = e.idEstudiante
-                JOIN objetos o ON rp.idObjeto = o.idObjeto
-                JOIN estado_pertenencias ep ON rp.idEstado = ep.id
-                WHERE 1=1
-            """
-            
-            # Aplicar filtros si existen
-            params = []
-            if filtros:
-                if filtros.get('estudiante'):
-                    query += " AND (e.Nombres LIKE %s OR e.codigoEstudiante LIKE %s)"
-                    params.extend([f"%{filtros['estudiante']}%", f"%{filtros['estudiante']}%"])
-                if filtros.get('estado'):
-                    query += " AND ep.estado LIKE %s"
-                    params.append(f"%{filtros['estado']}%")
-                    
-            # Ejecutar consulta
-            resultados = self.db.obtener_todos(query, tuple(params))
-            
-            # Crear Excel
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "Reporte de Pertenencias"
-            
-            # Estilo para encabezados
-            header_font = Font(bold=True, color="FFFFFF")
-            header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-            
-            # Agregar encabezados
-            headers = ['ID', 'Código Estudiante', 'Nombre Estudiante', 'Objeto', 
-                      'Hora Entrada', 'Hora Salida', 'Estado']
-            
-            for col, header in enumerate(headers, 1):
-                cell = ws.cell(row=1, column=col, value=header)
-                cell.font = header_font
-                cell.fill = header_fill
-                cell.alignment = Alignment(horizontal='center')
-            
-            # Agregar datos
-            for row, r in enumerate(resultados, 2):
-                ws.append([
-                    r[0],  # ID
-                    r[1],  # Código Estudiante
-                    r[2],  # Nombre Estudiante
-                    r[3],  # Objeto
-                    r[4],  # Hora Entrada
-                    r[5],  # Hora Salida
-                    r[6]   # Estado
-                ])
-                
-                # Centrar todas las celdas
-                for col in range(1, len(headers) + 1):
-                    ws.cell(row=row, column=col).alignment = Alignment(horizontal='center')
-            
-            # Ajustar ancho de columnas
-            for col in ws.columns:
-                max_length = 0
-                column = col[0].column_letter
-                for cell in col:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = (max_length + 2)
-                ws.column_dimensions[column].width = adjusted_width
-            
-            # Guardar en buffer
-            excel_buffer = BytesIO()
-            wb.save(excel_buffer)
-            excel_buffer.seek(0)
-            
-            return excel_buffer
-            
+            query, params = self._consulta(filtros)
+            with self.db.cursor_servidor(tamano_lote) as cursor:
+                cursor.execute(query, params)
+                total = escribir(cursor, destino)
+            destino.seek(0)
+            return destino, total
+
         except Exception as e:
             print(f"Error al generar reporte: {str(e)}")
-            raise 
\ No newline at end of file
+            if propio:
+                destino.close()
+            raise
+
+    def generar_reporte_pertenencias(self, filtros=None, destino=None, tamano_lote=LOTE_CURSOR):
+        """
+        Genera un reporte Excel de pertenencias
+
+        Las filas se leen por lotes con un cursor del servidor y se escriben
+        en flujo (ver escribir_excel_pertenencias).
+
+        Args:
+            filtros: Diccionario con filtros opcionales (estudiante, codigo_estudiante,
+                     estado, desde, hasta)
+            destino: Archivo donde escribir; por defecto un SpooledTemporaryFile
+                     que pasa a disco al superar REPORTE_MEMORIA_MAXIMA
+            tamano_lote: Filas por viaje a la base de datos
+
+        Returns:
+            tuple: (archivo posicionado al inicio, filas escritas)
+        """
+        return self._generar(escribir_excel_pertenencias, filtros, destino, '.xlsx', tamano_lote)
+
+    def generar_pdf_pertenencias(self, filtros=None, destino=None, tamano_lote=LOTE_CURSOR):
+        """
+        Genera el reporte PDF de pertenencias (mismos filtros que el Excel)
+
+        Returns:
+            tuple: (archivo posicionado al inicio, filas escritas)
+        """
+        return self._generar(
+            lambda filas, archivo: escribir_pdf_pertenencias(filas, archivo, filtros),
+            filtros, destino, '.pdf', tamano_lote
+        )
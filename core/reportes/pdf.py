@@ -0,0 +1,124 @@
+from datetime import datetime
+
+from reportlab.lib.pagesizes import letter, landscape
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+
+# Hoja carta apaisada, márgenes y alto de fila en puntos
+PAGINA = landscape(letter)
+MARGEN = 36
+ALTO_FILA = 13
+FUENTE = 'Helvetica'
+FUENTE_TITULO = 'Helvetica-Bold'
+TAMANO_FUENTE = 8
+
+# (título, ancho en puntos), en el orden de las columnas de la consulta del reporte
+COLUMNAS_PDF = [
+    ('ID', 40),
+    ('Estudiante', 90),
+    ('Objeto', 90),
+    ('Descripción', 210),
+    ('Entrada', 100),
+    ('Salida', 100),
+    ('Estado', 80),
+]
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, datetime):
+        return valor.strftime('%Y-%m-%d %H:%M:%S')
+    return str(valor)
+
+# Ancho de cada carácter en la fuente de las filas, medido una sola vez
+_ANCHOS = {}
+
+def _ancho(caracter):
+    ancho = _ANCHOS.get(caracter)
+    if ancho is None:
+        ancho = _ANCHOS[caracter] = stringWidth(caracter, FUENTE, TAMANO_FUENTE)
+    return ancho
+
+def _recortar(texto, ancho):
+    """Recorta el texto para que quepa en el ancho de la columna"""
+    acumulado = 0
+    for i, caracter in enumerate(texto):
+        acumulado += _ancho(caracter)
+        if acumulado > ancho:
+            # Se quitan caracteres hasta que quepa también la elipsis
+            acumulado -= _ancho(caracter)
+            limite = ancho - _ancho('…')
+            while i and acumulado > limite:
+                i -= 1
+                acumulado -= _ancho(texto[i])
+            return texto[:i] + '…'
+    return texto
+
+def _descripcion_filtros(filtros):
+    partes = [f'{clave}: {_texto(valor)}' for clave, valor in (filtros or {}).items() if valor]
+    return ', '.join(partes) if partes else 'sin filtros'
+
+def escribir_pdf_pertenencias(filas, destino, filtros=None):
+    """
+    Dibuja el reporte de pertenencias en `destino` a medida que llegan las filas
+
+    Las filas no se acumulan: cada página se cierra y se comprime en cuanto
+    se llena, y reportlab solo conserva los flujos comprimidos hasta save().
+
+    Args:
+        filas: Iterable de tuplas en el orden de COLUMNAS_PDF
+        destino: Archivo binario abierto para escritura
+        filtros: Filtros aplicados, para el encabezado
+
+    Returns:
+        int: Filas escritas
+    """
+    ancho_pagina, alto_pagina = PAGINA
+    pdf = canvas.Canvas(destino, pagesize=PAGINA, pageCompression=1)
+    pdf.setTitle('Reporte de Pertenencias')
+    generado = datetime.now().strftime('%Y-%m-%d %H:%M')
+    subtitulo = f'Generado: {generado} | Filtros: {_descripcion_filtros(filtros)}'
+
+    def encabezado(numero):
+        y = alto_pagina - MARGEN
+        pdf.setFont(FUENTE_TITULO, 14)
+        pdf.drawString(MARGEN, y, 'Reporte de Pertenencias')
+        pdf.setFont(FUENTE, TAMANO_FUENTE)
+        pdf.drawRightString(ancho_pagina - MARGEN, y, f'Página {numero}')
+        y -= 16
+        pdf.drawString(MARGEN, y, subtitulo[:160])
+        y -= 20
+        pdf.setFont(FUENTE_TITULO, TAMANO_FUENTE)
+        x = MARGEN
+        for titulo, ancho in COLUMNAS_PDF:
+            pdf.drawString(x, y, titulo)
+            x += ancho
+        pdf.line(MARGEN, y - 3, ancho_pagina - MARGEN, y - 3)
+        pdf.setFont(FUENTE, TAMANO_FUENTE)
+        return y - ALTO_FILA
+
+    pagina = 1
+    y = encabezado(pagina)
+    total = 0
+    for fila in filas:
+        if y < MARGEN:
+            pdf.showPage()
+            pagina += 1
+            y = encabezado(pagina)
+        # Un objeto de texto por fila en lugar de uno por celda
+        texto = pdf.beginText()
+        texto.setFont(FUENTE, TAMANO_FUENTE)
+        x = MARGEN
+        for (_, ancho), valor in zip(COLUMNAS_PDF, fila):
+            texto.setTextOrigin(x, y)
+            texto.textOut(_recortar(_texto(valor), ancho - 6))
+            x += ancho
+        pdf.drawText(texto)
+        y -= ALTO_FILA
+        total += 1
+
+    if not total:
+        pdf.drawString(MARGEN, y, 'No hay pertenencias para los filtros indicados')
+    pdf.showPage()
+    pdf.save()
+    return total
@@ -0,0 +1,285 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.config import (
+    REPORTES_DIR,
+    REPORTE_WORKERS,
+    REPORTE_CACHE_TTL,
+    REPORTE_RETENCION,
+    REPORTE_CACHE_MAXIMO,
+    REPORTE_RETENCION_MINIMA
+)
+
+# Estados de un trabajo
+PENDIENTE, EN_PROCESO, LISTO, ERROR = 'pendiente', 'en_proceso', 'listo', 'error'
+FORMATO_ID = re.compile(r'^[0-9a-f]{32}$')
+
+def clave_reporte(tipo, parametros):
+    """Id del trabajo: hash de los parámetros, igual para peticiones idénticas"""
+    texto = json.dumps({'tipo': tipo, 'parametros': parametros}, sort_keys=True, default=str)
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()[:32]
+
+class ColaTrabajos:
+    """
+    Genera reportes en segundo plano y los guarda en disco como caché
+
+    El cliente envía el trabajo, recibe un id y consulta su estado hasta que
+    queda 'listo'. El id es el hash de los parámetros: una petición idéntica
+    dentro de `ttl` segundos reutiliza el archivo ya generado (o el trabajo en
+    curso). El estado de cada trabajo se guarda en <id>.json junto al
+    reporte, así cualquier worker de gunicorn puede responder por él.
+
+    Los reportes se escriben con un nombre temporal y se renombran al
+    terminar; los de más de `retencion` segundos se borran, y si la carpeta
+    supera `maximo` bytes se borran primero los más antiguos, salvo los
+    terminados hace menos de `minimo` segundos y el más reciente, que aún
+    pueden estar esperando su descarga.
+    """
+
+    def __init__(self, directorio, workers=2, ttl=300, retencion=3600, maximo=500 * 1024 * 1024, minimo=300):
+        """
+        Args:
+            directorio: Carpeta donde se guardan los reportes generados
+            workers: Reportes que se generan a la vez (por proceso)
+            ttl: Segundos durante los que un reporte listo se reutiliza
+            retencion: Segundos tras los que un reporte se borra
+            maximo: Bytes máximos de reportes en disco
+            minimo: Segundos tras terminar durante los que un reporte no se borra por tamaño
+        """
+        self.directorio = directorio
+        self.workers = max(1, workers)
+        self.ttl = ttl
+        self.retencion = retencion
+        self.maximo = maximo
+        self.minimo = minimo
+        self.ejecutor = None
+        self.futuros = {}
+        self.lock = threading.Lock()
+
+    def _ejecutor(self):
+        """Crea los hilos en el primer trabajo (no al importar ni antes de un fork)"""
+        with self.lock:
+            if self.ejecutor is None:
+                self.ejecutor = ThreadPoolExecutor(self.workers, thread_name_prefix='reportes')
+            return self.ejecutor
+
+    def _ruta(self, id_trabajo, extension):
+        return os.path.join(self.directorio, f'{id_trabajo}.{extension}')
+
+    def _leer(self, id_trabajo):
+        if not FORMATO_ID.match(id_trabajo or ''):
+            return None
+        try:
+            with open(self._ruta(id_trabajo, 'json'), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _guardar(self, trabajo):
+        ruta = self._ruta(trabajo['id'], 'json')
+        temporal = f'{ruta}.{os.getpid()}.{threading.get_ident()}'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(trabajo, f)
+        os.replace(temporal, ruta)
+
+    def _vigente(self, trabajo):
+        """Si un trabajo existente sirve para una petición nueva con los mismos parámetros"""
+        if trabajo is None:
+            return False
+        ahora = time.time()
+        if trabajo['estado'] in (PENDIENTE, EN_PROCESO):
+            # Un trabajo en curso de un proceso que murió se abandona tras la retención
+            return ahora - trabajo['creado'] < self.retencion
+        if trabajo['estado'] == LISTO:
+            return (ahora - trabajo['terminado'] < self.ttl
+                    and os.path.exists(self._ruta(trabajo['id'], trabajo['extension'])))
+        return False
+
+    def enviar(self, tipo, parametros, generar, extension, nombre):
+        """
+        Encola un reporte, o devuelve el trabajo idéntico vigente
+
+        Args:
+            tipo: Tipo de reporte (forma parte de la clave de caché)
+            parametros: Filtros del reporte (forman parte de la clave de caché)
+            generar: Función archivo -> filas escritas; escribe el reporte en el archivo
+            extension: Extensión del archivo ('pdf', 'xlsx')
+            nombre: Nombre sugerido para la descarga
+
+        Returns:
+            str: Id del trabajo
+        """
+        id_trabajo = clave_reporte(tipo, parametros)
+        os.makedirs(self.directorio, exist_ok=True)
+        with self.lock:
+            if self._vigente(self._leer(id_trabajo)):
+                return id_trabajo
+            self._guardar({
+                'id': id_trabajo,
+                'tipo': tipo,
+                'estado': PENDIENTE,
+                'nombre': nombre,
+                'extension': extension,
+                'creado': time.time()
+            })
+        futuro = self._ejecutor().submit(self._ejecutar, id_trabajo, generar)
+        with self.lock:
+            self.futuros[id_trabajo] = futuro
+        futuro.add_done_callback(lambda _: self._olvidar(id_trabajo, futuro))
+        return id_trabajo
+
+    def _olvidar(self, id_trabajo, futuro):
+        with self.lock:
+            if self.futuros.get(id_trabajo) is futuro:
+                del self.futuros[id_trabajo]
+
+    def _actualizar(self, id_trabajo, **datos):
+        with self.lock:
+            trabajo = self._leer(id_trabajo)
+            if trabajo is None:
+                return None
+            trabajo.update(datos)
+            self._guardar(trabajo)
+            return trabajo
+
+    def _ejecutar(self, id_trabajo, generar):
+        trabajo = self._actualizar(id_trabajo, estado=EN_PROCESO, inicio=time.time())
+        if trabajo is None:
+            return
+        ruta = self._ruta(id_trabajo, trabajo['extension'])
+        temporal = f'{ruta}.{os.getpid()}.parcial'
+        try:
+            with open(temporal, 'wb') as archivo:
+                filas = generar(archivo)
+            os.replace(temporal, ruta)
+            self._actualizar(id_trabajo, estado=LISTO, filas=filas, bytes=os.path.getsize(ruta),
+                             terminado=time.time())
+        except Exception as e:
+            print(f"Error al generar reporte {id_trabajo}: {str(e)}")
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            self._actualizar(id_trabajo, estado=ERROR, error=str(e), terminado=time.time())
+        self.limpiar()
+
+    def esperar(self, id_trabajo, timeout):
+        """
+        Espera a que el trabajo termine
+
+        Returns:
+            bool: True si terminó (listo o con error) antes del timeout
+        """
+        limite = time.monotonic() + timeout
+        with self.lock:
+            futuro = self.futuros.get(id_trabajo)
+        if futuro is not None:
+            try:
+                futuro.result(timeout)
+            except Exception:
+                pass
+        # Trabajo de otro proceso (o ya terminado): se consulta el archivo de estado
+        while True:
+            trabajo = self._leer(id_trabajo)
+            if trabajo is None or trabajo['estado'] in (LISTO, ERROR):
+                return trabajo is not None
+            if time.monotonic() >= limite:
+                return False
+            time.sleep(0.2)
+
+    def estado(self, id_trabajo):
+        """
+        Returns:
+            dict: Estado público del trabajo, o None si no existe
+        """
+        trabajo = self._leer(id_trabajo)
+        if trabajo is None:
+            return None
+        publico = {clave: valor for clave, valor in trabajo.items() if clave != 'extension'}
+        for campo in ('creado', 'inicio', 'terminado'):
+            if campo in publico:
+                publico[campo] = datetime.fromtimestamp(publico[campo]).isoformat(timespec='seconds')
+        return publico
+
+    def archivo(self, id_trabajo):
+        """
+        Returns:
+            tuple: (ruta, nombre de descarga) si el trabajo está listo, o None
+        """
+        trabajo = self._leer(id_trabajo)
+        if trabajo is None or trabajo['estado'] != LISTO:
+            return None
+        ruta = self._ruta(id_trabajo, trabajo['extension'])
+        return (ruta, trabajo['nombre']) if os.path.exists(ruta) else None
+
+    def _borrar(self, trabajo):
+        for ruta in (self._ruta(trabajo['id'], trabajo['extension']), self._ruta(trabajo['id'], 'json')):
+            try:
+                os.remove(ruta)
+            except FileNotFoundError:
+                pass
+
+    def limpiar(self):
+        """
+        Borra los reportes vencidos y, si la carpeta supera el máximo, los más
+        antiguos que ya pasaron el tiempo mínimo (el último terminado nunca)
+
+        Returns:
+            int: Trabajos borrados
+        """
+        if not os.path.isdir(self.directorio):
+            return 0
+        ahora = time.time()
+        borrados = 0
+        listos = []
+        with self.lock:
+            for archivo in os.listdir(self.directorio):
+                ruta = os.path.join(self.directorio, archivo)
+                if archivo.endswith('.parcial'):
+                    # Restos de un proceso que murió a mitad de un reporte
+                    try:
+                        if ahora - os.path.getmtime(ruta) > self.retencion:
+                            os.remove(ruta)
+                    except OSError:
+                        pass
+                    continue
+                if not archivo.endswith('.json'):
+                    continue
+                trabajo = self._leer(archivo[:-len('.json')])
+                if trabajo is None:
+                    continue
+                referencia = trabajo.get('terminado', trabajo['creado'])
+                if ahora - referencia > self.retencion:
+                    self._borrar(trabajo)
+                    borrados += 1
+                elif trabajo['estado'] == LISTO:
+                    listos.append(trabajo)
+
+            total = sum(trabajo.get('bytes', 0) for trabajo in listos)
+            # Solo el último terminado puede superar el máximo por sí solo; se deja para su descarga
+            for trabajo in sorted(listos, key=lambda t: t['terminado'])[:-1]:
+                if total <= self.maximo or ahora - trabajo['terminado'] < self.minimo:
+                    break
+                self._borrar(trabajo)
+                total -= trabajo.get('bytes', 0)
+                borrados += 1
+        return borrados
+
+_cola = None
+_cola_pid = None
+_cola_lock = threading.Lock()
+
+def obtener_cola():
+    """Cola de reportes del proceso, creada al primer uso (y de nuevo tras un fork)"""
+    global _cola, _cola_pid
+    if _cola is None or _cola_pid != os.getpid():
+        with _cola_lock:
+            if _cola is None or _cola_pid != os.getpid():
+                _cola = ColaTrabajos(REPORTES_DIR, REPORTE_WORKERS, REPORTE_CACHE_TTL,
+                                     REPORTE_RETENCION, REPORTE_CACHE_MAXIMO, REPORTE_RETENCION_MINIMA)
+                _cola_pid = os.getpid()
+    return _cola
@@ -0,0 +1,115 @@
+import os
+import time
+import threading
+
+from utils.config import (
+    PERTENENCIAS_DIR,
+    INFERENCIA_WORKERS,
+    INFERENCIA_HILOS_OPENCV,
+    INFERENCIA_COLA_MAXIMA,
+    INFERENCIA_TIMEOUT,
+    INFERENCIA_REINTENTAR
+)
+
+# Servicio -> (instancia, pid que la creó)
+_servicios = {}
+_lock = threading.RLock()
+# Milisegundos que tardó en crearse cada servicio (en este proceso)
+TIEMPOS = {}
+
+def _obtener(nombre, crear, por_proceso=True):
+    """
+    Devuelve el servicio `nombre`, creándolo con `crear()` en el primer uso
+
+    Con por_proceso=True se vuelve a crear tras un fork (hilos, conexiones y
+    procesos hijos no sobreviven al fork). Con False la instancia creada antes
+    del fork se hereda: es la forma de compartir modelos de solo lectura entre
+    los workers de gunicorn (copy-on-write).
+    """
+    entrada = _servicios.get(nombre)
+    if entrada is not None and (not por_proceso or entrada[1] == os.getpid()):
+        return entrada[0]
+    with _lock:
+        entrada = _servicios.get(nombre)
+        if entrada is not None and (not por_proceso or entrada[1] == os.getpid()):
+            return entrada[0]
+        inicio = time.perf_counter()
+        servicio = crear()
+        TIEMPOS[nombre] = (time.perf_counter() - inicio) * 1000
+        print(f"Inicialización de {nombre}: {TIEMPOS[nombre]:.1f} ms (proceso {os.getpid()})")
+        _servicios[nombre] = (servicio, os.getpid())
+        return servicio
+
+def obtener_pool_inferencia():
+    """Pool de procesos de inferencia del proceso, o None con INFERENCIA_WORKERS=0"""
+    def crear():
+        if INFERENCIA_WORKERS <= 0:
+            return None
+        from core.inferencia.pool import PoolInferencia
+        return PoolInferencia(
+            INFERENCIA_WORKERS,
+            hilos_opencv=INFERENCIA_HILOS_OPENCV,
+            cola_maxima=INFERENCIA_COLA_MAXIMA,
+            timeout=INFERENCIA_TIMEOUT,
+            reintentar=INFERENCIA_REINTENTAR
+        )
+    return _obtener('pool_inferencia', crear)
+
+def _crear_reconocedor():
+    from core.reconocimiento.facial import ReconocimientoFacial
+    return ReconocimientoFacial()
+
+def obtener_reconocedor():
+    """
+    Reconocedor facial; su modelo es de solo lectura y se comparte entre
+    procesos si se precargó antes del fork. El pool de inferencia se asigna
+    en cada proceso
+    """
+    reconocedor = _obtener('reconocedor', _crear_reconocedor, por_proceso=False)
+    reconocedor.pool = obtener_pool_inferencia()
+    return reconocedor
+
+def obtener_detector():
+    """Detector de objetos del proceso (sus hilos de micro-lotes no sobreviven a un fork)"""
+    def crear():
+        from core.objetos.deteccion import DeteccionObjetos
+        return DeteccionObjetos(pool=obtener_pool_inferencia())
+    return _obtener('detector', crear)
+
+def obtener_gestionador():
+    """
+    Gestión de pertenencias: conecta con PostgreSQL y aplica las migraciones
+    en el primer uso del proceso, y lanza en segundo plano la recuperación de
+    imágenes interrumpidas por una caída anterior
+    """
+    def crear():
+        from core.pertenencias.gestion import GestionPertenencias
+        from core.almacenamiento.escritor import recuperar
+        gestionador = GestionPertenencias()
+        threading.Thread(target=recuperar, args=(PERTENENCIAS_DIR, gestionador.db), daemon=True).start()
+        return gestionador
+    return _obtener('gestionador', crear)
+
+def obtener_registro_estudiantes():
+    """Índice de estudiantes inscritos del proceso, cargado desde la tabla estudiantes"""
+    def crear():
+        from core.estudiantes.registro import RegistroEstudiantes
+        registro = RegistroEstudiantes(obtener_gestionador().db)
+        registro.cargar()
+        return registro
+    return _obtener('registro_estudiantes', crear)
+
+def precargar():
+    """
+    Carga los modelos de solo lectura (reconocimiento facial) en este proceso
+
+    Con gunicorn --preload se ejecuta en el master antes del fork y los
+    workers comparten las páginas del modelo. Si falta el índice aproximado
+    de la galería se construye aquí, una vez, en lugar de dejar a las
+    peticiones con búsqueda exacta. El detector de objetos, el pool de
+    inferencia y la base de datos no se precargan: tienen hilos, procesos o
+    conexiones propios de cada worker.
+    """
+    reconocedor = _obtener('reconocedor', _crear_reconocedor, por_proceso=False)
+    reconocedor.construir_indice()
+    return dict(TIEMPOS)
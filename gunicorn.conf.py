@@ -0,0 +1,11 @@
+"""
+Configuración de gunicorn (se lee automáticamente desde el directorio de trabajo)
+
+Con PRECARGA_MODELOS=1 la aplicación se importa en el master (preload_app):
+crear_app() carga ahí los modelos de solo lectura y los workers los heredan
+con el fork, compartiendo esa memoria en lugar de cargar una copia cada uno.
+Los servicios con hilos, procesos o conexiones se crean en cada worker.
+"""
+import os
+
+preload_app = os.environ.get('PRECARGA_MODELOS', '0').lower() in ('1', 'si', 'true')
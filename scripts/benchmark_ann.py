@@ -0,0 +1,112 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.append(str(ROOT_DIR))
+
+import numpy as np
+
+from utils.config import MODELO_FACIAL, MODELO_FACIAL_BINARIO
+from core.reconocimiento.almacen import leer_xml, cargar_segmento, guardar_segmento
+from core.reconocimiento.comparador import ComparadorLBPH
+from core.reconocimiento.indice import IndiceIVF
+
+def variar(histograma, celdas, rng, ruido):
+    """Perturba un histograma LBPH y lo vuelve a normalizar por celda"""
+    variado = histograma * rng.gamma(1 / ruido, ruido, histograma.shape).astype(np.float32)
+    variado = variado.reshape(celdas, -1)
+    sumas = variado.sum(axis=1, keepdims=True)
+    return (variado / np.where(sumas > 0, sumas, 1)).ravel()
+
+def galeria_sintetica(reales, filas, por_estudiante, rng, ruido=0.3):
+    """
+    Escala la galería real creando estudiantes sintéticos
+
+    Cada estudiante es una mezcla de dos histogramas reales y cada una de sus
+    imágenes es una perturbación de esa mezcla (misma estructura por celda).
+    """
+    celdas = reales.parametros['grid_x'] * reales.parametros['grid_y']
+    base = np.asarray(reales.histogramas, dtype=np.float32)
+    estudiantes = max(1, filas // por_estudiante)
+    prototipos = np.empty((estudiantes, base.shape[1]), dtype=np.float32)
+    for i in range(estudiantes):
+        a, b = rng.integers(len(base), size=2)
+        peso = rng.uniform(0.3, 0.7)
+        prototipos[i] = peso * base[a] + (1 - peso) * base[b]
+
+    histogramas = np.empty((estudiantes * por_estudiante, base.shape[1]), dtype=np.float32)
+    etiquetas = np.repeat(np.arange(estudiantes, dtype=np.int32) + 100000, por_estudiante)
+    for fila in range(len(histogramas)):
+        histogramas[fila] = variar(prototipos[fila // por_estudiante], celdas, rng, ruido)
+    return histogramas, etiquetas, prototipos
+
+def percentil(tiempos, p):
+    return float(np.percentile(np.array(tiempos) * 1000, p))
+
+def main():
+    """Compara la búsqueda exacta con el índice IVF sobre una galería escalada"""
+    parser = argparse.ArgumentParser(description="Benchmark del índice facial aproximado")
+    parser.add_argument('--filas', type=int, default=20000)
+    parser.add_argument('--por-estudiante', type=int, default=10)
+    parser.add_argument('--consultas', type=int, default=50)
+    parser.add_argument('--dimensiones', type=int, default=64)
+    parser.add_argument('--sondas', default='1,4,8,16')
+    parser.add_argument('--candidatos', default='50,200,800')
+    parser.add_argument('--tipo', choices=['float32', 'uint16'], default='float32')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    reales = cargar_segmento(MODELO_FACIAL_BINARIO) if os.path.exists(MODELO_FACIAL_BINARIO) else leer_xml(MODELO_FACIAL)
+
+    print(f"Generando galería sintética de {args.filas} histogramas a partir de {reales.filas} reales...")
+    histogramas, etiquetas, prototipos = galeria_sintetica(reales, args.filas, args.por_estudiante, rng)
+    celdas = reales.parametros['grid_x'] * reales.parametros['grid_y']
+    objetivos = rng.integers(len(prototipos), size=args.consultas)
+    consultas = np.vstack([variar(prototipos[i], celdas, rng, 0.3) for i in objetivos])
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, 'galeria.lbph')
+        guardar_segmento(ruta, histogramas, etiquetas, reales.parametros, args.tipo)
+        del histogramas
+        segmento = cargar_segmento(ruta)
+        comparador = ComparadorLBPH([segmento])
+        comparador.distancias(consultas[0])
+
+        # Búsqueda exacta
+        tiempos = []
+        exactos = []
+        for consulta in consultas:
+            inicio = time.perf_counter()
+            exactos.append(comparador.por_estudiante(consulta, k=1)[0][0][0])
+            tiempos.append(time.perf_counter() - inicio)
+        aciertos = np.mean(np.array(exactos) == etiquetas[0] + objetivos)
+        print(f"\nExacta: p50 {percentil(tiempos, 50):.1f} ms, p95 {percentil(tiempos, 95):.1f} ms "
+              f"(acierto sobre el estudiante real: {aciertos:.0%})")
+
+        inicio = time.perf_counter()
+        indice = IndiceIVF(segmento).construir(dimensiones=args.dimensiones)
+        print(f"Construcción del índice: {time.perf_counter() - inicio:.1f} s "
+              f"({len(indice.centroides)} listas, {args.dimensiones} dimensiones)\n")
+
+        print(f"{'sondas':>6} {'cand.':>6} {'recall@1':>9} {'p50 ms':>8} {'p95 ms':>8}")
+        for sondas in [int(v) for v in args.sondas.split(',')]:
+            for candidatos in [int(v) for v in args.candidatos.split(',')]:
+                tiempos = []
+                coincidencias = 0
+                for consulta, exacto in zip(consultas, exactos):
+                    inicio = time.perf_counter()
+                    filas, distancias = indice.buscar(consulta, sondas=sondas, candidatos=candidatos)
+                    mejor = ComparadorLBPH.agrupar(np.asarray(segmento.etiquetas)[filas], distancias, k=1)
+                    tiempos.append(time.perf_counter() - inicio)
+                    coincidencias += bool(mejor) and mejor[0][0] == exacto
+                print(f"{sondas:>6} {candidatos:>6} {coincidencias / len(consultas):>9.0%} "
+                      f"{percentil(tiempos, 50):>8.2f} {percentil(tiempos, 95):>8.2f}")
+        del segmento, comparador, indice
+
+if __name__ == "__main__":
+    main()
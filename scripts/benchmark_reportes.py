@@ -0,0 +1,94 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import tracemalloc
+from pathlib import Path
+from datetime import datetime, timedelta
+
+# Agregar el directorio raíz al path
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.append(str(ROOT_DIR))
+
+from openpyxl import Workbook
+from openpyxl.styles import Font, PatternFill, Alignment
+
+from core.reportes.generador import ENCABEZADOS, escribir_excel_pertenencias
+
+def filas_sinteticas(cantidad):
+    """Filas con la forma de la consulta del reporte (un año de historial)"""
+    inicio = datetime(2025, 1, 1)
+    for i in range(cantidad):
+        entrada = inicio + timedelta(minutes=5 * i)
+        retirado = i % 20 != 0
+        yield (
+            i + 1,
+            f"2020{i % 3000:06d}",
+            ('laptop', 'mochila', 'celular', 'casco', 'tablet')[i % 5],
+            f"Objeto de prueba número {i}",
+            entrada,
+            entrada + timedelta(hours=3) if retirado else None,
+            'RETIRADO' if retirado else 'ENTREGADO'
+        )
+
+def escribir_en_memoria(filas, destino):
+    """Implementación anterior: libro completo, Alignment por celda y anchos en una segunda pasada"""
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Reporte de Pertenencias"
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+    for col, header in enumerate(ENCABEZADOS, 1):
+        cell = ws.cell(row=1, column=col, value=header)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = Alignment(horizontal='center')
+    total = 0
+    for row, r in enumerate(filas, 2):
+        ws.append(list(r))
+        for col in range(1, len(ENCABEZADOS) + 1):
+            ws.cell(row=row, column=col).alignment = Alignment(horizontal='center')
+        total += 1
+    for col in ws.columns:
+        max_length = max(len(str(cell.value)) for cell in col)
+        ws.column_dimensions[col[0].column_letter].width = max_length + 2
+    wb.save(destino)
+    return total
+
+def medir(nombre, escribir, cantidad, directorio):
+    """Ejecuta una implementación dos veces: una para el tiempo y otra para la memoria pico"""
+    ruta = os.path.join(directorio, f'{nombre}.xlsx')
+    inicio = time.perf_counter()
+    with open(ruta, 'wb') as destino:
+        escribir(filas_sinteticas(cantidad), destino)
+    segundos = time.perf_counter() - inicio
+
+    # tracemalloc hace más lenta la ejecución, por eso se mide aparte
+    tracemalloc.start()
+    with open(ruta, 'wb') as destino:
+        escribir(filas_sinteticas(cantidad), destino)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return segundos, pico / 1024 / 1024, os.path.getsize(ruta) / 1024 / 1024
+
+def main():
+    """Compara el reporte Excel en memoria con el de solo escritura"""
+    parser = argparse.ArgumentParser(description="Benchmark del reporte Excel de pertenencias")
+    parser.add_argument('--filas', type=int, default=100000)
+    parser.add_argument('--sin-anterior', action='store_true', help="Omitir la implementación en memoria")
+    args = parser.parse_args()
+
+    implementaciones = [('solo_escritura', escribir_excel_pertenencias)]
+    if not args.sin_anterior:
+        implementaciones.insert(0, ('en_memoria', escribir_en_memoria))
+
+    print(f"Reporte Excel de {args.filas} filas\n")
+    print(f"{'modo':>15} {'tiempo s':>9} {'pico MiB':>9} {'archivo MiB':>12}")
+    with tempfile.TemporaryDirectory() as directorio:
+        for nombre, escribir in implementaciones:
+            segundos, pico, tamano = medir(nombre, escribir, args.filas, directorio)
+            print(f"{nombre:>15} {segundos:>9.1f} {pico:>9.1f} {tamano:>12.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import os
+import sys
+import time
+import argparse
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.append(str(ROOT_DIR))
+
+import cv2
+
+from utils.config import MODELO_FACIAL, MODELO_FACIAL_BINARIO
+from core.reconocimiento.almacen import convertir_xml, cargar_segmento
+
+def medir(funcion, repeticiones=5):
+    """Devuelve el mejor tiempo en milisegundos de varias ejecuciones"""
+    mejor = float('inf')
+    resultado = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor * 1000, resultado
+
+def main():
+    """Convierte modeloEstudiantes.xml al formato binario y compara tiempos de carga"""
+    parser = argparse.ArgumentParser(description="Conversión del modelo facial a formato binario")
+    parser.add_argument('--xml', default=MODELO_FACIAL, help="Modelo LBPH de OpenCV")
+    parser.add_argument('--salida', default=MODELO_FACIAL_BINARIO, help="Archivo binario de salida")
+    parser.add_argument('--tipo', choices=['float32', 'uint16'], default='float32')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.xml):
+        print(f"No existe el modelo XML: {args.xml}")
+        return
+
+    inicio = time.perf_counter()
+    segmento = convertir_xml(args.xml, args.salida, args.tipo)
+    print(f"Convertidos {segmento.filas} histogramas en {(time.perf_counter() - inicio) * 1000:.1f} ms")
+    print(f"Tamaño XML:     {os.path.getsize(args.xml) / 1024:.1f} KiB")
+    print(f"Tamaño binario: {os.path.getsize(args.salida) / 1024:.1f} KiB ({args.tipo})")
+
+    if hasattr(cv2, 'face'):
+        def cargar_xml():
+            modelo = cv2.face.LBPHFaceRecognizer_create()
+            modelo.read(args.xml)
+            return modelo
+        ms, _ = medir(cargar_xml)
+        print(f"Carga XML (LBPHFaceRecognizer.read): {ms:.2f} ms")
+
+    ms, _ = medir(lambda: cargar_segmento(args.salida))
+    print(f"Carga binaria (mmap):                {ms:.3f} ms")
+    ms, _ = medir(lambda: cargar_segmento(args.salida, mmap=False))
+    print(f"Carga binaria (lectura completa):    {ms:.2f} ms")
+    ms, _ = medir(lambda: float(cargar_segmento(args.salida).bloque(0, segmento.filas).sum()))
+    print(f"mmap + recorrido completo:           {ms:.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.append(str(ROOT_DIR))
+
+import numpy as np
+
+from utils.config import MODELO_OBJETOS, MODELO_OBJETOS_ONNX, TAMANO_OBJETOS, CONFIANZA_OBJETO, IOU_OBJETO
+from core.objetos.motor_onnx import MotorONNX, ruta_metadatos
+
+def main():
+    """
+    Exporta ModelObjetoFinal.pt a ONNX para servirlo sin torch
+
+    Este script sí necesita ultralytics/torch; los workers que sirven el
+    modelo exportado no.
+    """
+    parser = argparse.ArgumentParser(description="Exportación del detector de objetos a ONNX")
+    parser.add_argument('--modelo', default=MODELO_OBJETOS, help="Modelo YOLO (.pt)")
+    parser.add_argument('--salida', default=MODELO_OBJETOS_ONNX, help="Archivo .onnx de salida")
+    parser.add_argument('--tamano', type=int, default=TAMANO_OBJETOS)
+    parser.add_argument('--opset', type=int, default=12)
+    parser.add_argument('--fijo', action='store_true', help="Lote fijo de 1 (sin eje dinámico)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.modelo):
+        print(f"No existe el modelo: {args.modelo}")
+        return
+
+    from ultralytics import YOLO
+
+    modelo = YOLO(args.modelo)
+    inicio = time.perf_counter()
+    exportado = modelo.export(
+        format='onnx', imgsz=args.tamano, opset=args.opset,
+        dynamic=not args.fijo, simplify=True, device='cpu'
+    )
+    if os.path.abspath(exportado) != os.path.abspath(args.salida):
+        shutil.move(exportado, args.salida)
+    with open(ruta_metadatos(args.salida), 'w', encoding='utf-8') as f:
+        json.dump({
+            'nombres': {int(k): v for k, v in modelo.names.items()},
+            'tamano': args.tamano,
+            'lote_dinamico': not args.fijo
+        }, f, ensure_ascii=False, indent=2)
+    print(f"Modelo exportado a {args.salida} en {time.perf_counter() - inicio:.1f} s "
+          f"({os.path.getsize(args.salida) / 1024 / 1024:.1f} MiB)")
+
+    # Verificación: misma imagen por ambos caminos
+    imagen = np.random.default_rng(0).integers(0, 256, (480, 640, 3), dtype=np.uint8)
+    motor = MotorONNX(args.salida, args.tamano)
+    detecciones, tiempos = motor.detectar([imagen], CONFIANZA_OBJETO, IOU_OBJETO)
+    cajas = detecciones[0][0]
+    referencia = modelo.predict(imagen, imgsz=args.tamano, conf=CONFIANZA_OBJETO, iou=IOU_OBJETO,
+                                device='cpu', verbose=False)[0]
+    print(f"Detecciones ONNX ({motor.backend}): {len(cajas)}, ultralytics: {len(referencia.boxes)}")
+    print(f"Inferencia ONNX: {tiempos['inferencia']:.1f} ms, "
+          f"ultralytics: {referencia.speed['inference']:.1f} ms")
+
+if __name__ == "__main__":
+    main()
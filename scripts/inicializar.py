@@ -15,6 +15,9 @@ from utils.config import (
     PERTENENCIAS_DIR
 )
 from utils.database import Database
+from utils.migraciones import migrar
+from core.almacenamiento.escritor import recuperar
+from core.almacenamiento.contenido import obtener_almacen
 
 def copiar_archivos_origen():
     """Copia archivos desde las carpetas originales"""
@@ -47,6 +50,17 @@ def inicializar_sistema():
     # Inicializar base de datos
     print("\nInicializando base de datos...")
     db = Database()
+    aplicadas = migrar(db)
+    print(f"✓ {len(aplicadas)} migraciones aplicadas")
+
+    # Imágenes de pertenencias pendientes de una caída anterior
+    print("\nVerificando imágenes de pertenencias...")
+    recuperacion = recuperar(PERTENENCIAS_DIR, db)
+    print(f"✓ {recuperacion['parciales']} escrituras incompletas borradas, "
+          f"{len(recuperacion['perdidas'])} pertenencias sin imagen")
+    for id_pertenencia, ruta in recuperacion['perdidas']:
+        print(f"  - pertenencia {id_pertenencia}: {ruta}")
+    print(f"✓ {obtener_almacen().recolectar(db)} imágenes sin referencias borradas")
     db.cerrar()
     
     print("\nSistema inicializado exitosamente!")
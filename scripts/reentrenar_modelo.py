@@ -0,0 +1,37 @@
+import sys
+import argparse
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.append(str(ROOT_DIR))
+
+from core.reconocimiento.facial import ReconocimientoFacial
+
+def main():
+    """Operaciones offline sobre el modelo facial"""
+    parser = argparse.ArgumentParser(description="Mantenimiento del modelo facial")
+    parser.add_argument(
+        '--consolidar',
+        action='store_true',
+        help="Solo guarda el modelo actual (base + delta) sin releer el dataset"
+    )
+    parser.add_argument(
+        '--indice',
+        action='store_true',
+        help="Solo construye el índice aproximado de la base actual, sin reentrenar"
+    )
+    args = parser.parse_args()
+
+    reconocedor = ReconocimientoFacial()
+    if args.consolidar:
+        print("Consolidando modelo facial...")
+        reconocedor.consolidar_modelo()
+    elif not args.indice:
+        print("Reentrenando modelo facial con todo el dataset...")
+        reconocedor.entrenar_modelo()
+    # La API solo carga el índice: se construye aquí para la base recién guardada
+    reconocedor.construir_indice()
+
+if __name__ == "__main__":
+    main()
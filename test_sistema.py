@@ -11,6 +11,7 @@ sys.path.append(str(ROOT_DIR))
 from core.reconocimiento.facial import ReconocimientoFacial
 from core.pertenencias.gestion import GestionPertenencias
 from utils.config import PERTENENCIAS_DIR
+from utils.migraciones import verificar_indices
 
 def test_reconocimiento_facial():
     """Prueba el módulo de reconocimiento facial"""
@@ -233,12 +234,49 @@ def test_gestion_pertenencias():
         else:
             print("\nOpción inválida")
 
+def test_indices():
+    """Verifica con EXPLAIN que las consultas frecuentes usan sus índices"""
+    print("\n=== Verificación de Índices ===")
+    gestor = GestionPertenencias()
+    
+    resultados = verificar_indices(gestor.db)
+    for descripcion, indice, usados, ok in resultados:
+        marca = "✓" if ok else "✗"
+        print(f"{marca} {descripcion}: esperado {indice}, usados {', '.join(usados) or 'ninguno'}")
+    
+    fallidas = [f"{descripcion} (esperado {indice}, usados {', '.join(usados) or 'ninguno'})"
+                for descripcion, indice, usados, ok in resultados if not ok]
+    assert not fallidas, f"{len(fallidas)} consulta(s) no usan el índice esperado: " + "; ".join(fallidas)
+    print("\nTodas las consultas frecuentes usan sus índices")
+
+def test_imagenes_condicionales():
+    """Verifica que las fotos responden 304 a una petición condicional en todos los tamaños"""
+    print("\n=== Caché HTTP de imágenes ===")
+    from app import app
+    from utils.config import DATASET_FACIAL, TAMANOS_DERIVADOS
+    
+    fotos = sorted(f for f in os.listdir(DATASET_FACIAL) if f.endswith('.jpg'))
+    assert fotos, f"No hay fotos en {DATASET_FACIAL}"
+    cliente = app.test_client()
+    for tamano in ['original', *TAMANOS_DERIVADOS]:
+        url = f"/ia/estudiantes/foto/{fotos[0]}?size={tamano}"
+        primera = cliente.get(url)
+        assert primera.status_code == 200, f"{tamano}: respuesta {primera.status_code}"
+        segunda = cliente.get(url, headers={
+            'If-None-Match': primera.headers['ETag'],
+            'If-Modified-Since': primera.headers['Last-Modified']
+        })
+        assert segunda.status_code == 304, f"{tamano}: respuesta condicional {segunda.status_code}"
+        print(f"✓ {tamano}: 304 con ETag {primera.headers['ETag']}")
+
 def main():
     while True:
         print("\n=== Sistema Intelliguard-IA ===")
         print("\n1. Reconocimiento Facial")
         print("2. Gestión de Pertenencias")
-        print("3. Salir")
+        print("3. Verificar índices de la base de datos")
+        print("4. Verificar caché HTTP de imágenes")
+        print("5. Salir")
         
         opcion = input("\nSeleccione una opción: ")
         
@@ -247,6 +285,16 @@ def main():
         elif opcion == "2":
             test_gestion_pertenencias()
         elif opcion == "3":
+            try:
+                test_indices()
+            except AssertionError as e:
+                print(f"\n{e}")
+        elif opcion == "4":
+            try:
+                test_imagenes_condicionales()
+            except AssertionError as e:
+                print(f"\n{e}")
+        elif opcion == "5":
             break
         else:
             print("\nOpción inválida")
@@ -6,8 +6,6 @@ from werkzeug.security import generate_password_hash, check_password_hash
 from .database import Database
 from .config import JWT_SECRET_KEY
 
-db = Database()
-
 def generar_token(admin_id):
     """Genera un token JWT para el administrador"""
     payload = {
@@ -52,6 +50,7 @@ def crear_admin_inicial(usuario, contraseña, nombre):
     """Crea el administrador inicial si no existe ninguno"""
     try:
         # Verificar si ya existe un admin
+        db = Database()
         cursor = db.ejecutar("SELECT COUNT(*) FROM administradores")
         if cursor and cursor.fetchone()[0] > 0:
             return False, "Ya existe un administrador"
@@ -72,7 +71,7 @@ def autenticar_admin(usuario, contraseña):
     """Autentica un administrador"""
     try:
         # Buscar admin
-        admin = db.obtener_uno(
+        admin = Database().obtener_uno(
             "SELECT id, contraseña FROM administradores WHERE usuario = %s",
             (usuario,)
         )
@@ -7,9 +7,6 @@ ROOT_DIR = Path(__file__).parent.parent
 # Directorio para almacenar imágenes de pertenencias
 PERTENENCIAS_DIR = os.path.join(ROOT_DIR, 'data', 'pertenencias')
 
-# Crear directorios si no existen
-os.makedirs(PERTENENCIAS_DIR, exist_ok=True)
-
 # Configuración de la API
 API_URL = 'http://localhost:5000'
 
@@ -17,8 +14,19 @@ API_URL = 'http://localhost:5000'
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 # Rutas de modelos
+# Modelo LBPH original de OpenCV (XML); solo se usa para convertirlo al formato binario
 MODELO_FACIAL = os.path.join(BASE_DIR, 'data', 'models', 'facial', 'modeloEstudiantes.xml')
+# Modelo facial binario mapeable en memoria (ver core/reconocimiento/almacen.py)
+MODELO_FACIAL_BINARIO = os.path.join(BASE_DIR, 'data', 'models', 'facial', 'modeloEstudiantes.lbph')
+# Histogramas agregados incrementalmente desde el último entrenamiento completo
+MODELO_FACIAL_DELTA = os.path.join(BASE_DIR, 'data', 'models', 'facial', 'modeloEstudiantes.delta.lbph')
+# Tipo de la matriz de histogramas: 'float32' (exacto) o 'uint16' (mitad de tamaño)
+MODELO_FACIAL_TIPO = os.environ.get('MODELO_FACIAL_TIPO', 'float32')
 MODELO_OBJETOS = os.path.join(BASE_DIR, 'data', 'models', 'objetos', 'ModelObjetoFinal.pt')
+# Detector exportado a ONNX (scripts/exportar_modelo_objetos.py), servido sin torch
+MODELO_OBJETOS_ONNX = os.path.join(BASE_DIR, 'data', 'models', 'objetos', 'ModelObjetoFinal.onnx')
+# Motor de inferencia de objetos: 'auto' (ONNX si existe), 'onnx' o 'ultralytics'
+MOTOR_OBJETOS = os.environ.get('MOTOR_OBJETOS', 'auto')
 
 # Rutas de datos
 DATASET_FACIAL = os.path.join(BASE_DIR, 'data', 'datasets', 'facial')
@@ -27,9 +35,123 @@ DATASET_OBJETOS = os.path.join(BASE_DIR, 'data', 'datasets', 'objetos')
 # Configuraciones de reconocimiento facial
 CONFIANZA_MINIMA = 0.5
 MAX_FOTOS = 10
+# Segundos entre lecturas de la tabla estudiantes para traer inscripciones de
+# otros workers al listado (core/estudiantes/registro.py)
+REGISTRO_REFRESCO = float(os.environ.get('REGISTRO_REFRESCO', 5))
+# Distancia entre histogramas ('chi2', 'l1', 'l2') y agregación por estudiante ('min', 'mean')
+METRICA_FACIAL = os.environ.get('METRICA_FACIAL', 'chi2')
+AGREGACION_FACIAL = os.environ.get('AGREGACION_FACIAL', 'min')
+# Distancia con la que la confianza llega a 0 en cada métrica: confianza =
+# 100 * (1 - distancia / máxima), y se acepta desde CONFIANZA_MINIMA. chi2
+# conserva la escala de siempre (100 - distancia); l1 y l2 están calibradas
+# para separar igual que chi2 las fotos de data/datasets/facial
+DISTANCIA_MAXIMA_FACIAL = {
+    'chi2': float(os.environ.get('DISTANCIA_MAXIMA_CHI2', 100)),
+    'l1': float(os.environ.get('DISTANCIA_MAXIMA_L1', 80)),
+    'l2': float(os.environ.get('DISTANCIA_MAXIMA_L2', 2))
+}
+
+# Índice aproximado (IVF) para galerías grandes: 'auto', 'si' o 'no'
+ANN_FACIAL = os.environ.get('ANN_FACIAL', 'auto')
+MODELO_FACIAL_INDICE = os.path.join(BASE_DIR, 'data', 'models', 'facial', 'modeloEstudiantes.ivf.npz')
+ANN_MIN_FILAS = int(os.environ.get('ANN_MIN_FILAS', 20000))
+ANN_DIMENSIONES = int(os.environ.get('ANN_DIMENSIONES', 64))
+# Compromiso recall/latencia: listas visitadas y filas re-ordenadas con chi-cuadrado exacto
+ANN_SONDAS = int(os.environ.get('ANN_SONDAS', 8))
+ANN_CANDIDATOS = int(os.environ.get('ANN_CANDIDATOS', 200))
+
+# Subida de imágenes: tamaño máximo por imagen y por petición completa
+MAX_IMAGEN_BYTES = int(os.environ.get('MAX_IMAGEN_BYTES', 10 * 1024 * 1024))
+MAX_CUERPO_BYTES = int(os.environ.get('MAX_CUERPO_BYTES', 64 * 1024 * 1024))
+
+# Verificación por lotes: hilos de decodificación/detección e imágenes máximas por petición
+HILOS_LOTE = int(os.environ.get('HILOS_LOTE', os.cpu_count() or 4))
+MAX_IMAGENES_LOTE = int(os.environ.get('MAX_IMAGENES_LOTE', 32))
+
+# Registro de pertenencias por lotes: ítems máximos por petición
+MAX_ITEMS_LOTE = int(os.environ.get('MAX_ITEMS_LOTE', 100))
+
+# Escritura de imágenes de pertenencias en segundo plano (core/almacenamiento/escritor.py):
+# hilos, escrituras en cola antes de escribir en la petición, política de fsync
+# ('siempre', 'lote', 'nunca'), archivos por fsync en 'lote' y calidad al recodificar no-JPEG
+ESCRITOR_HILOS = int(os.environ.get('ESCRITOR_HILOS', 2))
+ESCRITOR_COLA_MAXIMA = int(os.environ.get('ESCRITOR_COLA_MAXIMA', 256))
+ESCRITOR_FSYNC = os.environ.get('ESCRITOR_FSYNC', 'lote')
+ESCRITOR_FSYNC_LOTE = int(os.environ.get('ESCRITOR_FSYNC_LOTE', 32))
+CALIDAD_JPEG = int(os.environ.get('CALIDAD_JPEG', 95))
+# Segundos que una imagen sin pertenencias que la usen se conserva antes de
+# borrarla (core/almacenamiento/contenido.py)
+ALMACEN_GRACIA = int(os.environ.get('ALMACEN_GRACIA', 3600))
+
+# Consulta paginada de pertenencias: tamaño de página por defecto y máximo,
+# y filas por viaje al recorrer con cursor del servidor
+PAGINA_DEFECTO = int(os.environ.get('PAGINA_DEFECTO', 50))
+PAGINA_MAXIMA = int(os.environ.get('PAGINA_MAXIMA', 1000))
+LOTE_CURSOR = int(os.environ.get('LOTE_CURSOR', 2000))
+
+# Reportes: memoria máxima antes de pasar el archivo a disco, carpeta de los
+# reportes generados en segundo plano y cuántos se generan a la vez (por proceso)
+REPORTE_MEMORIA_MAXIMA = int(os.environ.get('REPORTE_MEMORIA_MAXIMA', 8 * 1024 * 1024))
+REPORTES_DIR = os.environ.get('REPORTES_DIR', os.path.join(BASE_DIR, 'data', 'reportes'))
+REPORTE_WORKERS = int(os.environ.get('REPORTE_WORKERS', 2))
+# Caché de reportes: segundos durante los que una petición idéntica reutiliza
+# el archivo, segundos tras los que se borra y bytes máximos en disco
+REPORTE_CACHE_TTL = float(os.environ.get('REPORTE_CACHE_TTL', 300))
+REPORTE_RETENCION = float(os.environ.get('REPORTE_RETENCION', 3600))
+REPORTE_CACHE_MAXIMO = int(os.environ.get('REPORTE_CACHE_MAXIMO', 500 * 1024 * 1024))
+# Segundos tras terminar durante los que un reporte no se borra por tamaño
+# (el cliente aún no lo ha descargado)
+REPORTE_RETENCION_MINIMA = float(os.environ.get('REPORTE_RETENCION_MINIMA', 300))
+# Segundos que una descarga directa espera al reporte antes de responder 202
+REPORTE_ESPERA = float(os.environ.get('REPORTE_ESPERA', 30))
+
+# Miniaturas y vistas previas de fotos (core/almacenamiento/derivados.py):
+# tamaños disponibles como nombre:lado máximo en píxeles, carpeta, bytes
+# máximos en disco y segundos de Cache-Control de las respuestas
+TAMANOS_DERIVADOS = {
+    nombre: int(lado)
+    for nombre, lado in (
+        par.split(':') for par in os.environ.get('TAMANOS_DERIVADOS', 'miniatura:128,vista:480').split(',')
+    )
+}
+DERIVADOS_DIR = os.environ.get('DERIVADOS_DIR', os.path.join(BASE_DIR, 'data', 'derivados'))
+DERIVADOS_MAXIMO = int(os.environ.get('DERIVADOS_MAXIMO', 200 * 1024 * 1024))
+IMAGENES_MAX_AGE = int(os.environ.get('IMAGENES_MAX_AGE', 300))
+
+# Días que abarca por defecto el tablero de horas pico
+ESTADISTICAS_DIAS = int(os.environ.get('ESTADISTICAS_DIAS', 30))
 
 # Configuraciones de detección de objetos
 CONFIANZA_OBJETO = 0.5
+# Umbral IoU de NMS y tamaño de entrada (imgsz de runs/detect/*/args.yaml)
+IOU_OBJETO = float(os.environ.get('IOU_OBJETO', 0.7))
+TAMANO_OBJETOS = int(os.environ.get('TAMANO_OBJETOS', 640))
+# Micro-lotes de detección: imágenes máximas por lote (1 = sin agrupar) y espera máxima
+LOTE_OBJETOS_MAXIMO = int(os.environ.get('LOTE_OBJETOS_MAXIMO', 8))
+LOTE_OBJETOS_ESPERA_MS = float(os.environ.get('LOTE_OBJETOS_ESPERA_MS', 5))
+# Imágenes esperando lote antes de responder 503 (contrapresión del proceso web)
+LOTE_OBJETOS_COLA_MAXIMA = int(os.environ.get('LOTE_OBJETOS_COLA_MAXIMA', 64))
+
+# Cargar los modelos de solo lectura al crear la aplicación; con gunicorn --preload
+# (gunicorn.conf.py) se cargan en el master y los workers los comparten tras el fork
+PRECARGA_MODELOS = os.environ.get('PRECARGA_MODELOS', '0').lower() in ('1', 'si', 'true')
+
+# Pool de procesos para inferencia (0 = en el hilo de la petición, como antes).
+# Con gunicorn cada worker web crea su propio pool: total = workers web x INFERENCIA_WORKERS
+INFERENCIA_WORKERS = int(os.environ.get('INFERENCIA_WORKERS', 0))
+INFERENCIA_HILOS_OPENCV = int(os.environ.get('INFERENCIA_HILOS_OPENCV', 1))
+# Tareas en curso máximas antes de responder 503
+INFERENCIA_COLA_MAXIMA = int(os.environ.get('INFERENCIA_COLA_MAXIMA', 16))
+INFERENCIA_TIMEOUT = float(os.environ.get('INFERENCIA_TIMEOUT', 30))
+# Segundos sugeridos al cliente en Retry-After
+INFERENCIA_REINTENTAR = int(os.environ.get('INFERENCIA_REINTENTAR', 1))
+
+# Pool de conexiones a PostgreSQL (por proceso) y espera máxima por una conexión libre
+DB_POOL_MIN = int(os.environ.get('DB_POOL_MIN', 1))
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', 10))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+# Las conexiones inactivas por más de estos segundos se verifican antes de usarse
+DB_VERIFICAR_SEGUNDOS = float(os.environ.get('DB_VERIFICAR_SEGUNDOS', 30))
 
 # Configuración de JWT
 JWT_SECRET_KEY = 'tu_clave_secreta_muy_segura'  # En producción, usar una clave segura y almacenarla en variables de entorno
@@ -47,7 +169,4 @@ def crear_directorios():
     for directorio in directorios:
         if not os.path.exists(directorio):
             os.makedirs(directorio)
-            print(f"Directorio creado: {directorio}")
-
-# Crear directorios al importar el módulo
-crear_directorios() 
\ No newline at end of file
+            print(f"Directorio creado: {directorio}") 
\ No newline at end of file
@@ -1,47 +1,382 @@
 import psycopg2
+import psycopg2.pool
+import psycopg2.extras
 import os
+import time
+import uuid
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from .config import DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT, DB_VERIFICAR_SEGUNDOS
+
+# Errores que indican que la conexión ya no sirve (se descarta y se reconecta)
+ERRORES_CONEXION = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+class Resultado:
+    """
+    Filas ya leídas de una consulta
+
+    ejecutar() devuelve la conexión al pool antes de retornar, así que en
+    lugar del cursor se devuelve este objeto con la misma interfaz de lectura
+    (fetchone, fetchall, rowcount, description).
+    """
+
+    def __init__(self, filas, rowcount, description):
+        self.filas = filas
+        self.posicion = 0
+        self.rowcount = rowcount
+        self.description = description
+
+    def fetchone(self):
+        if self.posicion >= len(self.filas):
+            return None
+        fila = self.filas[self.posicion]
+        self.posicion += 1
+        return fila
+
+    def fetchall(self):
+        filas = self.filas[self.posicion:]
+        self.posicion = len(self.filas)
+        return filas
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+# Sentencias preparables por nombre (ver registrar_sentencia)
+SENTENCIAS = {}
+
+def registrar_sentencia(nombre, sql):
+    """
+    Registra una consulta frecuente para ejecutarla como sentencia preparada
+
+    El SQL usa parámetros posicionales de PostgreSQL ($1, $2, ...). Cada
+    conexión la prepara (PREPARE) la primera vez que la usa; desde ahí cada
+    ejecución solo envía EXECUTE con los parámetros.
+    """
+    SENTENCIAS[nombre] = sql
+
+class Transaccion:
+    """Operaciones dentro de una transacción abierta con Database.transaccion()"""
+
+    def __init__(self, pool, conn, cursor):
+        self.pool = pool
+        self.conn = conn
+        self.cursor = cursor
+        # True desde que se envía el COMMIT: si la conexión se cae después no
+        # se sabe si la transacción se aplicó
+        self.confirmando = False
+
+    def _resultado(self):
+        filas = self.cursor.fetchall() if self.cursor.description else []
+        return Resultado(filas, self.cursor.rowcount, self.cursor.description)
+
+    def ejecutar(self, query, params=None):
+        """Ejecuta una consulta SQL (los errores se propagan y anulan la transacción)"""
+        if params:
+            self.cursor.execute(query, params)
+        else:
+            self.cursor.execute(query)
+        return self._resultado()
+
+    def ejecutar_valores(self, query, filas, plantilla=None):
+        """
+        Envía muchas filas en una sola sentencia (psycopg2 execute_values)
+
+        Args:
+            query: SQL con un único marcador VALUES %s (puede incluir RETURNING)
+            filas: Lista de tuplas
+            plantilla: Plantilla de cada fila, p. ej. '(%s, %s, now())'
+
+        Returns:
+            list: Filas devueltas por RETURNING (vacía si no hay)
+        """
+        if not filas:
+            return []
+        return psycopg2.extras.execute_values(
+            self.cursor, query, filas, template=plantilla, page_size=len(filas),
+            fetch='RETURNING' in query.upper()
+        ) or []
+
+    def preparada(self, nombre, params=()):
+        """Ejecuta una sentencia registrada con registrar_sentencia"""
+        if not self.pool.preparada(self.conn, nombre):
+            self.cursor.execute(f"PREPARE {nombre} AS {SENTENCIAS[nombre]}")
+            self.pool.marcar_preparada(self.conn, nombre)
+        if params:
+            self.cursor.execute(f"EXECUTE {nombre} ({', '.join(['%s'] * len(params))})", params)
+        else:
+            self.cursor.execute(f"EXECUTE {nombre}")
+        return self._resultado()
+
+def _percentil(ordenados, fraccion):
+    if not ordenados:
+        return 0
+    return round(ordenados[min(len(ordenados) - 1, int(fraccion * len(ordenados)))], 3)
+
+class PoolConexiones:
+    """
+    Pool de conexiones compartido por todas las instancias de Database del proceso
+
+    ThreadedConnectionPool falla de inmediato si no hay conexiones libres; aquí
+    un semáforo hace esperar hasta DB_POOL_TIMEOUT segundos y se mide esa espera.
+    Las conexiones que llevan más de DB_VERIFICAR_SEGUNDOS sin usarse se verifican
+    con SELECT 1 antes de entregarlas y se reemplazan si están caídas.
+    """
+
+    def __init__(self, minimo, maximo, timeout, verificar_segundos):
+        self.minimo = minimo
+        self.maximo = maximo
+        self.timeout = timeout
+        self.verificar_segundos = verificar_segundos
+        self.pool = psycopg2.pool.ThreadedConnectionPool(
+            minimo, maximo,
+            dbname=os.environ.get('PGDATABASE'),
+            user=os.environ.get('PGUSER'),
+            password=os.environ.get('PGPASSWORD'),
+            host=os.environ.get('PGHOST'),
+            port=os.environ.get('PGPORT')
+        )
+        self.cupos = threading.BoundedSemaphore(maximo)
+        self.lock = threading.Lock()
+        self.ultimo_uso = {}
+        # Sentencias ya preparadas en cada conexión
+        self.preparadas = {}
+        # Métricas
+        self.esperas = deque(maxlen=1000)
+        self.en_uso = 0
+        self.entregas = 0
+        self.agotados = 0
+        self.reconexiones = 0
+        self.descartadas = 0
+
+    def obtener(self):
+        """Toma una conexión sana del pool (espera si están todas en uso)"""
+        inicio = time.perf_counter()
+        if not self.cupos.acquire(timeout=self.timeout):
+            with self.lock:
+                self.agotados += 1
+            raise psycopg2.pool.PoolError(
+                f"No hay conexiones libres tras {self.timeout} s (máximo {self.maximo})"
+            )
+        try:
+            conn = self.pool.getconn()
+            if conn.closed or self._inactiva(conn) and not self._viva(conn):
+                conn = self._reemplazar(conn)
+        except Exception:
+            self.cupos.release()
+            raise
+
+        with self.lock:
+            self.esperas.append((time.perf_counter() - inicio) * 1000)
+            self.entregas += 1
+            self.en_uso += 1
+        return conn
+
+    def devolver(self, conn, descartar=False):
+        """Devuelve la conexión al pool (descartar=True la cierra)"""
+        try:
+            descartar = descartar or bool(conn.closed)
+            with self.lock:
+                self.en_uso -= 1
+                if descartar:
+                    self.descartadas += 1
+                    self.ultimo_uso.pop(id(conn), None)
+                    self.preparadas.pop(id(conn), None)
+                else:
+                    self.ultimo_uso[id(conn)] = time.monotonic()
+            self.pool.putconn(conn, close=descartar)
+        finally:
+            self.cupos.release()
+
+    def _inactiva(self, conn):
+        with self.lock:
+            ultimo = self.ultimo_uso.get(id(conn))
+        return ultimo is None or time.monotonic() - ultimo > self.verificar_segundos
+
+    def _viva(self, conn):
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except ERRORES_CONEXION:
+            return False
+
+    def _reemplazar(self, conn):
+        """Cierra una conexión caída y abre otra en su lugar"""
+        with self.lock:
+            self.ultimo_uso.pop(id(conn), None)
+            self.preparadas.pop(id(conn), None)
+            self.reconexiones += 1
+        self.pool.putconn(conn, close=True)
+        print("Conexión a base de datos caída, reconectando...")
+        return self.pool.getconn()
+
+    def preparada(self, conn, nombre):
+        with self.lock:
+            return nombre in self.preparadas.get(id(conn), ())
+
+    def marcar_preparada(self, conn, nombre):
+        with self.lock:
+            self.preparadas.setdefault(id(conn), set()).add(nombre)
+
+    def metricas(self):
+        """Espera por conexión (ms, últimas muestras) y contadores del pool"""
+        with self.lock:
+            esperas = sorted(self.esperas)
+            en_uso, entregas = self.en_uso, self.entregas
+            agotados, reconexiones, descartadas = self.agotados, self.reconexiones, self.descartadas
+        return {
+            'minimo': self.minimo,
+            'maximo': self.maximo,
+            'en_uso': en_uso,
+            'entregas': entregas,
+            'agotados': agotados,
+            'reconexiones': reconexiones,
+            'descartadas': descartadas,
+            'espera_ms': {
+                'p50': _percentil(esperas, 0.5),
+                'p95': _percentil(esperas, 0.95),
+                'max': _percentil(esperas, 1)
+            }
+        }
+
+    def cerrar(self):
+        self.pool.closeall()
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def obtener_pool():
+    """Pool del proceso, creado al primer uso (y de nuevo tras un fork)"""
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = PoolConexiones(DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT, DB_VERIFICAR_SEGUNDOS)
+                _pool_pid = os.getpid()
+                print("Pool de conexiones a PostgreSQL establecido")
+    return _pool
 
 class Database:
     def __init__(self):
-        self.conn = None
-        self.cursor = None
-        self.conectar()
-        # Ya no creamos tablas aquí, se asume que están creadas en PostgreSQL
+        # Las conexiones se toman del pool compartido del proceso en cada
+        # operación; el pool se crea en la primera (crear un Database no conecta)
+        pass
 
     def conectar(self):
         """Establece conexión con la base de datos PostgreSQL"""
         try:
-            self.conn = psycopg2.connect(
-                dbname=os.environ.get('PGDATABASE'),
-                user=os.environ.get('PGUSER'),
-                password=os.environ.get('PGPASSWORD'),
-                host=os.environ.get('PGHOST'),
-                port=os.environ.get('PGPORT')
-            )
-            self.cursor = self.conn.cursor()
-            print("Conexión a base de datos PostgreSQL establecida")
+            obtener_pool()
         except Exception as e:
             print(f"Error al conectar a la base de datos: {str(e)}")
 
     def cerrar(self):
-        """Cierra la conexión a la base de datos"""
-        if self.conn:
-            self.conn.close()
-            print("Conexión a base de datos cerrada")
+        """Cierra las conexiones del pool"""
+        global _pool
+        with _pool_lock:
+            if _pool is not None and _pool_pid == os.getpid():
+                _pool.cerrar()
+                _pool = None
+                print("Conexión a base de datos cerrada")
 
-    def ejecutar(self, query, params=None):
-        """Ejecuta una consulta SQL"""
+    @contextmanager
+    def conexion(self):
+        """
+        Conexión del pool para varias operaciones
+
+        Se devuelve al pool al salir; si falló por un error de conexión se descarta.
+        """
+        pool = obtener_pool()
+        conn = pool.obtener()
+        descartar = False
+        try:
+            yield conn
+        except ERRORES_CONEXION:
+            descartar = True
+            raise
+        finally:
+            if not descartar and not conn.closed:
+                try:
+                    conn.rollback()
+                except ERRORES_CONEXION:
+                    descartar = True
+            pool.devolver(conn, descartar)
+
+    @contextmanager
+    def cursor(self):
+        """
+        Cursor propio de una operación: commit al salir, rollback si hay excepción
+
+        Uso:
+            with db.cursor() as cursor:
+                cursor.execute(...)
+        """
+        with self.conexion() as conn:
+            with conn.cursor() as cursor:
+                yield cursor
+            conn.commit()
+
+    @contextmanager
+    def cursor_servidor(self, tamano_lote=1000):
+        """
+        Cursor con nombre (del lado del servidor) para recorrer resultados grandes
+
+        Las filas llegan en lotes de tamano_lote a medida que se itera, así que
+        la memoria no crece con el tamaño del resultado. La conexión queda
+        ocupada hasta salir del bloque.
+        """
+        with self.conexion() as conn:
+            with conn.cursor(name=f"cursor_{uuid.uuid4().hex}") as cursor:
+                cursor.itersize = tamano_lote
+                yield cursor
+
+    @contextmanager
+    def transaccion(self):
+        """
+        Varias operaciones en una sola transacción (un solo commit)
+
+        Uso:
+            with db.transaccion() as t:
+                t.ejecutar(...)
+                t.preparada('nombre', (parametro,))
+        """
+        with self.conexion() as conn:
+            with conn.cursor() as cursor:
+                transaccion = Transaccion(obtener_pool(), conn, cursor)
+                yield transaccion
+            transaccion.confirmando = True
+            conn.commit()
+
+    def _con_reintento(self, operacion):
         try:
-            if params:
-                self.cursor.execute(query, params)
-            else:
-                self.cursor.execute(query)
-            self.conn.commit()
-            return self.cursor
+            transaccion = None
+            try:
+                with self.transaccion() as t:
+                    transaccion = t
+                    return operacion(t)
+            except ERRORES_CONEXION as e:
+                if transaccion is not None and transaccion.confirmando:
+                    # El COMMIT pudo aplicarse: reintentar duplicaría la escritura
+                    raise
+                # La conexión se cayó antes del commit: se reintenta una vez con otra
+                print(f"Error de conexión ({str(e).strip()}), reintentando...")
+                with self.transaccion() as t:
+                    return operacion(t)
         except Exception as e:
             print(f"Error al ejecutar consulta: {str(e)}")
             return None
 
+    def ejecutar(self, query, params=None):
+        """Ejecuta una consulta SQL"""
+        return self._con_reintento(lambda t: t.ejecutar(query, params))
+
+    def ejecutar_preparada(self, nombre, params=()):
+        """Ejecuta una sentencia registrada con registrar_sentencia (None si hay error)"""
+        return self._con_reintento(lambda t: t.preparada(nombre, params))
+
     def obtener_uno(self, query, params=None):
         """Obtiene un solo resultado"""
         cursor = self.ejecutar(query, params)
@@ -54,4 +389,8 @@ class Database:
         cursor = self.ejecutar(query, params)
         if cursor:
             return cursor.fetchall()
-        return [] 
\ No newline at end of file
+        return []
+
+    def metricas(self):
+        """Métricas del pool de conexiones"""
+        return obtener_pool().metricas()
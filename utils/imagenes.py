@@ -0,0 +1,154 @@
+import base64
+import binascii
+
+import cv2
+import numpy as np
+from flask import request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from .config import MAX_IMAGEN_BYTES
+
+# Bytes por lectura cuando el cliente no envía Content-Length (transferencia por partes)
+BLOQUE_LECTURA = 64 * 1024
+
+class ErrorImagen(Exception):
+    """Imagen ausente, inválida o demasiado grande; `codigo` es el estado HTTP"""
+
+    def __init__(self, mensaje, codigo=400):
+        super().__init__(mensaje)
+        self.codigo = codigo
+
+def _demasiado_grande(limite):
+    return ErrorImagen(f'La imagen supera el máximo de {limite / (1024 * 1024):.1f} MiB', 413)
+
+def leer_flujo(flujo, limite=MAX_IMAGEN_BYTES, tamano=None):
+    """
+    Lee un flujo binario a un bytearray, sin copias intermedias
+
+    Con el tamaño conocido se reserva el buffer una vez y se llena con
+    readinto; si no, se lee por bloques hasta `limite`.
+
+    Returns:
+        bytearray: Contenido del flujo
+    """
+    if tamano is not None:
+        if tamano > limite:
+            raise _demasiado_grande(limite)
+        buffer = bytearray(tamano)
+        vista = memoryview(buffer)
+        leidos = 0
+        while leidos < tamano:
+            n = flujo.readinto(vista[leidos:])
+            if not n:
+                raise ErrorImagen('Cuerpo de la petición incompleto')
+            leidos += n
+        return buffer
+
+    buffer = bytearray()
+    while True:
+        bloque = flujo.read(BLOQUE_LECTURA)
+        if not bloque:
+            return buffer
+        buffer += bloque
+        if len(buffer) > limite:
+            raise _demasiado_grande(limite)
+
+def _leer_archivo(archivo, limite):
+    """Parte de un multipart (FileStorage) a bytearray"""
+    flujo = archivo.stream
+    flujo.seek(0, 2)
+    tamano = flujo.tell()
+    flujo.seek(0)
+    return leer_flujo(flujo, limite, tamano)
+
+def decodificar_base64(texto, limite=MAX_IMAGEN_BYTES):
+    """Base64, con o sin prefijo data:image/...;base64, a bytes (comprobando el tamaño antes)"""
+    if not isinstance(texto, str):
+        raise ErrorImagen('La imagen debe ser un texto base64')
+    texto = texto.split(',')[-1]
+    if len(texto) * 3 // 4 > limite:
+        raise _demasiado_grande(limite)
+    try:
+        return base64.b64decode(texto)
+    except (binascii.Error, ValueError):
+        raise ErrorImagen('Imagen base64 inválida')
+
+def es_binaria():
+    """Si la petición trae la imagen como cuerpo binario (application/octet-stream o image/*)"""
+    return request.mimetype == 'application/octet-stream' or request.mimetype.startswith('image/')
+
+def datos_peticion():
+    """
+    Campos de texto de la petición según cómo se envió la imagen
+
+    multipart: campos del formulario; binaria: parámetros de la URL; JSON: el body
+    """
+    try:
+        if request.mimetype == 'multipart/form-data':
+            return request.form
+        if es_binaria():
+            return request.args
+        datos = request.get_json(silent=True)
+    except RequestEntityTooLarge:
+        raise ErrorImagen('La petición supera el tamaño máximo', 413)
+    if datos is None:
+        return {}
+    if not isinstance(datos, dict):
+        raise ErrorImagen('El cuerpo JSON debe ser un objeto')
+    return datos
+
+def leer_imagen(campo='imagen', limite=MAX_IMAGEN_BYTES):
+    """
+    Bytes de la imagen de la petición, en cualquiera de los formatos aceptados:
+
+    - cuerpo binario (application/octet-stream o image/jpeg, image/png...)
+    - multipart/form-data con la imagen en la parte `campo`
+    - JSON con la imagen en base64 en `campo` (compatibilidad)
+
+    Returns:
+        bytearray | bytes: Imagen sin decodificar, o None si no viene
+
+    Raises:
+        ErrorImagen: Si es demasiado grande (413) o el base64 no es válido (400)
+    """
+    try:
+        if es_binaria():
+            buffer = leer_flujo(request.stream, limite, request.content_length)
+            return buffer or None
+        if request.mimetype == 'multipart/form-data':
+            archivo = request.files.get(campo)
+            return _leer_archivo(archivo, limite) if archivo else None
+    except RequestEntityTooLarge:
+        raise ErrorImagen('La petición supera el tamaño máximo', 413)
+    texto = datos_peticion().get(campo)
+    return decodificar_base64(texto, limite) if texto else None
+
+def leer_imagenes(campo='imagenes', limite=MAX_IMAGEN_BYTES):
+    """
+    Lista de imágenes sin decodificar: partes multipart `campo` (repetidas)
+    o lista base64 en el JSON
+
+    Returns:
+        list: bytearray o bytes por imagen, en el orden recibido
+    """
+    try:
+        if request.mimetype == 'multipart/form-data':
+            return [_leer_archivo(archivo, limite) for archivo in request.files.getlist(campo)]
+    except RequestEntityTooLarge:
+        raise ErrorImagen('La petición supera el tamaño máximo', 413)
+    textos = datos_peticion().get(campo) or []
+    if not isinstance(textos, list):
+        raise ErrorImagen(f'`{campo}` debe ser una lista de imágenes base64')
+    return [decodificar_base64(texto, limite) for texto in textos]
+
+def decodificar_imagen(buffer, flags=cv2.IMREAD_COLOR):
+    """
+    Decodifica JPEG/PNG con OpenCV; np.frombuffer solo envuelve el buffer, sin copiarlo
+
+    Raises:
+        ErrorImagen: Si no es una imagen válida
+    """
+    imagen = cv2.imdecode(np.frombuffer(buffer, np.uint8), flags) if buffer else None
+    if imagen is None:
+        raise ErrorImagen('Imagen inválida')
+    return imagen
@@ -0,0 +1,305 @@
+import json
+
+# Llave del bloqueo consultivo que serializa las migraciones entre workers
+LLAVE_BLOQUEO = 7305140
+
+# Migraciones versionadas: (versión, nombre, SQL). Nunca se editan una vez
+# publicadas; los cambios de esquema se agregan al final con una versión nueva.
+MIGRACIONES = [
+    (1, 'crear_pertenencias', '''
+        CREATE TABLE IF NOT EXISTS pertenencias (
+            id SERIAL PRIMARY KEY,
+            codigo_estudiante TEXT NOT NULL,
+            tipo_objeto TEXT NOT NULL,
+            descripcion TEXT,
+            ruta_imagen TEXT NOT NULL,
+            fecha_entrada TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            fecha_salida TIMESTAMP,
+            estado TEXT DEFAULT 'entrada'
+        )
+    '''),
+    (2, 'indices_pertenencias', '''
+        -- Consulta por estudiante ordenada por fecha (consultar/obtener_pertenencias)
+        CREATE INDEX IF NOT EXISTS idx_pertenencias_estudiante_fecha
+            ON pertenencias (codigo_estudiante, fecha_entrada DESC, id DESC);
+        -- Filtro UPPER(estado) de obtener_pertenencias
+        CREATE INDEX IF NOT EXISTS idx_pertenencias_estado_fecha
+            ON pertenencias (UPPER(estado), fecha_entrada DESC, id DESC);
+        -- Listado completo ordenado por fecha
+        CREATE INDEX IF NOT EXISTS idx_pertenencias_fecha
+            ON pertenencias (fecha_entrada DESC, id DESC);
+        -- Objetos actualmente en custodia (registrar_salida y salidas por lote)
+        CREATE INDEX IF NOT EXISTS idx_pertenencias_entregadas
+            ON pertenencias (codigo_estudiante, tipo_objeto, fecha_entrada)
+            WHERE estado = 'ENTREGADO';
+        ANALYZE pertenencias;
+    '''),
+    (3, 'estadisticas_pertenencias', '''
+        -- Agregados mantenidos por triggers: los tableros no recorren el historial.
+        -- Una pertenencia está en custodia mientras no tenga fecha de salida
+        CREATE TABLE IF NOT EXISTS estadisticas_objetos (
+            tipo_objeto TEXT PRIMARY KEY,
+            entradas BIGINT NOT NULL DEFAULT 0,
+            salidas BIGINT NOT NULL DEFAULT 0,
+            en_custodia BIGINT NOT NULL DEFAULT 0,
+            permanencia_segundos NUMERIC NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS estadisticas_horas (
+            dia DATE NOT NULL,
+            hora SMALLINT NOT NULL,
+            entradas BIGINT NOT NULL DEFAULT 0,
+            salidas BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (dia, hora)
+        );
+
+        -- Suma (signo 1) o resta (signo -1) el aporte de un conjunto de filas.
+        -- Los triggers son por sentencia: cada una agrega sus filas (tablas de
+        -- transición) y aplica un UPSERT por tipo y por hora en orden de llave,
+        -- así dos lotes con los tipos en distinto orden no se bloquean entre sí
+        CREATE OR REPLACE FUNCTION estadisticas_aplicar_filas(
+            p_tipos TEXT[], p_entradas TIMESTAMP[], p_salidas TIMESTAMP[], p_signos INTEGER[]
+        ) RETURNS VOID AS $$
+        BEGIN
+            INSERT INTO estadisticas_objetos AS e
+                (tipo_objeto, entradas, salidas, en_custodia, permanencia_segundos)
+            SELECT tipo, entradas, salidas, en_custodia, permanencia FROM (
+                SELECT tipo,
+                       SUM(signo) AS entradas,
+                       SUM(CASE WHEN salida IS NULL THEN 0 ELSE signo END) AS salidas,
+                       SUM(CASE WHEN salida IS NULL THEN signo ELSE 0 END) AS en_custodia,
+                       SUM(COALESCE(EXTRACT(EPOCH FROM salida - entrada), 0) * signo) AS permanencia
+                FROM unnest(p_tipos, p_entradas, p_salidas, p_signos) AS f(tipo, entrada, salida, signo)
+                GROUP BY tipo
+            ) d
+            -- Un UPDATE que no cambia tipo ni fechas se anula y no toca la fila
+            WHERE entradas <> 0 OR salidas <> 0 OR en_custodia <> 0 OR permanencia <> 0
+            ORDER BY tipo
+            ON CONFLICT (tipo_objeto) DO UPDATE SET
+                entradas = e.entradas + EXCLUDED.entradas,
+                salidas = e.salidas + EXCLUDED.salidas,
+                en_custodia = e.en_custodia + EXCLUDED.en_custodia,
+                permanencia_segundos = e.permanencia_segundos + EXCLUDED.permanencia_segundos;
+
+            INSERT INTO estadisticas_horas AS h (dia, hora, entradas, salidas)
+            SELECT dia, hora, entradas, salidas FROM (
+                SELECT dia, hora, SUM(entradas) AS entradas, SUM(salidas) AS salidas FROM (
+                    SELECT entrada::date AS dia, EXTRACT(HOUR FROM entrada) AS hora,
+                           signo AS entradas, 0 AS salidas
+                    FROM unnest(p_entradas, p_signos) AS f(entrada, signo) WHERE entrada IS NOT NULL
+                    UNION ALL
+                    SELECT salida::date, EXTRACT(HOUR FROM salida), 0, signo
+                    FROM unnest(p_salidas, p_signos) AS f(salida, signo) WHERE salida IS NOT NULL
+                ) eventos GROUP BY dia, hora
+            ) d
+            WHERE entradas <> 0 OR salidas <> 0
+            ORDER BY dia, hora
+            ON CONFLICT (dia, hora) DO UPDATE SET
+                entradas = h.entradas + EXCLUDED.entradas,
+                salidas = h.salidas + EXCLUDED.salidas;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION estadisticas_pertenencias_sentencia() RETURNS TRIGGER AS $$
+        DECLARE
+            v_tipos TEXT[];
+            v_entradas TIMESTAMP[];
+            v_salidas TIMESTAMP[];
+            v_signos INTEGER[];
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                SELECT array_agg(tipo_objeto), array_agg(fecha_entrada), array_agg(fecha_salida), array_agg(1)
+                INTO v_tipos, v_entradas, v_salidas, v_signos
+                FROM nuevas;
+            ELSIF TG_OP = 'DELETE' THEN
+                SELECT array_agg(tipo_objeto), array_agg(fecha_entrada), array_agg(fecha_salida), array_agg(-1)
+                INTO v_tipos, v_entradas, v_salidas, v_signos
+                FROM viejas;
+            ELSE
+                SELECT array_agg(tipo_objeto), array_agg(fecha_entrada), array_agg(fecha_salida), array_agg(signo)
+                INTO v_tipos, v_entradas, v_salidas, v_signos
+                FROM (
+                    SELECT tipo_objeto, fecha_entrada, fecha_salida, -1 AS signo FROM viejas
+                    UNION ALL
+                    SELECT tipo_objeto, fecha_entrada, fecha_salida, 1 FROM nuevas
+                ) filas;
+            END IF;
+            IF v_tipos IS NOT NULL THEN
+                PERFORM estadisticas_aplicar_filas(v_tipos, v_entradas, v_salidas, v_signos);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        -- Recalcula los agregados desde pertenencias (carga inicial y reparación)
+        CREATE OR REPLACE FUNCTION recalcular_estadisticas_pertenencias() RETURNS VOID AS $$
+        BEGIN
+            DELETE FROM estadisticas_objetos;
+            DELETE FROM estadisticas_horas;
+            INSERT INTO estadisticas_objetos (tipo_objeto, entradas, salidas, en_custodia, permanencia_segundos)
+            SELECT tipo_objeto, COUNT(*), COUNT(fecha_salida), COUNT(*) - COUNT(fecha_salida),
+                   COALESCE(SUM(EXTRACT(EPOCH FROM fecha_salida - fecha_entrada)), 0)
+            FROM pertenencias GROUP BY tipo_objeto;
+            INSERT INTO estadisticas_horas (dia, hora, entradas, salidas)
+            SELECT dia, hora, SUM(entradas), SUM(salidas) FROM (
+                SELECT fecha_entrada::date AS dia, EXTRACT(HOUR FROM fecha_entrada) AS hora,
+                       1 AS entradas, 0 AS salidas
+                FROM pertenencias WHERE fecha_entrada IS NOT NULL
+                UNION ALL
+                SELECT fecha_salida::date, EXTRACT(HOUR FROM fecha_salida), 0, 1
+                FROM pertenencias WHERE fecha_salida IS NOT NULL
+            ) eventos GROUP BY dia, hora;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION estadisticas_pertenencias_vaciar() RETURNS TRIGGER AS $$
+        BEGIN
+            DELETE FROM estadisticas_objetos;
+            DELETE FROM estadisticas_horas;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        -- Sin escrituras concurrentes mientras se crean los triggers y se cargan los agregados
+        LOCK TABLE pertenencias IN SHARE ROW EXCLUSIVE MODE;
+        -- Una tabla de transición admite un solo evento por trigger
+        DROP TRIGGER IF EXISTS estadisticas_insertar ON pertenencias;
+        CREATE TRIGGER estadisticas_insertar
+            AFTER INSERT ON pertenencias
+            REFERENCING NEW TABLE AS nuevas
+            FOR EACH STATEMENT EXECUTE FUNCTION estadisticas_pertenencias_sentencia();
+        DROP TRIGGER IF EXISTS estadisticas_borrar ON pertenencias;
+        CREATE TRIGGER estadisticas_borrar
+            AFTER DELETE ON pertenencias
+            REFERENCING OLD TABLE AS viejas
+            FOR EACH STATEMENT EXECUTE FUNCTION estadisticas_pertenencias_sentencia();
+        DROP TRIGGER IF EXISTS estadisticas_actualizar ON pertenencias;
+        CREATE TRIGGER estadisticas_actualizar
+            AFTER UPDATE ON pertenencias
+            REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+            FOR EACH STATEMENT EXECUTE FUNCTION estadisticas_pertenencias_sentencia();
+        DROP TRIGGER IF EXISTS estadisticas_vaciar ON pertenencias;
+        CREATE TRIGGER estadisticas_vaciar
+            AFTER TRUNCATE ON pertenencias
+            FOR EACH STATEMENT EXECUTE FUNCTION estadisticas_pertenencias_vaciar();
+        SELECT recalcular_estadisticas_pertenencias();
+    '''),
+    (4, 'indice_ruta_imagen', '''
+        -- Referencias a cada imagen del almacén por contenido (core/almacenamiento/contenido.py)
+        CREATE INDEX IF NOT EXISTS idx_pertenencias_ruta_imagen
+            ON pertenencias (ruta_imagen);
+    '''),
+    (5, 'registro_estudiantes', '''
+        -- Estudiantes inscritos y sus fotos en DATASET_FACIAL (core/estudiantes/registro.py).
+        -- La tabla puede existir de antes solo con el código: se completan las columnas
+        CREATE TABLE IF NOT EXISTS estudiantes (
+            codigo_estudiante TEXT PRIMARY KEY
+        );
+        ALTER TABLE estudiantes
+            ADD COLUMN IF NOT EXISTS fotos TEXT[] NOT NULL DEFAULT '{}',
+            ADD COLUMN IF NOT EXISTS fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            ADD COLUMN IF NOT EXISTS actualizado TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP;
+        -- Sincronización entre workers: filas modificadas desde la última lectura
+        CREATE INDEX IF NOT EXISTS idx_estudiantes_actualizado
+            ON estudiantes (actualizado);
+    '''),
+]
+
+# Consultas frecuentes y el índice que deben usar: (descripción, sentencia
+# preparada o SQL, parámetros, índice esperado). Los parámetros corresponden
+# a los datos sintéticos que inserta verificar_indices
+CONSULTAS_FRECUENTES = [
+    ('Pertenencias de un estudiante', 'pertenencias_estudiante', ('verificacion_7',),
+     'idx_pertenencias_estudiante_fecha'),
+    ('Salida de una pertenencia', 'pertenencia_salida', ('verificacion_7', 'objeto_2'),
+     'idx_pertenencias_entregadas'),
+    ('Filtro por estado',
+     'SELECT id FROM pertenencias WHERE UPPER(estado) = %s ORDER BY fecha_entrada DESC', ('ENTREGADO',),
+     'idx_pertenencias_estado_fecha'),
+    ('Listado por fecha',
+     'SELECT id FROM pertenencias ORDER BY fecha_entrada DESC LIMIT 50', (),
+     'idx_pertenencias_fecha'),
+    ('Referencias a una imagen',
+     'SELECT COUNT(*) FROM pertenencias WHERE ruta_imagen IN (%s, %s)',
+     ('objetos/00/00/0000.jpg', '/datos/pertenencias/objetos/00/00/0000.jpg'),
+     'idx_pertenencias_ruta_imagen'),
+]
+
+def migrar(db):
+    """
+    Aplica las migraciones pendientes en una sola transacción
+
+    Un bloqueo consultivo evita que varios workers migren a la vez; la tabla
+    esquema_migraciones registra las versiones ya aplicadas.
+
+    Returns:
+        list: Nombres de las migraciones aplicadas en esta llamada
+    """
+    aplicadas = []
+    with db.transaccion() as t:
+        t.ejecutar('SELECT pg_advisory_xact_lock(%s)', (LLAVE_BLOQUEO,))
+        t.ejecutar('''
+            CREATE TABLE IF NOT EXISTS esquema_migraciones (
+                version INTEGER PRIMARY KEY,
+                nombre TEXT NOT NULL,
+                aplicada TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        existentes = {fila[0] for fila in t.ejecutar('SELECT version FROM esquema_migraciones').fetchall()}
+        for version, nombre, sql in MIGRACIONES:
+            if version in existentes:
+                continue
+            t.ejecutar(sql)
+            t.ejecutar('INSERT INTO esquema_migraciones (version, nombre) VALUES (%s, %s)', (version, nombre))
+            aplicadas.append(nombre)
+    for nombre in aplicadas:
+        print(f"Migración aplicada: {nombre}")
+    return aplicadas
+
+def _indices_del_plan(nodo):
+    """Nombres de los índices usados en un plan de EXPLAIN (FORMAT JSON)"""
+    indices = {nodo['Index Name']} if 'Index Name' in nodo else set()
+    for hijo in nodo.get('Plans', []):
+        indices |= _indices_del_plan(hijo)
+    return indices
+
+def verificar_indices(db, filas=50000):
+    """
+    Comprueba con EXPLAIN que las consultas frecuentes usan sus índices
+
+    Dentro de una transacción que luego se descarta inserta `filas` filas
+    sintéticas (un año de historial, 1000 estudiantes, ~5% en custodia) y
+    actualiza las estadísticas, para que el planificador decida como con una
+    tabla real. Las sentencias preparadas se planifican con plan genérico,
+    como quedan tras varias ejecuciones.
+
+    Returns:
+        list: Por consulta, (descripción, índice esperado, índices usados, ok)
+    """
+    from utils.database import SENTENCIAS
+
+    resultados = []
+    with db.transaccion() as t:
+        t.ejecutar('''
+            INSERT INTO pertenencias (codigo_estudiante, tipo_objeto, ruta_imagen, fecha_entrada, estado)
+            SELECT 'verificacion_' || (g %% 1000), 'objeto_' || (g %% 7), '',
+                   CURRENT_TIMESTAMP - (g * INTERVAL '10 minutes'),
+                   CASE WHEN g %% 20 = 0 THEN 'ENTREGADO' ELSE 'RETIRADO' END
+            FROM generate_series(1, %s) AS g
+        ''', (filas,))
+        t.ejecutar('ANALYZE pertenencias')
+        t.ejecutar('SET LOCAL plan_cache_mode = force_generic_plan')
+        for i, (descripcion, consulta, params, indice) in enumerate(CONSULTAS_FRECUENTES):
+            if consulta in SENTENCIAS:
+                t.ejecutar(f'PREPARE verificar_{i} AS {SENTENCIAS[consulta]}')
+                marcadores = ', '.join(['%s'] * len(params))
+                plan = t.ejecutar(f'EXPLAIN (FORMAT JSON) EXECUTE verificar_{i} ({marcadores})', params).fetchone()[0]
+                t.ejecutar(f'DEALLOCATE verificar_{i}')
+            else:
+                plan = t.ejecutar(f'EXPLAIN (FORMAT JSON) {consulta}', params or None).fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            usados = _indices_del_plan(plan[0]['Plan'])
+            resultados.append((descripcion, indice, sorted(usados), indice in usados))
+        # Descarta las filas sintéticas y sus estadísticas
+        t.conn.rollback()
+    return resultados